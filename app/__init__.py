@@ -1,29 +1,34 @@
 import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
-from dotenv import load_dotenv
 
-# Load environment variables from .env file (for SECRET_KEY, DATABASE_URL)
-load_dotenv()
+# config.py loads the .env file (SECRET_KEY, DATABASE_URL...) as it is imported
+from config import CONFIGS
 
-# Import Config after load_dotenv
-from config import Config
+from bookstore_flask_project.app.services import database
 
 
-db = SQLAlchemy()
-migrate = Migrate()
+# The session sends the reads of @database.read_only views to a replica, when one is configured
+db = SQLAlchemy(session_options={'class_': database.RoutingSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'  # The route function for login
 login_manager.login_message = "Please log in to access this page."
 login_manager.login_message_category = "info" # Bootstrap class for flash message
 csrf = CSRFProtect()
 
-def create_app(config_class=Config):
+def init_migrations(app):
+    """Set up Flask-Migrate; create_app() does it under the flask CLI, scripts call it themselves."""
+    from flask_migrate import Migrate
+    from bookstore_flask_project.app.services.search import include_in_migrations
+    Migrate(app, db, include_name=include_in_migrations)
+
+
+def create_app(config_class=None):
     app = Flask(__name__, instance_relative_config=True)
-    app.config.from_object(config_class)
+    # Without an explicit config class, APP_CONFIG picks one ('production' for the tuned profile)
+    app.config.from_object(config_class or CONFIGS[os.environ.get('APP_CONFIG', 'default')])
 
     # Ensure the instance folder exists
     try:
@@ -31,8 +36,16 @@ def create_app(config_class=Config):
     except OSError:
         pass # Already exists
 
+    # Pool and SQLite tuning (WAL, busy timeout...), plus the read replica bind
+    database.configure_engines(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    database.init_app(app, db)
+    # Opt-in per-endpoint timings and SQL counts; registered first so it times the other hooks too
+    from bookstore_flask_project.app.services.profiling import request_profiler
+    request_profiler.init_app(app)
+    # Migration tooling (alembic) is only needed by 'flask db ...'; web workers skip the import
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        init_migrations(app)
     login_manager.init_app(app)
     csrf.init_app(app)
 
@@ -46,14 +59,87 @@ def create_app(config_class=Config):
     from bookstore_flask_project.app.routes.manager_routes import bp as manager_bp
     app.register_blueprint(manager_bp, url_prefix='/manager')
 
+    # JSON API; writes require a JSON body instead of a CSRF token (see api_routes.py)
+    from bookstore_flask_project.app.routes.api_routes import bp as api_bp
+    csrf.exempt(api_bp)
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
     # Import models here to ensure they are known to Flask-Migrate
     # but after db is initialized. This also avoids circular imports
     # if models need 'app' or 'db'.
     from bookstore_flask_project.app import models
 
+    # Full-text catalog search (FTS5 on SQLite, tsvector on Postgres)
+    from bookstore_flask_project.app.services.search import search_index
+    search_index.init_app(app)
+
+    # Money in integer cents (the 'cents' template filter) and stored order totals ('flask orders-retotal')
+    from bookstore_flask_project.app.services import money, totals
+    money.init_app(app)
+    totals.init_app(app)
+
+    # Materialized dashboard statistics, maintained by SQLAlchemy events
+    from bookstore_flask_project.app.services import stats
+    stats.init_app(app)
+
+    # Sales reports over incrementally maintained daily buckets ('flask reports-rebuild')
+    from bookstore_flask_project.app.services import reports
+    reports.init_app(app)
+
+    # Compact BookSummary rows for listings, and the in-process snapshot of catalog pages
+    from bookstore_flask_project.app.services import catalog
+    catalog.init_app(app)
+
+    # Precomputed facet counts for filtering the catalog ('flask facets-rebuild')
+    from bookstore_flask_project.app.services import facets
+    facets.init_app(app)
+
+    # Rendered-fragment cache for the home page and book pages
+    from bookstore_flask_project.app.services.cache import fragment_cache
+    fragment_cache.init_app(app)
+
+    # 'flask catalog-import' / 'flask catalog-export'
+    from bookstore_flask_project.app.services import catalog_io
+    catalog_io.init_app(app)
+
+    # Time-limited stock holds for cart lines ('flask inventory-purge')
+    from bookstore_flask_project.app.services import inventory
+    inventory.init_app(app)
+
+    # Carts in a fast store, written behind to CartItem ('flask cart-flush')
+    from bookstore_flask_project.app.services import cart
+    cart.init_app(app)
+
+    # Background jobs for the order pipeline ('flask jobs-work'); importing orders registers its tasks
+    from bookstore_flask_project.app.services.jobs import job_queue
+    from bookstore_flask_project.app.services import orders
+    job_queue.init_app(app)
+
+    # "Customers also bought", from co-purchase counts refreshed by a job ('flask recommendations-rebuild')
+    from bookstore_flask_project.app.services import recommendations
+    recommendations.init_app(app)
+
+    # Old delivered/cancelled orders moved to archive tables ('flask orders-archive')
+    from bookstore_flask_project.app.services import archive
+    archive.init_app(app)
+
+    # Content-addressed cover images and their thumbnails
+    from bookstore_flask_project.app.services.covers import cover_store
+    cover_store.init_app(app)
+
+    # Password hashing in a process pool, and token-bucket throttling of the auth routes
+    from bookstore_flask_project.app.services.passwords import password_hasher
+    from bookstore_flask_project.app.services.ratelimit import rate_limiter
+    password_hasher.init_app(app)
+    rate_limiter.init_app(app)
+
+    # Cached user principals, so authenticated requests don't each start with a User query
+    from bookstore_flask_project.app.services.identity import identity_cache
+    identity_cache.init_app(app)
+
     @login_manager.user_loader
     def load_user(user_id):
-        return models.User.query.get(int(user_id))
+        return identity_cache.load_user(user_id)
 
     # Context processor to make current_user available in all templates
     @app.context_processor
@@ -61,4 +147,15 @@ def create_app(config_class=Config):
         from flask_login import current_user
         return dict(current_user=current_user)
 
-    return app
\ No newline at end of file
+    return app
+
+def preload_app(config_class=None):
+    """create_app() for pre-fork servers (gunicorn --preload): also does the one-time warm-up work
+    in the master process, so the forked workers share it instead of each repeating it.
+
+    gunicorn --preload 'bookstore_flask_project.app:preload_app()'
+    """
+    from bookstore_flask_project.app.services import preload
+    app = create_app(config_class)
+    preload.warm_up(app)
+    return app
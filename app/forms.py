@@ -1,6 +1,8 @@
+from decimal import Decimal
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, TextAreaField, FloatField, IntegerField, FileField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, NumberRange
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, TextAreaField, DecimalField, IntegerField, FileField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange
+from sqlalchemy import or_
 from bookstore_flask_project.app.models import User # For checking existing username/email during registration
 
 class LoginForm(FlaskForm):
@@ -17,22 +19,29 @@ class RegistrationForm(FlaskForm):
         'Confirm Password', validators=[DataRequired(), EqualTo('password', message='Passwords must match.')])
     submit = SubmitField('Register')
 
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('That username is already taken. Please choose a different one.')
-
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('That email address is already registered.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        # Username and email uniqueness in one query (rather than one per field)
+        checks = {field: column for field, column in ((self.username, User.username), (self.email, User.email))
+                  if not field.errors}
+        if not checks:
+            return valid
+        taken = User.query.with_entities(User.username, User.email) \
+            .filter(or_(*(column == field.data for field, column in checks.items()))).limit(2).all()
+        if self.username in checks and any(row.username == self.username.data for row in taken):
+            self.username.errors.append('That username is already taken. Please choose a different one.')
+            valid = False
+        if self.email in checks and any(row.email == self.email.data for row in taken):
+            self.email.errors.append('That email address is already registered.')
+            valid = False
+        return valid
 
 class BookForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired(), Length(max=140)])
     author = StringField('Author', validators=[Length(max=140)])
     isbn = StringField('ISBN', validators=[Length(max=20)]) # Add unique validator in route if needed
     description = TextAreaField('Description')
-    price = FloatField('Price', validators=[DataRequired(), NumberRange(min=0.01)])
+    price = DecimalField('Price', places=2, validators=[DataRequired(), NumberRange(min=Decimal('0.01'))])
     stock_quantity = IntegerField('Stock Quantity', validators=[DataRequired(), NumberRange(min=0)])
     # For cover_image, Flask-WTF's FileField handles the <input type="file">.
     # Actual file saving logic will be in the route.
@@ -41,6 +50,11 @@ class BookForm(FlaskForm):
     publication_date = StringField('Publication Date (YYYY-MM-DD)', validators=[Length(max=10)]) # Or use DateField
     submit = SubmitField('Save Book')
 
+class BookImportForm(FlaskForm):
+    # CSV or JSON Lines with the BookForm columns; rows are upserted by ISBN
+    catalog_file = FileField('Catalog File (.csv or .jsonl)', validators=[DataRequired()])
+    submit = SubmitField('Import Books')
+
 class AddToCartForm(FlaskForm):
     quantity = IntegerField('Quantity', default=1, validators=[DataRequired(), NumberRange(min=1, max=100)])
     submit = SubmitField('Add to Cart')
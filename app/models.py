@@ -1,7 +1,8 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from bookstore_flask_project.app import db # Import db instance from app/__init__.py
+from bookstore_flask_project.app.services.money import from_cents, to_cents
+from bookstore_flask_project.app.services.passwords import password_hasher
 
 # Association table for Many-to-Many between Order and Book (if using that approach)
 # order_books = db.Table('order_books',
@@ -24,12 +25,13 @@ class User(UserMixin, db.Model):
 
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # PASSWORD_HASH_METHOD, computed in the hashing pool (see app/services/passwords.py)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         if self.password_hash is None: # Handle users created without a password (e.g. social login placeholder)
             return False
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -39,25 +41,43 @@ class Book(db.Model):
     title = db.Column(db.String(140), nullable=False, index=True)
     author = db.Column(db.String(140), index=True)
     isbn = db.Column(db.String(20), unique=True, index=True)
-    description = db.Column(db.Text)
-    price = db.Column(db.Float, nullable=False)
-    stock_quantity = db.Column(db.Integer, default=0, nullable=False)
+    # Deferred: listings never show it; load it with undefer(Book.description) where a page does
+    description = db.deferred(db.Column(db.Text))
+    # Integer cents (see app/services/money.py); book.price is the Decimal view of it
+    price_cents = db.Column(db.Integer, nullable=False)
+    # Indexed for the manager's low-stock listing (a range scan, ordered by stock then id)
+    stock_quantity = db.Column(db.Integer, default=0, nullable=False, index=True)
     cover_image_filename = db.Column(db.String(255)) # e.g., 'my_book_cover.jpg'
     category = db.Column(db.String(50), index=True)
     publication_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Also set by bulk UPDATEs (e.g. checkout's stock decrement); used as the book page's Last-Modified/ETag
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationship for OrderItem
     order_items = db.relationship('OrderItem', backref='book_item', lazy='dynamic')
 
+    @property
+    def price(self):
+        return from_cents(self.price_cents)
+
+    @price.setter
+    def price(self, amount):
+        self.price_cents = to_cents(amount)
+
     def __repr__(self):
         return f'<Book {self.title}>'
 
 class Order(db.Model):
+    archived = False  # See ArchivedOrder
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     order_date = db.Column(db.DateTime, index=True, default=datetime.utcnow)
-    total_amount = db.Column(db.Float, nullable=False)
+    # Stored when the order is placed (see app/services/totals.py), in integer cents
+    subtotal_cents = db.Column(db.Integer, nullable=False, default=0)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    line_count = db.Column(db.Integer, nullable=False, default=0)  # Distinct books
+    item_count = db.Column(db.Integer, nullable=False, default=0)  # Copies
     status = db.Column(db.String(20), default='pending', index=True) # e.g., pending, paid, processing, shipped, delivered, cancelled
     # Shipping Address details
     shipping_name = db.Column(db.String(100))
@@ -70,6 +90,26 @@ class Order(db.Model):
 
     # Relationship to OrderItem
     items = db.relationship('OrderItem', backref='order_ref', lazy='dynamic', cascade="all, delete-orphan")
+    # Read-only, non-dynamic view of the same rows so pages can eager-load them (see with_line_items)
+    line_items = db.relationship('OrderItem', viewonly=True, order_by='OrderItem.id')
+
+    @classmethod
+    def with_line_items(cls):
+        """Order query that loads line items and their books up front: 2 extra SELECTs however big the order."""
+        return cls.query.options(db.selectinload(cls.line_items).joinedload(OrderItem.book_item))
+
+    @classmethod
+    def with_customer(cls):
+        """Order query for listings: one extra SELECT for all the customers on the page."""
+        return cls.query.options(db.selectinload(cls.customer))
+
+    @property
+    def subtotal(self):
+        return from_cents(self.subtotal_cents)
+
+    @property
+    def total_amount(self):
+        return from_cents(self.total_cents)
 
     def __repr__(self):
         return f'<Order {self.id} - Status: {self.status}>'
@@ -79,11 +119,81 @@ class OrderItem(db.Model):
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False, default=1)
-    price_at_purchase = db.Column(db.Float, nullable=False) # Price of the book when the order was made
+    unit_price_cents = db.Column(db.Integer, nullable=False) # Price of the book when the order was made, in cents
+
+    @property
+    def price_at_purchase(self):
+        return from_cents(self.unit_price_cents)
+
+    @property
+    def line_total_cents(self):
+        return self.unit_price_cents * self.quantity
 
     def __repr__(self):
         return f'<OrderItem Order: {self.order_id} Book: {self.book_id} Qty: {self.quantity}>'
 
+class ArchivedOrder(db.Model):
+    # Old delivered/cancelled orders, moved out of Order with their ids (see app/services/archive.py).
+    # Same columns, and the same attributes the order pages use
+    archived = True
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    order_date = db.Column(db.DateTime, nullable=False, index=True)
+    subtotal_cents = db.Column(db.Integer, nullable=False, default=0)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False)
+    shipping_name = db.Column(db.String(100))
+    shipping_address1 = db.Column(db.String(200))
+    shipping_address2 = db.Column(db.String(200))
+    shipping_city = db.Column(db.String(100))
+    shipping_state = db.Column(db.String(100))
+    shipping_zip_code = db.Column(db.String(20))
+    shipping_country = db.Column(db.String(100))
+
+    customer = db.relationship('User')
+    line_items = db.relationship('ArchivedOrderItem', viewonly=True, order_by='ArchivedOrderItem.id')
+
+    @classmethod
+    def with_line_items(cls):
+        return cls.query.options(db.selectinload(cls.line_items).joinedload(ArchivedOrderItem.book_item))
+
+    @classmethod
+    def with_customer(cls):
+        return cls.query.options(db.selectinload(cls.customer))
+
+    @property
+    def subtotal(self):
+        return from_cents(self.subtotal_cents)
+
+    @property
+    def total_amount(self):
+        return from_cents(self.total_cents)
+
+    def __repr__(self):
+        return f'<ArchivedOrder {self.id} - Status: {self.status}>'
+
+class ArchivedOrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('archived_order.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    unit_price_cents = db.Column(db.Integer, nullable=False)
+
+    book_item = db.relationship('Book')
+
+    @property
+    def price_at_purchase(self):
+        return from_cents(self.unit_price_cents)
+
+    @property
+    def line_total_cents(self):
+        return self.unit_price_cents * self.quantity
+
+    def __repr__(self):
+        return f'<ArchivedOrderItem Order: {self.order_id} Book: {self.book_id} Qty: {self.quantity}>'
+
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
@@ -96,5 +206,122 @@ class CartItem(db.Model):
 
     book = db.relationship('Book', backref='cart_associations') # Easy access to book details
 
+    @classmethod
+    def with_books(cls):
+        """CartItem query that joins in each item's book, so iterating item.book issues no extra queries."""
+        return cls.query.options(db.joinedload(cls.book))
+
+    def __repr__(self):
+        return f'<CartItem User: {self.user_id} Book: {self.book_id} Qty: {self.quantity}>'
+
+class StockReservation(db.Model):
+    # Copies of a book held for a shopper's cart until expires_at (see app/services/inventory.py)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'book_id', name='_reservation_user_book_uc'),
+        # Summing a book's unexpired holds reads only this index
+        db.Index('ix_stock_reservation_book_expires', 'book_id', 'expires_at', 'quantity'),
+    )
+
+    def __repr__(self):
+        return f'<StockReservation User: {self.user_id} Book: {self.book_id} Qty: {self.quantity}>'
+
+class StoreStat(db.Model):
+    # Materialized counters for the manager dashboard (see app/services/stats.py)
+    name = db.Column(db.String(64), primary_key=True)  # e.g. 'books', 'users', 'orders.pending_payment', 'revenue_cents'
+    value = db.Column(db.Float, nullable=False, default=0)  # Whole numbers; 'revenue_cents' is in cents
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoreStat {self.name}={self.value}>'
+
+class BookSales(db.Model):
+    # Running per-book sales totals, so top sellers are an indexed ORDER BY ... LIMIT
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    units_sold = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_cents = db.Column(db.BigInteger, nullable=False, default=0)
+
+    book = db.relationship('Book')
+
+    def __repr__(self):
+        return f'<BookSales Book: {self.book_id} Units: {self.units_sold}>'
+
+class SalesDaily(db.Model):
+    # Units and revenue per book per day, folded in from OrderItem incrementally (see app/services/reports.py)
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue_cents = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SalesDaily {self.day} Book: {self.book_id} Units: {self.units}>'
+
+class CategorySalesDaily(db.Model):
+    # The same per day and category (the book's category when the item was folded in): a few rows a day
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue_cents = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CategorySalesDaily {self.day} {self.category} Units: {self.units}>'
+
+class FacetCount(db.Model):
+    # Books per facet value for the browse page's filter panel (see app/services/facets.py). `scope` is
+    # '' for the whole catalog, or the selected filters ('category=Fiction', 'category=Fiction&stock=in_stock'...)
+    scope = db.Column(db.String(160), primary_key=True)
+    facet = db.Column(db.String(16), primary_key=True)  # 'category', 'author', 'price' or 'stock'
+    value = db.Column(db.String(140), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Top values of a facet within a scope (the author list) without sorting them all
+    __table_args__ = (db.Index('ix_facet_count_scope_facet_count', 'scope', 'facet', 'count'),)
+
+    def __repr__(self):
+        return f'<FacetCount {self.scope!r} {self.facet}={self.value}: {self.count}>'
+
+class CoPurchase(db.Model):
+    # Orders that contained both books, kept both ways round (see app/services/recommendations.py)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    other_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CoPurchase {self.book_id}+{self.other_id}: {self.orders}>'
+
+class BookRecommendation(db.Model):
+    # A book's most co-purchased books in rank order (1 = bought with it most), for "Customers also bought"
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    recommended_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    orders = db.Column(db.Integer, nullable=False)  # Orders with both books
+
+    def __repr__(self):
+        return f'<BookRecommendation {self.book_id} #{self.rank}: {self.recommended_id}>'
+
+class Job(db.Model):
+    # Background job queue kept in the app database (see app/services/jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)  # Registered task name, e.g. 'orders.confirm'
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    # Enqueuing the same key twice is a no-op, e.g. 'order:42:confirm'
+    idempotency_key = db.Column(db.String(128), unique=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), index=True)  # Set by the worker running it
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+
     def __repr__(self):
-        return f'<CartItem User: {self.user_id} Book: {self.book_id} Qty: {self.quantity}>'
\ No newline at end of file
+        return f'<Job {self.id} {self.name} {self.status}>'
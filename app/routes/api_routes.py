@@ -0,0 +1,325 @@
+# app/routes/api_routes.py
+# Versioned JSON API (/api/v1) for the mobile app and partner integrations: books, the cart and
+# orders of the logged-in user.
+#
+# - Responses are built from column queries (no ORM objects) and encoded by
+#   services/serialization.py (orjson when installed), then gzip/brotli compressed by
+#   services/compression.py.
+# - Amounts are integer cents (price_cents, total_cents...), like in the database.
+# - Listings are keyset-paginated: pass `next_cursor` back as `cursor`. `limit` is capped at
+#   API_MAX_PAGE_SIZE.
+# - /books takes `fields=id,title,...` to choose the columns, and `ids=1,2,3` to fetch up to
+#   API_MAX_BATCH_IDS books in one query. It filters like the browse page (category, author,
+#   price=1000-2000, stock=in_stock) and, with `facets=1`, adds the counts per filter value.
+# - Book responses carry the same ETag / Last-Modified validators as the catalog pages, and
+#   read from the read replica when there is one.
+# - Auth is the site's login session. The blueprint is exempt from CSRF tokens; instead, writes
+#   must send a JSON body, which a cross-site HTML form can't.
+# - Errors are {"error": {"status": ..., "message": ...}}.
+from functools import wraps
+
+from flask import Blueprint, abort, current_app, request, url_for
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, Order, OrderItem
+from bookstore_flask_project.app.services import cart as cart_service
+from bookstore_flask_project.app.services import checkout as checkout_service
+from bookstore_flask_project.app.services import archive, facets, http_cache, totals
+from bookstore_flask_project.app.services.compression import compress_response
+from bookstore_flask_project.app.services.database import read_only
+from bookstore_flask_project.app.services.pagination import keyset_paginate
+from bookstore_flask_project.app.services.search import search_index
+from bookstore_flask_project.app.services.serialization import json_response, rows_as_dicts
+
+bp = Blueprint('api', __name__)
+bp.after_request(compress_response)
+
+BOOK_FIELDS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'isbn': Book.isbn,
+    'description': Book.description,
+    'price_cents': Book.price_cents,
+    'stock_quantity': Book.stock_quantity,
+    'category': Book.category,
+    'publication_date': Book.publication_date,
+    'updated_at': Book.updated_at,
+}
+DEFAULT_BOOK_FIELDS = ('id', 'title', 'author', 'price_cents', 'stock_quantity', 'category')
+ORDER_FIELDS = {
+    'id': Order.id,
+    'order_date': Order.order_date,
+    'status': Order.status,
+    'subtotal_cents': Order.subtotal_cents,
+    'total_cents': Order.total_cents,
+    'line_count': Order.line_count,
+    'item_count': Order.item_count,
+}
+ORDER_ITEM_FIELDS = {
+    'book_id': OrderItem.book_id,
+    'title': Book.title,
+    'quantity': OrderItem.quantity,
+    'unit_price_cents': OrderItem.unit_price_cents,
+}
+
+
+@bp.errorhandler(HTTPException)
+def _http_error(e):
+    return json_response({'error': {'status': e.code, 'message': e.description}}, e.code)
+
+
+def api_login_required(view):
+    """Like login_required, but a 401 instead of a redirect to the login page."""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            abort(401, description='Log in first.')
+        return view(*args, **kwargs)
+
+    return decorated_function
+
+
+# --- request parsing --------------------------------------------------------------------------
+
+def _csv_arg(name):
+    value = request.args.get(name)
+    return [part.strip() for part in value.split(',') if part.strip()] if value else None
+
+
+def _book_fields():
+    fields = _csv_arg('fields')
+    if not fields:
+        return DEFAULT_BOOK_FIELDS
+    unknown = [field for field in fields if field not in BOOK_FIELDS]
+    if unknown:
+        abort(400, description=f"Unknown field(s): {', '.join(unknown)}. Choose from {', '.join(BOOK_FIELDS)}.")
+    return tuple(dict.fromkeys(fields))
+
+
+def _book_ids():
+    ids = _csv_arg('ids')
+    if ids is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(book_id) for book_id in ids))
+    except ValueError:
+        abort(400, description='ids must be a comma-separated list of book ids.')
+    limit = current_app.config.get('API_MAX_BATCH_IDS', 100)
+    if len(ids) > limit:
+        abort(400, description=f'At most {limit} ids per request.')
+    return ids
+
+
+def _page_size(default=20):
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 100)))
+
+
+def _json_body():
+    if not request.is_json:
+        abort(415, description='Send a JSON body (Content-Type: application/json).')
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, description='The body must be a JSON object.')
+    return body
+
+
+def _quantity(body, default=None, minimum=1):
+    quantity = body.get('quantity', default)
+    if not isinstance(quantity, int) or isinstance(quantity, bool) \
+            or not minimum <= quantity <= cart_service.MAX_LINE_QUANTITY:
+        abort(400, description=f'quantity must be a whole number from {minimum} to {cart_service.MAX_LINE_QUANTITY}.')
+    return quantity
+
+
+def _shipping(body):
+    """The order's shipping fields from the body: strings (or null) that fit their Order columns."""
+    shipping = body.get('shipping') or {}
+    if not isinstance(shipping, dict):
+        abort(400, description='shipping must be an object.')
+    fields = {}
+    for field in checkout_service.SHIPPING_FIELDS:
+        value = shipping.get(field)
+        length = Order.__table__.c[f'shipping_{field}'].type.length
+        if value is not None and (not isinstance(value, str) or len(value) > length):
+            abort(400, description=f'shipping.{field} must be a string of at most {length} characters.')
+        fields[field] = value
+    return fields
+
+
+# --- books ------------------------------------------------------------------------------------
+
+@bp.route('/books')
+@read_only
+def list_books():
+    fields, ids = _book_fields(), _book_ids()
+    search_text = request.args.get('q', '', type=str).strip()
+    cursor, limit = request.args.get('cursor'), _page_size()
+    filters, with_facets = facets.parse_filters(request.args), request.args.get('facets') == '1'
+
+    validators = http_cache.catalog_validators('api', fields, ids, search_text, cursor, limit, *filters, with_facets)
+    cached = http_cache.not_modified(validators)
+    if cached:
+        return cached
+
+    columns = [BOOK_FIELDS[field] for field in fields]
+    if ids is not None:
+        # One IN query for the whole batch, returned in the order asked for
+        found = {row[0]: row[1:] for row in
+                 db.session.query(Book.id, *columns).filter(Book.id.in_(ids)).all()} if ids else {}
+        payload = {'data': [dict(zip(fields, found[book_id])) for book_id in ids if book_id in found],
+                   'missing': [book_id for book_id in ids if book_id not in found]}
+    else:
+        if search_text:
+            query, sort_keys = search_index.ranked(search_text)  # Ranked by relevance
+        else:
+            query, sort_keys = Book.query, (Book.title.asc(), Book.id.asc())
+        query = facets.apply_filters(query, filters)
+        page = keyset_paginate(query.with_entities(*columns), sort_keys, cursor=cursor, per_page=limit)
+        payload = {'data': rows_as_dicts(page.items, fields),
+                   'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor}
+        if with_facets:
+            payload['facets'] = {facet: [{'value': item.value, 'label': item.label, 'count': item.count}
+                                         for item in values]
+                                 for facet, values in facets.panel(filters, search_text).items()}
+    return http_cache.apply(json_response(payload), validators)
+
+
+@bp.route('/books/<int:book_id>')
+@read_only
+def get_book(book_id):
+    fields = _book_fields()
+    validators = http_cache.book_validators(book_id, 'api', fields)  # Primary-key lookup of updated_at only
+    if validators is None:
+        abort(404, description='No such book.')
+    cached = http_cache.not_modified(validators)
+    if cached:
+        return cached
+    row = db.session.query(*[BOOK_FIELDS[field] for field in fields]).filter(Book.id == book_id).first()
+    if row is None:
+        abort(404, description='No such book.')
+    return http_cache.apply(json_response({'data': dict(zip(fields, row))}), validators)
+
+
+# --- cart -------------------------------------------------------------------------------------
+
+def _cart_payload(user_id):
+    items = cart_service.get_items(user_id)
+    rows = db.session.query(Book.id, Book.title, Book.price_cents, Book.stock_quantity) \
+        .filter(Book.id.in_(items)).order_by(Book.id).all() if items else []
+    lines = [{'book_id': book_id, 'title': title, 'quantity': items[book_id], 'unit_price_cents': price_cents,
+              'subtotal_cents': price_cents * items[book_id], 'stock_quantity': stock}
+             for book_id, title, price_cents, stock in rows]
+    cart_totals = totals.Totals(sum(line['subtotal_cents'] for line in lines), len(lines),
+                                sum(line['quantity'] for line in lines))
+    return {'data': {'lines': lines, **cart_totals.order_columns()}}
+
+
+def _book_or_404(book_id):
+    book = db.session.get(Book, book_id)
+    if book is None:
+        abort(404, description='No such book.')
+    return book
+
+
+@bp.route('/cart')
+@api_login_required
+def get_cart():
+    return json_response(_cart_payload(current_user.id))
+
+
+@bp.route('/cart/items', methods=['POST'])
+@api_login_required
+def add_cart_item():
+    body = _json_body()
+    book_id = body.get('book_id')
+    if not isinstance(book_id, int) or isinstance(book_id, bool):
+        abort(400, description='book_id must be a book id.')
+    book = _book_or_404(book_id)
+    try:
+        cart_service.add(current_user.id, book, _quantity(body, default=1))
+    except cart_service.CartError as e:
+        abort(409, description=str(e))
+    return json_response(_cart_payload(current_user.id))
+
+
+# Cart lines are identified by book id, as in the site's cart routes
+@bp.route('/cart/items/<int:book_id>', methods=['PATCH'])
+@api_login_required
+def update_cart_item(book_id):
+    quantity = _quantity(_json_body(), minimum=0)  # 0 removes the line
+    try:
+        cart_service.set_quantity(current_user.id, _book_or_404(book_id), quantity)
+    except cart_service.CartError as e:
+        abort(409, description=str(e))
+    return json_response(_cart_payload(current_user.id))
+
+
+@bp.route('/cart/items/<int:book_id>', methods=['DELETE'])
+@api_login_required
+def remove_cart_item(book_id):
+    if not cart_service.remove(current_user.id, book_id):
+        abort(404, description='That book is not in your cart.')
+    return json_response(_cart_payload(current_user.id))
+
+
+# --- orders -----------------------------------------------------------------------------------
+
+def _order_payload(order_id):
+    # Recent orders first, then the archive (see services/archive.py): the same columns in both
+    for orders, items in archive.TABLES:
+        columns = [*(getattr(orders, column.key) for column in ORDER_FIELDS.values()),
+                   *(getattr(orders, f'shipping_{field}') for field in checkout_service.SHIPPING_FIELDS)]
+        row = db.session.query(*columns).filter(orders.id == order_id, orders.user_id == current_user.id).first()
+        if row is not None:
+            break
+    else:
+        return None
+    order = dict(zip(ORDER_FIELDS, row))
+    order['shipping'] = dict(zip(checkout_service.SHIPPING_FIELDS, row[len(ORDER_FIELDS):]))
+    item_columns = [getattr(items, column.key) if column.class_ is OrderItem else column
+                    for column in ORDER_ITEM_FIELDS.values()]
+    order['items'] = rows_as_dicts(
+        db.session.query(*item_columns).join(Book, items.book_id == Book.id)
+        .filter(items.order_id == order_id).order_by(items.id).all(),
+        tuple(ORDER_ITEM_FIELDS))
+    return {'data': order}
+
+
+@bp.route('/orders')
+@api_login_required
+def list_orders():
+    query, columns = archive.customer_orders(current_user.id, tuple(ORDER_FIELDS))
+    page = keyset_paginate(query, (columns.order_date.desc(), columns.id.desc()),
+                           cursor=request.args.get('cursor'), per_page=_page_size())
+    return json_response({'data': rows_as_dicts(page.items, tuple(ORDER_FIELDS)),
+                          'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor})
+
+
+@bp.route('/orders/<int:order_id>')
+@api_login_required
+def get_order(order_id):
+    payload = _order_payload(order_id)
+    if payload is None:
+        abort(404, description='No such order.')  # Also for other customers' orders
+    return json_response(payload)
+
+
+@bp.route('/orders', methods=['POST'])
+@api_login_required
+def place_order():
+    """Check out the cart; body: {"shipping": {"name": ..., "address1": ..., ...}}."""
+    shipping = _shipping(_json_body())
+    user_id = current_user.id
+    cart_service.flush(user_id)  # Checkout works on CartItem, as in the site's checkout route
+    try:
+        order = checkout_service.place_order(user_id, shipping)
+    except checkout_service.CheckoutError as e:
+        abort(409, description=str(e))
+    cart_service.forget(user_id)
+    response = json_response(_order_payload(order.id), 201)
+    response.headers['Location'] = url_for('api.get_order', order_id=order.id)
+    return response
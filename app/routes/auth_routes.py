@@ -1,13 +1,27 @@
+import math
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from urllib.parse import urlsplit  # Changed from url_parse
 from bookstore_flask_project.app import db
 from bookstore_flask_project.app.models import User
 from bookstore_flask_project.app.forms import LoginForm, RegistrationForm
+from bookstore_flask_project.app.services.passwords import password_hasher, HashingBusyError
+from bookstore_flask_project.app.services.ratelimit import rate_limiter
 from flask_login import login_user, logout_user, current_user, login_required
 
 bp = Blueprint('auth', __name__)
 
 
+def _throttled(template, wait, **context):
+    seconds = max(1, math.ceil(wait))
+    flash(f'Too many attempts. Please try again in {seconds} seconds.', 'danger')
+    return render_template(template, **context), 429, {'Retry-After': str(seconds)}
+
+
+def _busy(template, **context):
+    flash('The server is busy right now. Please try again in a moment.', 'warning')
+    return render_template(template, **context), 503, {'Retry-After': '5'}
+
+
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -18,10 +32,27 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
+        # Throttle before hashing anything: per address, and per username for failed attempts
+        username_key = form.username.data.lower()
+        wait = rate_limiter.hit('ip', request.remote_addr) or rate_limiter.peek('username', username_key)
+        if wait:
+            return _throttled('auth/login.html', wait, title='Sign In', form=form)
         user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            if user is None:
+                password_hasher.verify_dummy(form.password.data)  # Same cost as a real check
+            valid = user is not None and user.check_password(form.password.data)
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                # Hashed with older PASSWORD_HASH_METHOD settings: upgrade it while we have the password
+                user.set_password(form.password.data)
+                db.session.commit()
+        except HashingBusyError:
+            return _busy('auth/login.html', title='Sign In', form=form)
+        if not valid:
+            rate_limiter.hit('username', username_key)
             flash('Invalid username or password.', 'danger')
             return redirect(url_for('auth.login'))
+        rate_limiter.reset('username', username_key)
         login_user(user, remember=form.remember_me.data)
 
         next_page = request.args.get('next')
@@ -50,8 +81,14 @@ def signup():
         return redirect(url_for('customer.index'))
     form = RegistrationForm()
     if form.validate_on_submit():
+        wait = rate_limiter.hit('ip', request.remote_addr)
+        if wait:
+            return _throttled('auth/signup.html', wait, title='Create Account', form=form)
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusyError:
+            return _busy('auth/signup.html', title='Create Account', form=form)
         # Default role is 'customer', set in model
         db.session.add(user)
         db.session.commit()
@@ -1,58 +1,124 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, make_response
+from markupsafe import Markup
 from bookstore_flask_project.app import db
-from bookstore_flask_project.app.models import Book, CartItem, Order, OrderItem
+from bookstore_flask_project.app.models import Book
 from bookstore_flask_project.app.forms import AddToCartForm, UpdateCartItemForm
+from bookstore_flask_project.app.services import cart as cart_service
+from bookstore_flask_project.app.services import checkout as checkout_service
+from bookstore_flask_project.app.services import archive, catalog, facets, http_cache, recommendations, stats
+from bookstore_flask_project.app.services.cache import fragment_cache
+from bookstore_flask_project.app.services.database import read_only
+from bookstore_flask_project.app.services.covers import cover_store
+from bookstore_flask_project.app.services.search import search_index
 
 from flask_login import current_user, login_required
-from sqlalchemy.exc import IntegrityError  # For handling unique constraint violations
+from sqlalchemy.orm import undefer
 
 bp = Blueprint('customer', __name__)
 
 
+def _render_home_books():
+    featured_books = catalog.newest(Book.created_at.desc(), 6)
+    new_arrivals = catalog.newest(Book.publication_date.desc(), 6)
+    return render_template('customer/_home_books.html',
+                           featured_books=featured_books,
+                           new_arrivals=new_arrivals)
+
+
 @bp.route('/')
 @bp.route('/index')
+@read_only
 def index():
-    # Placeholder: Fetch some books to display on the homepage
-    featured_books = Book.query.order_by(Book.created_at.desc()).limit(6).all()
-    new_arrivals = Book.query.order_by(Book.publication_date.desc()).limit(6).all()
+    # The book lists only change with the catalog, so they're rendered once per catalog version
+    books_html = fragment_cache.get_or_render('index.books', stats.catalog_version()[0], _render_home_books)
     return render_template('customer/index.html',
                            title='Home',
-                           featured_books=featured_books,
-                           new_arrivals=new_arrivals)
+                           books_html=Markup(books_html))
 
 
 @bp.route('/books')
+@read_only
 def browse_books():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search_query = request.args.get('search', '', type=str)
-
-    query = Book.query
-    if search_query:
-        like_query = f"%{search_query}%"
-        query = query.filter(
-            db.or_(
-                Book.title.ilike(like_query),
-                Book.author.ilike(like_query),
-                Book.isbn.ilike(like_query),
-                Book.category.ilike(like_query)
-            )
-        )
-
-    books_pagination = query.order_by(Book.title.asc()).paginate(page=page, per_page=12, error_out=False)
+    filters = facets.parse_filters(request.args)  # Category, author, price range, in stock
+
+    # Answer revalidations from the catalog version alone, before touching the Book table
+    validators = http_cache.catalog_validators(search_query, cursor, *filters)
+    cached = http_cache.not_modified(validators)
+    if cached:
+        return cached
+
+    # Tiles only: BookSummary tuples rather than Book objects (see services/catalog.py)
+    if search_query.strip():
+        query, sort_keys = search_index.ranked(search_query)  # Ranked by relevance
+        books_pagination = catalog.summary_page(facets.apply_filters(query, filters), sort_keys,
+                                                cursor=cursor, per_page=12)
+    else:
+        books_pagination = catalog.listing_page(cursor, 12, version=validators.version, filters=filters)
     books = books_pagination.items
+    # Counts per filter value, from the precomputed facet counts where they cover the selection
+    facet_panel = facets.panel(filters, search_query)
+
+    return http_cache.apply(make_response(render_template('customer/browse_books.html',
+                                                          title='Browse Books',
+                                                          books=books,
+                                                          pagination=books_pagination,
+                                                          search_query=search_query,
+                                                          filters=filters,
+                                                          facets=facet_panel)), validators)
+
+
+def _render_book_info(book_id):
+    book = db.session.get(Book, book_id, options=[undefer(Book.description)])
+    if book is None:
+        return None  # Not cached; the route 404s
+    return {'title': book.title, 'html': render_template('customer/_book_info.html', book=book)}
 
-    return render_template('customer/browse_books.html',
-                           title='Browse Books',
-                           books=books,
-                           pagination=books_pagination,
-                           search_query=search_query)
+
+def _render_recommendations(book_id):
+    return render_template('customer/_recommendations.html', books=recommendations.for_book(book_id))
 
 
 @bp.route('/book/<int:book_id>')
+@read_only
 def book_detail(book_id):
-    book = Book.query.get_or_404(book_id)
-    form = AddToCartForm()  # For the "Add to Cart" button on the detail page
-    return render_template('customer/book_detail.html', title=book.title, book=book, form=form)
+    # The recommendations change with their version rather than the book's (see services/recommendations.py)
+    recommendations_version, recommendations_changed = recommendations.version()
+    validators = http_cache.book_validators(book_id, related=(recommendations_version, recommendations_changed))
+    if validators is None:
+        abort(404)
+    cached = http_cache.not_modified(validators)
+    if cached:
+        return cached
+
+    # Book info is cached per version of the book (its updated_at, which edits and stock changes
+    # move); the form isn't, since it carries the per-session CSRF token
+    fragment = fragment_cache.get_or_render('book_detail', f'{book_id}:{validators.version}',
+                                            lambda: _render_book_info(book_id))
+    if fragment is None:
+        abort(404)
+    recommendations_html = fragment_cache.get_or_render('book_recommendations',
+                                                        f'{book_id}:{recommendations_version}',
+                                                        lambda: _render_recommendations(book_id))
+    # For the "Add to Cart" button on the detail page. Anonymous visitors can't buy, and leaving the
+    # form (and its session-bound CSRF token) out keeps their copy of the page shareable by a CDN.
+    form = AddToCartForm() if current_user.is_authenticated else None
+    return http_cache.apply(make_response(render_template('customer/book_detail.html', title=fragment['title'],
+                                                          book_id=book_id, book_html=Markup(fragment['html']),
+                                                          recommendations_html=Markup(recommendations_html),
+                                                          form=form)), validators)
+
+
+@bp.route('/covers/<key>')
+def cover(key):
+    return cover_store.send(key)
+
+
+@bp.route('/covers/<size>/<key>')
+def cover_variant(size, key):
+    # Thumbnails; WebP for browsers that accept it, JPEG otherwise
+    return cover_store.send(key, size)
 
 
 @bp.route('/cart/add/<int:book_id>', methods=['POST'])
@@ -63,32 +129,13 @@ def add_to_cart(book_id):
 
     if form.validate_on_submit():
         quantity = form.quantity.data
-        if book.stock_quantity < quantity:
-            flash(f"Sorry, only {book.stock_quantity} of '{book.title}' available in stock.", 'warning')
-            return redirect(url_for('customer.book_detail', book_id=book_id))
-
-        cart_item = CartItem.query.filter_by(user_id=current_user.id, book_id=book.id).first()
-        if cart_item:
-            # Check if adding more exceeds stock
-            if book.stock_quantity < (cart_item.quantity + quantity):
-                flash(
-                    f"Cannot add {quantity} more. Only {book.stock_quantity - cart_item.quantity} additional items of '{book.title}' available.",
-                    'warning')
-                return redirect(request.referrer or url_for('customer.view_cart'))
-            cart_item.quantity += quantity
-        else:
-            cart_item = CartItem(user_id=current_user.id, book_id=book.id, quantity=quantity)
-            db.session.add(cart_item)
-
+        # The cart lives in the cart store; CartItem rows are written behind (see services/cart.py)
         try:
-            db.session.commit()
-            flash(f"'{book.title}' (x{quantity}) added to your cart.", 'success')
-        except IntegrityError:
-            db.session.rollback()
-            flash('Could not add item to cart due to a database issue. Please try again.', 'danger')
-        except Exception as e:
-            db.session.rollback()
-            flash(f'An unexpected error occurred: {str(e)}', 'danger')
+            cart_service.add(current_user.id, book, quantity)
+        except cart_service.CartError as e:
+            flash(str(e), 'warning')
+            return redirect(request.referrer or url_for('customer.book_detail', book_id=book_id))
+        flash(f"'{book.title}' (x{quantity}) added to your cart.", 'success')
 
     else:  # Form validation failed
         for field, errors in form.errors.items():
@@ -101,39 +148,33 @@ def add_to_cart(book_id):
 @bp.route('/cart')
 @login_required
 def view_cart():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    total_price = 0
-    for item in cart_items:
-        if item.book:  # Ensure book exists
-            total_price += item.book.price * item.quantity
+    cart_items = cart_service.lines(current_user.id)  # Cart store + one query for the books
+    totals = cart_service.cart_totals(cart_items)  # Integer cents, no extra query
 
     update_form = UpdateCartItemForm()  # For each item in template
-    return render_template('customer/cart.html', title='Your Cart', cart_items=cart_items, total_price=total_price,
-                           update_form=update_form)
+    # "Customers also bought" for the cart as a whole: one query over the precomputed top lists
+    suggestions = recommendations.for_books([item.book_id for item in cart_items])
+    return render_template('customer/cart.html', title='Your Cart', cart_items=cart_items, totals=totals,
+                           total_price=totals.total, update_form=update_form, recommendations=suggestions)
 
 
+# Cart lines are identified by book id (CartLine.id), since a cart holds each book at most once
 @bp.route('/cart/update/<int:item_id>', methods=['POST'])
 @login_required
 def update_cart_item(item_id):
-    cart_item = CartItem.query.get_or_404(item_id)
-    if cart_item.user_id != current_user.id:
-        flash('You do not have permission to modify this item.', 'danger')
-        return redirect(url_for('customer.view_cart'))
-
+    book = Book.query.get_or_404(item_id)
     form = UpdateCartItemForm()
     if form.validate_on_submit():
         new_quantity = form.quantity.data
-        if new_quantity == 0:
-            db.session.delete(cart_item)
-            flash(f"'{cart_item.book.title}' removed from cart.", 'info')
-        elif cart_item.book.stock_quantity < new_quantity:
-            flash(
-                f"Sorry, only {cart_item.book.stock_quantity} of '{cart_item.book.title}' available. Cart not updated.",
-                'warning')
+        try:
+            cart_service.set_quantity(current_user.id, book, new_quantity)
+        except cart_service.CartError as e:
+            flash(str(e), 'warning')
         else:
-            cart_item.quantity = new_quantity
-            flash(f"Quantity for '{cart_item.book.title}' updated.", 'success')
-        db.session.commit()
+            if new_quantity == 0:
+                flash(f"'{book.title}' removed from cart.", 'info')
+            else:
+                flash(f"Quantity for '{book.title}' updated.", 'success')
     else:
         flash('Invalid quantity.', 'danger')
     return redirect(url_for('customer.view_cart'))
@@ -142,81 +183,53 @@ def update_cart_item(item_id):
 @bp.route('/cart/remove/<int:item_id>', methods=['POST'])  # Often done with POST for safety
 @login_required
 def remove_from_cart(item_id):
-    cart_item = CartItem.query.get_or_404(item_id)
-    if cart_item.user_id != current_user.id:
-        flash('You do not have permission to remove this item.', 'danger')
-    else:
-        book_title = cart_item.book.title if cart_item.book else "Item"
-        db.session.delete(cart_item)
-        db.session.commit()
+    if cart_service.remove(current_user.id, item_id):
+        book_title = db.session.query(Book.title).filter(Book.id == item_id).scalar() or 'Item'
         flash(f"'{book_title}' removed from your cart.", 'info')
+    else:
+        flash('That book is not in your cart.', 'warning')
     return redirect(url_for('customer.view_cart'))
 
 
 @bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    cart_service.flush(current_user.id)  # Checkout works on CartItem, so persist pending cart changes first
+    cart_items = checkout_service.cart_lines(current_user.id)  # Cart + books in one query
     if not cart_items:
         flash('Your cart is empty. Add some books before checking out!', 'info')
         return redirect(url_for('customer.browse_books'))
 
-    total_price = sum(item.book.price * item.quantity for item in cart_items if item.book)
+    totals = checkout_service.cart_totals(cart_items)
 
     # Simple form for shipping details (you'd use Flask-WTF for a real app)
     if request.method == 'POST':
         # In a real app, validate form data, process payment (mock for now)
-        shipping_name = request.form.get('name')
-        shipping_address1 = request.form.get('address1')
-        # ... get other shipping fields
-
-        # Check stock one last time
-        for item in cart_items:
-            if item.book.stock_quantity < item.quantity:
-                flash(f"Sorry, '{item.book.title}' stock changed. Only {item.book.stock_quantity} available.",
-                      'warning')
-                return redirect(url_for('customer.view_cart'))
-
-        # Create Order
-        order = Order(
-            user_id=current_user.id,
-            total_amount=total_price,
-            status='pending_payment',  # Or 'processing' if payment is mocked as successful
-            shipping_name=shipping_name,
-            shipping_address1=shipping_address1
-            # ... set other shipping fields
-        )
-        db.session.add(order)
-        db.session.flush()  # To get order.id for OrderItems
-
-        for item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                book_id=item.book_id,
-                quantity=item.quantity,
-                price_at_purchase=item.book.price
-            )
-            db.session.add(order_item)
-
-            # Decrease stock
-            item.book.stock_quantity -= item.quantity
-
-            db.session.delete(item)  # Remove from cart
-
-        db.session.commit()
+        shipping = {field: request.form.get(field) for field in checkout_service.SHIPPING_FIELDS}
+        try:
+            # Stock is re-checked and decremented atomically inside the order transaction
+            checkout_service.place_order(current_user.id, shipping)
+            cart_service.forget(current_user.id)  # The purchased CartItems are gone; reload what's left
+        except checkout_service.OutOfStockError as e:
+            flash(str(e), 'warning')
+            return redirect(url_for('customer.view_cart'))
+        except checkout_service.EmptyCartError as e:
+            flash(str(e), 'info')
+            return redirect(url_for('customer.browse_books'))
+
         flash('Thank you for your order! It is being processed.', 'success')
         return redirect(url_for('customer.order_history'))  # Or an order confirmation page
 
-    return render_template('customer/checkout.html', title='Checkout', cart_items=cart_items, total_price=total_price)
+    return render_template('customer/checkout.html', title='Checkout', cart_items=cart_items, totals=totals,
+                           total_price=totals.total)
 
 
 @bp.route('/orders')
 @login_required
 def order_history():
-    page = request.args.get('page', 1, type=int)
-    orders_pagination = Order.query.filter_by(user_id=current_user.id) \
-        .order_by(Order.order_date.desc()) \
-        .paginate(page=page, per_page=10, error_out=False)
+    cursor = request.args.get('cursor')
+    # Recent and archived orders together, newest first (see services/archive.py)
+    orders_pagination = archive.customer_history(current_user.id, cursor=cursor, per_page=10)
     orders = orders_pagination.items
     return render_template('customer/order_history.html', title='My Orders', orders=orders,
                            pagination=orders_pagination)
@@ -225,7 +238,9 @@ def order_history():
 @bp.route('/order/<int:order_id>')
 @login_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = archive.get_order(order_id)
+    if order is None:
+        abort(404)
     if order.user_id != current_user.id:
         flash('You do not have permission to view this order.', 'danger')
         return redirect(url_for('customer.order_history'))
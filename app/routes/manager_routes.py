@@ -1,19 +1,30 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import io
+from functools import wraps
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, \
+    abort, current_app
 from bookstore_flask_project.app import db
-from bookstore_flask_project.app.models import Book, User, Order
-from bookstore_flask_project.app.forms import BookForm  # You might need UserForm, OrderStatusForm etc.
+from bookstore_flask_project.app.models import ArchivedOrder, Book, User, Order
+from bookstore_flask_project.app.forms import BookForm, BookImportForm  # You might need UserForm, OrderStatusForm etc.
+from bookstore_flask_project.app.services import archive, catalog, catalog_io, inventory, orders, reports, stats
+from bookstore_flask_project.app.services.cache import fragment_cache
+from bookstore_flask_project.app.services.covers import cover_store, CoverError
+from bookstore_flask_project.app.services.identity import identity_cache
+from bookstore_flask_project.app.services.pagination import keyset_paginate
+from bookstore_flask_project.app.services.profiling import request_profiler
+from bookstore_flask_project.app.services.search import search_index
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from datetime import datetime
+from sqlalchemy.orm import undefer
+from datetime import date, datetime, timedelta
 
 bp = Blueprint('manager', __name__)
 
 
 # Decorator to check if user is a manager
 def manager_required(f):
+    @wraps(f)
     @login_required
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role != 'manager':
+        if not current_user.is_authenticated or not current_user.has_role('manager'):
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('customer.index'))
         return f(*args, **kwargs)
@@ -24,22 +35,74 @@ def manager_required(f):
 @bp.route('/dashboard')
 @manager_required
 def dashboard():
-    # Placeholder: Fetch some stats for the dashboard
-    total_books = Book.query.count()
-    total_users = User.query.count()
-    pending_orders = Order.query.filter_by(status='pending_payment').count()  # Or other relevant status
+    # Counters are kept up to date by app/services/stats.py, so this doesn't scan any tables
     return render_template('manager/dashboard.html',
                            title='Manager Dashboard',
-                           total_books=total_books,
-                           total_users=total_users,
-                           pending_orders=pending_orders)
+                           **stats.snapshot())
+
+
+@bp.route('/reports')
+@manager_required
+def sales_reports():
+    # Defaults to the last 30 days, by day; ?start=YYYY-MM-DD&end=YYYY-MM-DD&granularity=week|month
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('manager.sales_reports'))
+    if start > end or (end - start).days > 3660:
+        flash('Please choose a start date before the end date, at most ten years apart.', 'danger')
+        return redirect(url_for('manager.sales_reports'))
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in reports.GRANULARITIES:
+        granularity = 'day'
+    return render_template('manager/reports.html', title='Sales Reports',
+                           report=reports.sales_report(start, end, granularity))
+
+
+@bp.route('/cache-stats')
+@manager_required
+def cache_stats():
+    # Fragment and user-principal cache hit/miss counters for this worker process
+    return jsonify(backend=type(fragment_cache.backend).__name__, fragments=fragment_cache.metrics(),
+                   identity=identity_cache.metrics())
+
+
+@bp.route('/metrics')
+@manager_required
+def metrics():
+    # Per-endpoint latency, SQL and template figures for this worker process (PROFILING_ENABLED)
+    if not request_profiler.enabled():
+        return jsonify(enabled=False), 404
+    return jsonify(enabled=True, **request_profiler.snapshot())
+
+
+@bp.route('/metrics/prometheus')
+@manager_required
+def metrics_prometheus():
+    if not request_profiler.enabled():
+        abort(404)
+    return Response(request_profiler.prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/metrics/profiles')
+@manager_required
+def metrics_profiles():
+    # cProfile output of recent sampled requests that were slower than PROFILING_SLOW_REQUEST_MS
+    if not request_profiler.enabled():
+        abort(404)
+    sections = [f"== {p['at']} {p['endpoint']} {p['path']} {p['ms']} ms, {p['sql_statements']} SQL ==\n{p['stats']}"
+                for p in request_profiler.recent_profiles()]
+    return Response('\n'.join(sections) or 'No slow sampled requests yet.\n', mimetype='text/plain')
 
 
 @bp.route('/books')
 @manager_required
 def list_books():
-    page = request.args.get('page', 1, type=int)
-    books_pagination = Book.query.order_by(Book.title.asc()).paginate(page=page, per_page=10, error_out=False)
+    cursor = request.args.get('cursor')
+    books_pagination = catalog.summary_page(Book.query, catalog.LISTING_ORDER, cursor=cursor, per_page=10,
+                                            with_total=True, total_cache_key='manager.books')
     books = books_pagination.items
     return render_template('manager/manage_books.html', title='Manage Books', books=books, pagination=books_pagination)
 
@@ -51,20 +114,12 @@ def add_book():
     if form.validate_on_submit():
         filename = None
         if form.cover_image.data:
-            # Handle file upload
-            # Ensure FLASK_APP_INSTANCE_PATH/uploads directory exists
-            # from your app instance folder (e.g., bookstore_flask_project/instance/uploads)
-            # You need to configure UPLOAD_FOLDER in config.py
-            # app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
-            # and ensure it's created.
-            # For simplicity, we'll just store the filename.
-            # In a real app, save the file securely.
-            f = form.cover_image.data
-            filename = secure_filename(f.filename)
-            # Example: f.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-            # For now, let's assume you store it and just save the name.
-            # You'd need to create the 'uploads' folder in 'instance' directory.
-            # Ensure UPLOAD_FOLDER is defined in your config.py and app/__init__.py loads it.
+            # Stored under UPLOAD_FOLDER by content hash; the same image uploaded twice is kept once
+            try:
+                filename = cover_store.save(form.cover_image.data)
+            except CoverError as e:
+                flash(str(e), 'danger')
+                return render_template('manager/add_edit_book.html', title='Add New Book', form=form, action='Add')
 
         pub_date = None
         if form.publication_date.data:
@@ -86,6 +141,8 @@ def add_book():
             publication_date=pub_date
         )
         db.session.add(new_book)
+        db.session.flush()  # To get new_book.id for the search index
+        search_index.index_book(new_book)
         db.session.commit()
         flash(f"Book '{new_book.title}' added successfully!", 'success')
         return redirect(url_for('manager.list_books'))
@@ -98,17 +155,19 @@ def add_book():
 @bp.route('/books/edit/<int:book_id>', methods=['GET', 'POST'])
 @manager_required
 def edit_book(book_id):
-    book = Book.query.get_or_404(book_id)
+    book = Book.query.options(undefer(Book.description)).get_or_404(book_id)
     form = BookForm(obj=book)  # Pre-populate form with book data
 
     if form.validate_on_submit():
         # Handle file upload for cover image if a new one is provided
+        old_cover = book.cover_image_filename
         if form.cover_image.data:
-            f = form.cover_image.data
-            new_filename = secure_filename(f.filename)
-            # Save new file, potentially delete old one
-            # Example: f.save(os.path.join(current_app.config['UPLOAD_FOLDER'], new_filename))
-            book.cover_image_filename = new_filename
+            try:
+                book.cover_image_filename = cover_store.save(form.cover_image.data)
+            except CoverError as e:
+                flash(str(e), 'danger')
+                return render_template('manager/add_edit_book.html', title=f'Edit Book: {book.title}', form=form,
+                                       book=book, action='Edit')
 
         pub_date = book.publication_date  # Keep existing if not changed
         if form.publication_date.data:
@@ -133,7 +192,10 @@ def edit_book(book_id):
         book.category = form.category.data
         book.publication_date = pub_date
 
+        search_index.index_book(book)
         db.session.commit()
+        if old_cover != book.cover_image_filename:
+            cover_store.release(old_cover)  # Only removed if no other book shares it
         flash(f"Book '{book.title}' updated successfully!", 'success')
         return redirect(url_for('manager.list_books'))
     elif request.method == 'POST':  # Form validation failed
@@ -151,18 +213,71 @@ def edit_book(book_id):
 @manager_required
 def delete_book(book_id):
     book = Book.query.get_or_404(book_id)
-    # Potentially delete associated cover image file from filesystem here
+    search_index.remove_book(book.id)
     db.session.delete(book)
     db.session.commit()
+    cover_store.release(book.cover_image_filename)  # Only removed if no other book shares it
     flash(f"Book '{book.title}' deleted successfully.", 'success')
     return redirect(url_for('manager.list_books'))
 
 
+@bp.route('/inventory/low-stock')
+@manager_required
+def low_stock():
+    # Walks the stock_quantity index from the bottom; ?threshold= overrides LOW_STOCK_THRESHOLD
+    threshold = request.args.get('threshold', type=int)
+    if threshold is None:
+        threshold = current_app.config['LOW_STOCK_THRESHOLD']
+    page = catalog.summary_page(inventory.low_stock_query(threshold), (Book.stock_quantity.asc(), Book.id.asc()),
+                                cursor=request.args.get('cursor'), per_page=25)
+    held = inventory.reserved([book.id for book in page.items]) if page.items else {}
+    return render_template('manager/low_stock.html', title='Low Stock', books=page.items, pagination=page,
+                           threshold=threshold, held=held)
+
+
+@bp.route('/books/import', methods=['GET', 'POST'])
+@manager_required
+def import_books():
+    form = BookImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.catalog_file.data
+        # Decode the upload as a stream; it is parsed and written in batches, never held in memory whole
+        text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        try:
+            report = catalog_io.import_books(text_stream, catalog_io.detect_format(upload.filename))
+        except catalog_io.CatalogFileError as e:
+            flash(str(e), 'danger')
+        except UnicodeDecodeError:
+            flash('The file must be UTF-8 encoded.', 'danger')
+        else:
+            category = 'success' if not report.error_count else 'warning'
+            flash(f'Imported {report.processed} rows: {report.inserted} added, {report.updated} updated, '
+                  f'{report.error_count} rejected.', category)
+    elif request.method == 'POST':
+        flash('Please choose a file to import.', 'danger')
+    return render_template('manager/import_books.html', title='Import Books', form=form, report=report)
+
+
+@bp.route('/books/export')
+@manager_required
+def export_books():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in catalog_io.FORMATS:
+        flash('Unknown export format.', 'danger')
+        return redirect(url_for('manager.list_books'))
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    # Streamed batch by batch so the catalog is never materialized in memory
+    return Response(stream_with_context(catalog_io.export_books(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=books.{fmt}'})
+
+
 @bp.route('/users')
 @manager_required
 def list_users():
-    page = request.args.get('page', 1, type=int)
-    users_pagination = User.query.order_by(User.username.asc()).paginate(page=page, per_page=10, error_out=False)
+    cursor = request.args.get('cursor')
+    users_pagination = keyset_paginate(User.query, (User.username.asc(), User.id.asc()), cursor=cursor, per_page=10,
+                                       with_total=True, total_cache_key='manager.users')
     users = users_pagination.items
     return render_template('manager/manage_users.html', title='Manage Users', users=users, pagination=users_pagination)
 
@@ -170,18 +285,26 @@ def list_users():
 @bp.route('/orders')
 @manager_required
 def list_orders():
-    page = request.args.get('page', 1, type=int)
-    orders_pagination = Order.query.order_by(Order.order_date.desc()).paginate(page=page, per_page=10, error_out=False)
+    cursor = request.args.get('cursor')
+    # Recent and open orders; ?archived=1 lists the old delivered/cancelled ones (see services/archive.py)
+    archived = request.args.get('archived') == '1'
+    model = ArchivedOrder if archived else Order
+    orders_pagination = keyset_paginate(model.with_customer(), (model.order_date.desc(), model.id.desc()),
+                                        cursor=cursor, per_page=10, with_total=True,
+                                        total_cache_key='manager.archived_orders' if archived else 'manager.orders')
     orders = orders_pagination.items
     return render_template('manager/manage_orders.html', title='Manage Orders', orders=orders,
-                           pagination=orders_pagination)
+                           pagination=orders_pagination, archived=archived)
 
 
 @bp.route('/orders/view/<int:order_id>')
 @manager_required
 def view_order_detail_manager(order_id):
-    order = Order.query.get_or_404(order_id)
-    return render_template('manager/view_order_detail.html', title=f'Order #{order.id} Details', order=order)
+    order = archive.get_order(order_id)
+    if order is None:
+        abort(404)
+    return render_template('manager/view_order_detail.html', title=f'Order #{order.id} Details', order=order,
+                           next_statuses=orders.next_statuses(order))
 
 
 @bp.route('/orders/update_status/<int:order_id>', methods=['POST'])
@@ -189,11 +312,15 @@ def view_order_detail_manager(order_id):
 def update_order_status(order_id):
     order = Order.query.get_or_404(order_id)
     new_status = request.form.get('status')
-    valid_statuses = ['pending_payment', 'processing', 'shipped', 'delivered', 'cancelled']  # Define your statuses
-    if new_status in valid_statuses:
-        order.status = new_status
-        db.session.commit()
-        flash(f'Order #{order.id} status updated to {new_status}.', 'success')
-    else:
+    if new_status not in orders.TRANSITIONS:
         flash('Invalid status update.', 'danger')
+    else:
+        # Notifications (and restocking, for cancellations) run as background jobs after the commit
+        try:
+            orders.transition(order, new_status)
+        except orders.InvalidTransitionError as e:
+            flash(str(e), 'danger')
+        else:
+            db.session.commit()
+            flash(f'Order #{order.id} status updated to {new_status}.', 'success')
     return redirect(url_for('manager.view_order_detail_manager', order_id=order.id))
\ No newline at end of file
@@ -0,0 +1,138 @@
+# app/services/archive.py
+# Order archival. Orders that are over (delivered or cancelled: nothing moves out of those) and older
+# than ORDERS_ARCHIVE_AFTER_DAYS move with their items from Order/OrderItem to ArchivedOrder/
+# ArchivedOrderItem, so the tables that checkout writes and the order listings and status index read
+# hold only recent and open orders. There's no partitioning in SQLite; archive tables work everywhere.
+#
+# `flask orders-archive` (run it from cron) walks Order in windows of ORDERS_ARCHIVE_BATCH ids and
+# moves each window's archivable orders in a transaction of their own, with Core statements by order
+# id, so the hot tables are locked for one short batch at a time. Rows keep their ids.
+# An order waits for a later run while:
+#   - it has items the sales reports or the recommendations haven't folded in yet (their refreshes
+#     read only the hot tables, above their watermarks),
+#   - or a job for it is still queued or running (e.g. 'orders.restock').
+# Nothing derived from orders changes: the dashboard counters, report buckets and co-purchase counts
+# already include archived orders, and their rebuilds read both tables (TABLES).
+#
+# Reads find an order in either table: get_order() for order pages, customer_orders() for a customer's
+# history (both tables merged in date order). Managers list the archive separately.
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, union_all
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import ArchivedOrder, ArchivedOrderItem, Job, Order, OrderItem, StoreStat
+from bookstore_flask_project.app.services.orders import TRANSITIONS
+from bookstore_flask_project.app.services.pagination import keyset_paginate
+from bookstore_flask_project.app.services.stats import RECOMMENDATIONS_WATERMARK, REPORTS_WATERMARK
+
+ARCHIVED_STATUSES = tuple(status for status, following in TRANSITIONS.items() if not following)
+# (orders, items) models of the hot and the archive tables, for reads over the whole order history
+TABLES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+ORDER_COLUMNS = tuple(column.name for column in Order.__table__.columns)
+ITEM_COLUMNS = tuple(column.name for column in OrderItem.__table__.columns)
+
+
+# --- moving -----------------------------------------------------------------------------------
+
+def _folded_up_to(connection):
+    """The OrderItem id every incremental fold has passed, or None if none has run yet."""
+    watermarks = connection.execute(select(StoreStat.value).where(
+        StoreStat.name.in_((REPORTS_WATERMARK, RECOMMENDATIONS_WATERMARK)))).scalars().all()
+    return int(min(watermarks)) if watermarks else None
+
+
+def _orders_with_jobs(connection):
+    # Order jobs are keyed 'order:<id>:<step>' (see orders.py); there are few unfinished ones
+    keys = connection.execute(select(Job.idempotency_key).where(
+        Job.status.in_(('queued', 'running')), Job.idempotency_key.like('order:%'))).scalars()
+    return {int(key.split(':')[1]) for key in keys}
+
+
+def _move(connection, order_ids):
+    orders, items = Order.__table__, OrderItem.__table__
+    connection.execute(insert(ArchivedOrder.__table__).from_select(
+        ORDER_COLUMNS, select(*(orders.c[name] for name in ORDER_COLUMNS)).where(orders.c.id.in_(order_ids))))
+    connection.execute(insert(ArchivedOrderItem.__table__).from_select(
+        ITEM_COLUMNS, select(*(items.c[name] for name in ITEM_COLUMNS)).where(items.c.order_id.in_(order_ids))))
+    connection.execute(delete(items).where(items.c.order_id.in_(order_ids)))
+    connection.execute(delete(orders).where(orders.c.id.in_(order_ids)))
+
+
+def archive_orders(older_than_days=None, batch_size=None):
+    """Move delivered and cancelled orders placed more than `older_than_days` ago (default
+    ORDERS_ARCHIVE_AFTER_DAYS) to the archive tables; returns how many moved. Commits each batch.
+    """
+    config = current_app.config
+    days = config['ORDERS_ARCHIVE_AFTER_DAYS'] if older_than_days is None else older_than_days
+    batch_size = batch_size or config['ORDERS_ARCHIVE_BATCH']
+    connection = db.session.connection()
+    first, newest = connection.execute(select(func.min(Order.id), func.max(Order.id))).one()
+    if newest is None:
+        return 0
+    folded, busy = _folded_up_to(connection), _orders_with_jobs(connection)
+    # SQLite can hand out the highest id again once its row is gone, so the newest order always stays
+    candidates = select(Order.id).where(Order.status.in_(ARCHIVED_STATUSES), Order.id < newest,
+                                        Order.order_date < datetime.utcnow() - timedelta(days=days))
+    if folded is not None:
+        candidates = candidates.where(
+            ~select(OrderItem.id).where(OrderItem.order_id == Order.id, OrderItem.id > folded).exists())
+
+    # Walk the ids in windows of `batch_size`: each batch reads one primary-key range, however far in
+    moved = 0
+    for low in range(first - 1, newest - 1, batch_size):
+        order_ids = db.session.execute(
+            candidates.where(Order.id > low, Order.id <= low + batch_size)).scalars().all()
+        order_ids = [order_id for order_id in order_ids if order_id not in busy]
+        if order_ids:
+            # Core statements: the orders still count (stats.py's events stay out of it)
+            _move(db.session.connection(), order_ids)
+            db.session.commit()
+            moved += len(order_ids)
+    return moved
+
+
+# --- reads ------------------------------------------------------------------------------------
+
+def get_order(order_id):
+    """The order from whichever table has it, with its line items and their books loaded; None if neither does."""
+    return Order.with_line_items().filter(Order.id == order_id).first() \
+        or ArchivedOrder.with_line_items().filter(ArchivedOrder.id == order_id).first()
+
+
+def customer_orders(user_id, fields):
+    """Column query over `user_id`'s orders in both tables (`fields`: Order column names), and the
+    columns of the union for sort keys (.order_date, .id).
+    """
+    names = tuple(dict.fromkeys((*fields, 'order_date', 'id')))
+    both = union_all(*(select(*(orders.__table__.c[name] for name in names)).where(orders.user_id == user_id)
+                       for orders, _ in TABLES)).subquery()
+    return db.session.query(*(both.c[name] for name in fields)), both.c
+
+
+def customer_history(user_id, cursor=None, per_page=10):
+    """A keyset page of `user_id`'s orders from both tables, newest first, as Order/ArchivedOrder objects."""
+    query, columns = customer_orders(user_id, ('id',))
+    page = keyset_paginate(query, (columns.order_date.desc(), columns.id.desc()), cursor=cursor, per_page=per_page)
+    order_ids = [order_id for order_id, in page.items]
+    found = {order.id: order for order in Order.query.filter(Order.id.in_(order_ids))} if order_ids else {}
+    archived = [order_id for order_id in order_ids if order_id not in found]
+    if archived:  # Also catches an order archived since the page query
+        found.update((order.id, order) for order in ArchivedOrder.query.filter(ArchivedOrder.id.in_(archived)))
+    page.items = [found[order_id] for order_id in order_ids if order_id in found]
+    return page
+
+
+def init_app(app):
+    import click
+
+    app.config.setdefault('ORDERS_ARCHIVE_AFTER_DAYS', 180)
+    app.config.setdefault('ORDERS_ARCHIVE_BATCH', 500)
+
+    @app.cli.command('orders-archive')
+    @click.option('--older-than-days', type=int, default=None, help='Default: ORDERS_ARCHIVE_AFTER_DAYS.')
+    @click.option('--batch-size', type=int, default=None, help='Default: ORDERS_ARCHIVE_BATCH.')
+    def orders_archive(older_than_days, batch_size):
+        """Move old delivered and cancelled orders to the archive tables."""
+        click.echo(f'Archived {archive_orders(older_than_days, batch_size)} orders.')
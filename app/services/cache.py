@@ -0,0 +1,230 @@
+# app/services/cache.py
+# Server-side cache for rendered page fragments.
+#
+# Backends (CACHE_BACKEND in config):
+#   - 'lru'        : in-process LRU with per-entry TTL (default),
+#   - 'filesystem' : pickled entries under CACHE_DIR, shared by all workers on the host,
+#   - 'redis'      : any redis-py compatible client (CACHE_REDIS_URL); tests can hand
+#                    RedisCache a fake client instead,
+#   - 'null'       : caching disabled.
+#
+# Keys are versioned rather than deleted: the home page fragment is keyed on the catalog version
+# (stats.catalog_version(), bumped whenever a book is added, edited or deleted; the lists show no
+# stock) and each book detail fragment on that book's updated_at, which sales move too. Both are read from the database, so every worker sees
+# a new version as soon as its transaction commits, whichever backend holds the fragments; entries
+# for old versions are never read again and age out.
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileSystemCache(CacheBackend):
+    def __init__(self, directory, default_ttl=300):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        # Write to a temp file and rename, so readers never see a half-written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires_at, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class RedisCache(CacheBackend):
+    def __init__(self, client, default_ttl=300, prefix='bookstore:'):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def _make_backend(config, instance_path):
+    name = config['CACHE_BACKEND']
+    ttl = config['CACHE_DEFAULT_TTL']
+    if name == 'null':
+        return NullCache()
+    if name == 'lru':
+        return LRUCache(max_entries=config['CACHE_MAX_ENTRIES'], default_ttl=ttl)
+    if name == 'filesystem':
+        return FileSystemCache(config['CACHE_DIR'] or os.path.join(instance_path, 'cache'), default_ttl=ttl)
+    if name == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' requires the 'redis' package to be installed.")
+        return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), default_ttl=ttl)
+    raise ValueError(f'Unknown CACHE_BACKEND: {name!r}')
+
+
+class FragmentCache:
+    """Flask extension: versioned fragment caching with hit/miss counters per fragment name."""
+
+    def __init__(self, app=None):
+        self._metrics_lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, backend=None):
+        app.config.setdefault('CACHE_BACKEND', 'lru')
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_DIR', None)
+        app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        app.extensions['fragment_cache'] = backend or _make_backend(app.config, app.instance_path)
+
+    @property
+    def backend(self):
+        return current_app.extensions['fragment_cache']
+
+    def _count(self, counters, name):
+        with self._metrics_lock:
+            counters[name] = counters.get(name, 0) + 1
+
+    def get_or_render(self, name, key, render, ttl=None):
+        """Return the cached value for (name, key), calling render() to produce and store it on a miss.
+
+        render() may return None (e.g. the book doesn't exist); that result is not cached.
+        """
+        cache_key = f'fragment:{name}:{key}'
+        value = self.backend.get(cache_key)
+        if value is not None:
+            self._count(self.hits, name)
+            return value
+        self._count(self.misses, name)
+        value = render()
+        if value is not None:
+            self.backend.set(cache_key, value, ttl)
+        return value
+
+    def metrics(self):
+        with self._metrics_lock:
+            result = {}
+            for name in sorted(set(self.hits) | set(self.misses)):
+                hits, misses = self.hits.get(name, 0), self.misses.get(name, 0)
+                result[name] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 3)}
+            return result
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,493 @@
+# app/services/cart.py
+# Shopping carts kept in a fast store, written behind to the CartItem table.
+#
+# Cart pages and mutations (add / update / remove) work on a {book_id: quantity} map held in a
+# CartStore (CART_STORE in config):
+#   - 'session' : in Flask's signed session cookie (default; works with any number of workers),
+#   - 'redis'   : a hash per user in Redis (CACHE_REDIS_URL), shared by all workers,
+#   - 'memory'  : an in-process dict; only for single-process deployments, and the fake tests use.
+# A cart is loaded from CartItem the first time it's needed, and a change only marks it dirty.
+# Changes are written to the store one line at a time (loads never overwrite a stored cart), so
+# concurrent changes to one cart (two tabs, the API and the site) can't undo each other.
+# Dirty carts are persisted to CartItem in batches: always before checkout (which reads CartItem),
+# on logout, and for the shared stores every CART_FLUSH_INTERVAL seconds by a background flusher
+# (or `flask cart-flush`). Keying carts by book id keeps the one-row-per-(user, book) rule of
+# CartItem's _user_book_uc constraint. Adding a book or raising its quantity also holds the copies
+# for the shopper (see inventory.py); lowering or removing a line doesn't write anything, and the
+# holds are trimmed to the cart when it is persisted.
+#
+# Flushing first *claims* a cart (atomically clearing its dirty mark), then writes it, so a change
+# made while it's being written marks it dirty again and goes out in the next flush.
+import atexit
+import threading
+from datetime import datetime
+
+from flask import current_app, session
+from flask_login import user_logged_out
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem
+from bookstore_flask_project.app.services import inventory, totals
+
+MAX_LINE_QUANTITY = 100  # Same cap as AddToCartForm / UpdateCartItemForm
+
+
+class CartError(Exception):
+    """Raised for cart changes that can't be made; str(e) is safe to flash to the user."""
+
+
+class NotEnoughStockError(CartError):
+    pass
+
+
+class CartLine:
+    """One cart row for templates: mirrors the CartItem attributes pages use. `id` is the book id."""
+
+    def __init__(self, book, quantity):
+        self.id = book.id
+        self.book_id = book.id
+        self.book = book
+        self.quantity = quantity
+
+    @property
+    def subtotal_cents(self):
+        return self.book.price_cents * self.quantity
+
+    @property
+    def subtotal(self):
+        return self.book.price * self.quantity
+
+
+# --- stores -----------------------------------------------------------------------------------
+
+class CartStore:
+    def load(self, user_id):
+        """The user's {book_id: quantity}, or None if this store doesn't hold their cart yet."""
+        raise NotImplementedError
+
+    def fill(self, user_id, items):
+        """Store a cart just loaded from CartItem (not dirty), unless another request stored it first."""
+        raise NotImplementedError
+
+    def update_line(self, user_id, book_id, quantity):
+        """Set one line (0 removes it) and mark the cart dirty, leaving its other lines as they are in
+        the store; False if the store doesn't hold the user's cart."""
+        raise NotImplementedError
+
+    def evict(self, user_id):
+        raise NotImplementedError
+
+    def claim(self, user_id):
+        """Clear the user's dirty mark; True if it was set (the caller must now persist the cart)."""
+        raise NotImplementedError
+
+    def claim_dirty(self, limit):
+        """Claim up to `limit` dirty carts; returns their user ids."""
+        return []
+
+    def mark_dirty(self, user_id):
+        raise NotImplementedError
+
+    # Stores that need the background flusher (dirty carts not reachable from a later request)
+    background_flush = False
+
+
+class MemoryCartStore(CartStore):
+    background_flush = True
+
+    def __init__(self):
+        self._carts = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        with self._lock:
+            items = self._carts.get(user_id)
+            return dict(items) if items is not None else None
+
+    def fill(self, user_id, items):
+        with self._lock:
+            self._carts.setdefault(user_id, dict(items))
+
+    def update_line(self, user_id, book_id, quantity):
+        with self._lock:
+            items = self._carts.get(user_id)
+            if items is None:
+                return False
+            if quantity:
+                items[book_id] = quantity
+            else:
+                items.pop(book_id, None)
+            self._dirty.add(user_id)
+            return True
+
+    def evict(self, user_id):
+        with self._lock:
+            self._carts.pop(user_id, None)
+            self._dirty.discard(user_id)
+
+    def claim(self, user_id):
+        with self._lock:
+            if user_id in self._dirty:
+                self._dirty.discard(user_id)
+                return True
+            return False
+
+    def claim_dirty(self, limit):
+        with self._lock:
+            claimed = list(self._dirty)[:limit]
+            self._dirty.difference_update(claimed)
+            return claimed
+
+    def mark_dirty(self, user_id):
+        with self._lock:
+            if user_id in self._carts:
+                self._dirty.add(user_id)
+
+
+class RedisCartStore(CartStore):
+    """Hash `cart:<user_id>` of book_id -> quantity (plus a marker field), and a set of dirty user ids."""
+    background_flush = True
+    LOADED = '_loaded'  # Present in every stored cart, so an empty cart is distinguishable from a miss
+
+    def __init__(self, client, prefix='bookstore:', ttl=30 * 24 * 3600):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.dirty_key = prefix + 'cart:dirty'
+
+    def _key(self, user_id):
+        return f'{self.prefix}cart:{user_id}'
+
+    def load(self, user_id):
+        raw = self.client.hgetall(self._key(user_id))
+        if not raw:
+            return None
+        items = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field != self.LOADED:
+                items[int(field)] = int(value)
+        return items
+
+    # Both writes WATCH the cart's key and check it exists in MULTI/EXEC (client.transaction() retries
+    # if the key changes in between), so a cart evicted meanwhile isn't recreated with one line
+
+    def fill(self, user_id, items):
+        key = self._key(user_id)
+
+        def write(pipe):
+            if pipe.exists(key):
+                return
+            pipe.multi()
+            pipe.hset(key, mapping={self.LOADED: 1, **{str(book_id): qty for book_id, qty in items.items()}})
+            pipe.expire(key, self.ttl)
+
+        self.client.transaction(write, key)
+
+    def update_line(self, user_id, book_id, quantity):
+        key = self._key(user_id)
+
+        def write(pipe):
+            if not pipe.exists(key):
+                return False
+            pipe.multi()
+            if quantity:
+                pipe.hset(key, str(book_id), quantity)
+            else:
+                pipe.hdel(key, str(book_id))
+            pipe.expire(key, self.ttl)
+            pipe.sadd(self.dirty_key, user_id)
+            return True
+
+        return self.client.transaction(write, key, value_from_callable=True)
+
+    def evict(self, user_id):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(user_id))
+        pipe.srem(self.dirty_key, user_id)
+        pipe.execute()
+
+    def claim(self, user_id):
+        return bool(self.client.srem(self.dirty_key, user_id))
+
+    def claim_dirty(self, limit):
+        return [int(user_id) for user_id in self.client.spop(self.dirty_key, limit) or ()]
+
+    def mark_dirty(self, user_id):
+        self.client.sadd(self.dirty_key, user_id)
+
+
+class SessionCartStore(CartStore):
+    """The cart lives in the (signed) session cookie; only usable inside a request for that user."""
+
+    def _cart(self, user_id):
+        data = session.get('cart')
+        return data if data and data.get('user') == user_id else None
+
+    def load(self, user_id):
+        data = self._cart(user_id)
+        return {int(book_id): qty for book_id, qty in data['items'].items()} if data else None
+
+    def fill(self, user_id, items):
+        if self._cart(user_id) is None:
+            session['cart'] = {'user': user_id, 'items': {str(book_id): qty for book_id, qty in items.items()},
+                               'dirty': False}
+
+    def update_line(self, user_id, book_id, quantity):
+        data = self._cart(user_id)
+        if data is None:
+            return False
+        items = dict(data['items'])
+        if quantity:
+            items[str(book_id)] = quantity
+        else:
+            items.pop(str(book_id), None)
+        session['cart'] = {'user': user_id, 'items': items, 'dirty': True}
+        return True
+
+    def evict(self, user_id):
+        if self._cart(user_id):
+            session.pop('cart', None)
+
+    def claim(self, user_id):
+        data = self._cart(user_id)
+        if not data or not data['dirty']:
+            return False
+        session['cart'] = {**data, 'dirty': False}
+        return True
+
+    def mark_dirty(self, user_id):
+        data = self._cart(user_id)
+        if data:
+            session['cart'] = {**data, 'dirty': True}
+
+
+def _make_store(config):
+    name = config['CART_STORE']
+    if name == 'session':
+        return SessionCartStore()
+    if name == 'memory':
+        return MemoryCartStore()
+    if name == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CART_STORE='redis' requires the 'redis' package to be installed.")
+        return RedisCartStore(redis.Redis.from_url(config['CACHE_REDIS_URL']))
+    raise ValueError(f'Unknown CART_STORE: {name!r}')
+
+
+def _store():
+    return current_app.extensions['cart_store']
+
+
+# --- reads ------------------------------------------------------------------------------------
+
+def get_items(user_id):
+    """The user's cart as {book_id: quantity}, loading it from CartItem on a store miss."""
+    store = _store()
+    items = store.load(user_id)
+    if items is None:
+        items = dict(db.session.execute(
+            select(CartItem.book_id, CartItem.quantity).where(CartItem.user_id == user_id)
+        ).all())
+        store.fill(user_id, items)
+    return items
+
+
+def lines(user_id):
+    """CartLines with their books, by book id; one Book query for the whole cart."""
+    items = get_items(user_id)
+    if not items:
+        return []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(items))}
+    return [CartLine(books[book_id], quantity) for book_id, quantity in sorted(items.items()) if book_id in books]
+
+
+def cart_totals(cart_lines):
+    """Totals of loaded CartLines: an integer sum over the books `lines()` already fetched."""
+    return totals.of_lines(cart_lines)
+
+
+# --- writes -----------------------------------------------------------------------------------
+
+def add(user_id, book, quantity):
+    """Add `quantity` of `book` to the cart and hold the copies; raises NotEnoughStockError."""
+    items = get_items(user_id)
+    current = items.get(book.id, 0)
+    if current + quantity > MAX_LINE_QUANTITY:
+        raise CartError(f"You can have at most {MAX_LINE_QUANTITY} copies of '{book.title}' in your cart.")
+    try:
+        inventory.hold(user_id, book, current + quantity)
+    except inventory.NotAvailableError as e:
+        if e.available < quantity or not current:
+            raise NotEnoughStockError(f"Sorry, only {e.available} of '{book.title}' available in stock.")
+        raise NotEnoughStockError(
+            f"Cannot add {quantity} more. Only {e.available - current} additional items of "
+            f"'{book.title}' available.")
+    _save_line(user_id, book.id, current + quantity)
+
+
+def set_quantity(user_id, book, quantity):
+    """Set a line's quantity (0 removes it), holding copies for an increase; raises CartError /
+    NotEnoughStockError."""
+    items = get_items(user_id)
+    if book.id not in items:
+        raise CartError('That book is not in your cart.')
+    if quantity > items[book.id]:
+        try:
+            inventory.hold(user_id, book, quantity)
+        except inventory.NotAvailableError as e:
+            raise NotEnoughStockError(f"Sorry, only {e.available} of '{book.title}' available. Cart not updated.")
+    _save_line(user_id, book.id, quantity)  # A lower quantity's hold is trimmed when the cart is persisted
+
+
+def remove(user_id, book_id):
+    """Remove a line; returns False if it wasn't in the cart."""
+    if book_id not in get_items(user_id):
+        return False
+    _save_line(user_id, book_id, 0)  # Its hold goes when the cart is persisted
+    return True
+
+
+def forget(user_id):
+    """Drop the store's copy (e.g. after checkout changed CartItem); it's reloaded on next use."""
+    _store().evict(user_id)
+
+
+def _save_line(user_id, book_id, quantity):
+    store = _store()
+    if not store.update_line(user_id, book_id, quantity):
+        get_items(user_id)  # Evicted meanwhile (e.g. by a checkout): reload it from CartItem first
+        store.update_line(user_id, book_id, quantity)
+    if store.background_flush:
+        _flusher.ensure_running(current_app._get_current_object())
+
+
+# --- write-behind -----------------------------------------------------------------------------
+
+def flush(user_id=None, batch_size=500):
+    """Persist dirty carts to CartItem: just `user_id`'s, or (user_id=None) every claimable one.
+
+    Returns the number of carts written.
+    """
+    store = _store()
+    if user_id is not None:
+        return _persist(store, [user_id]) if store.claim(user_id) else 0
+    written = 0
+    while True:
+        user_ids = store.claim_dirty(batch_size)
+        if not user_ids:
+            return written
+        written += _persist(store, user_ids)
+
+
+def _persist(store, user_ids):
+    """Write the claimed carts in one transaction; on failure they're marked dirty again."""
+    carts = {user_id: store.load(user_id) for user_id in user_ids}
+    carts = {user_id: items for user_id, items in carts.items() if items is not None}
+    if not carts:
+        return 0
+    try:
+        wanted_books = {book_id for items in carts.values() for book_id in items}
+        live_books = set(db.session.execute(select(Book.id).where(Book.id.in_(wanted_books))).scalars()) \
+            if wanted_books else set()
+        existing = db.session.execute(
+            select(CartItem.id, CartItem.user_id, CartItem.book_id, CartItem.quantity)
+            .where(CartItem.user_id.in_(list(carts)))
+        ).all()
+
+        seen, stale_ids, to_update = set(), [], []
+        for row in existing:
+            quantity = carts[row.user_id].get(row.book_id)
+            if quantity is None or row.book_id not in live_books:
+                stale_ids.append(row.id)
+            else:
+                seen.add((row.user_id, row.book_id))
+                if quantity != row.quantity:
+                    to_update.append({'id': row.id, 'quantity': quantity})
+        now = datetime.utcnow()
+        to_insert = [{'user_id': user_id, 'book_id': book_id, 'quantity': quantity, 'added_at': now}
+                     for user_id, items in carts.items() for book_id, quantity in items.items()
+                     if book_id in live_books and (user_id, book_id) not in seen]
+
+        if stale_ids:
+            db.session.execute(delete(CartItem).where(CartItem.id.in_(stale_ids))
+                               .execution_options(synchronize_session=False))
+        if to_update:
+            db.session.execute(update(CartItem), to_update)  # Bulk UPDATE by primary key
+        if to_insert:
+            db.session.execute(insert(CartItem), to_insert)
+        inventory.trim(carts)  # Lines lowered or removed since still hold their earlier copies
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        for user_id in carts:
+            store.mark_dirty(user_id)
+        raise
+    return len(carts)
+
+
+class _Flusher:
+    """Daemon thread that flushes dirty carts every CART_FLUSH_INTERVAL seconds (started on first use)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._apps = {}
+
+    def ensure_running(self, app):
+        if app in self._apps:
+            return
+        with self._lock:
+            if app in self._apps:
+                return
+            stop = threading.Event()
+            thread = threading.Thread(target=self._run, args=(app, stop), name='cart-flusher', daemon=True)
+            self._apps[app] = stop
+            thread.start()
+            # Last chance for carts held only in this process
+            atexit.register(self._flush_once, app)
+
+    def _run(self, app, stop):
+        while not stop.wait(app.config['CART_FLUSH_INTERVAL']):
+            self._flush_once(app)
+
+    @staticmethod
+    def _flush_once(app):
+        with app.app_context():
+            try:
+                flush()
+            except Exception:
+                app.logger.exception('Cart flush failed; dirty carts will be retried')
+            finally:
+                db.session.remove()
+
+
+_flusher = _Flusher()
+
+
+def _flush_on_logout(sender, user, **extra):
+    try:
+        flush(user.id)
+    except SQLAlchemyError:
+        sender.logger.exception('Could not persist the cart of user %s at logout', user.id)
+    else:
+        forget(user.id)  # Don't leave it in the session cookie of a shared computer
+
+
+def init_app(app, store=None):
+    import click
+
+    app.config.setdefault('CART_STORE', 'session')
+    app.config.setdefault('CART_FLUSH_INTERVAL', 30)
+    app.extensions['cart_store'] = store or _make_store(app.config)
+    user_logged_out.connect(_flush_on_logout, app)
+
+    @app.cli.command('cart-flush')
+    @click.option('--batch-size', default=500, show_default=True)
+    def cart_flush(batch_size):
+        """Persist dirty carts from the shared cart store to the database."""
+        click.echo(f'Flushed {flush(batch_size=batch_size)} carts.')
@@ -0,0 +1,110 @@
+# app/services/catalog.py
+# Compact read model for catalog listings: the home page lists, browse_books and the manager's
+# book and low-stock lists.
+#
+# A listing only shows a tile per book, so it selects just the tile's columns into BookSummary
+# tuples instead of loading Book objects (no description text, no identity-map entry or instance
+# state per book). A BookSummary has the Book attributes the tiles use, `price` included, so the
+# templates work with either.
+#
+# With CATALOG_SNAPSHOT_SIZE > 0, pages of the listing without a search (facet filters or none) are
+# also kept in process, by filters and cursor, for the current listing version
+# (stats.listing_version(): the catalog version, which books being added, edited or deleted bump,
+# and a CATALOG_STOCK_TTL window for the stock); a new version drops them all.
+# Summaries are immutable tuples, so requests on every thread can share a cached page.
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services import facets
+from bookstore_flask_project.app.services.money import from_cents
+from bookstore_flask_project.app.services.pagination import keyset_paginate
+
+SUMMARY_FIELDS = ('id', 'title', 'author', 'isbn', 'price_cents', 'stock_quantity', 'category',
+                  'cover_image_filename')
+SUMMARY_COLUMNS = tuple(getattr(Book, field) for field in SUMMARY_FIELDS)
+LISTING_ORDER = (Book.title.asc(), Book.id.asc())
+
+
+class BookSummary(namedtuple('BookSummary', SUMMARY_FIELDS)):
+    """The columns of a book tile; `price` is the Decimal view of price_cents, as on Book."""
+    __slots__ = ()
+
+    @property
+    def price(self):
+        return from_cents(self.price_cents)
+
+
+def summary_query(query):
+    """`query` (over Book) narrowed to the summary columns."""
+    return query.with_entities(*SUMMARY_COLUMNS)
+
+
+def summary_page(query, sort_keys, **kwargs):
+    """keyset_paginate() over the summary columns; the page's items are BookSummary tuples."""
+    page = keyset_paginate(summary_query(query), sort_keys, **kwargs)
+    page.items = [BookSummary._make(row) for row in page.items]
+    return page
+
+
+def newest(order_by, limit):
+    """The first `limit` books by `order_by`, as summaries (for the home page lists)."""
+    return [BookSummary._make(row) for row in db.session.query(*SUMMARY_COLUMNS).order_by(order_by).limit(limit)]
+
+
+class CatalogSnapshot:
+    """In-process LRU of listing pages for one catalog version."""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._version = None
+        self._pages = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get_or_build(self, key, version, build):
+        with self._lock:
+            if version != self._version:
+                self._version, self._pages = version, OrderedDict()
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+        page = build()  # Outside the lock; two threads may build the same page, both are right
+        with self._lock:
+            if version == self._version:
+                self._pages[key] = page
+                while len(self._pages) > self.size:
+                    self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._version, self._pages = None, OrderedDict()
+
+
+def listing_page(cursor, per_page, version=None, filters=None):
+    """A page of the catalog by title, from the snapshot when `version` is given and it is on.
+
+    `filters` (facets.Filters) narrow it to a category, price range...
+    """
+    filters = filters or facets.Filters()
+
+    def build():
+        return summary_page(facets.apply_filters(Book.query, filters), LISTING_ORDER, cursor=cursor, per_page=per_page)
+
+    snapshot = current_app.extensions.get('catalog_snapshot')
+    if snapshot is None or version is None:
+        return build()
+    return snapshot.get_or_build((filters, cursor, per_page), version, build)
+
+
+def init_app(app):
+    app.config.setdefault('CATALOG_SNAPSHOT_SIZE', 64)
+    size = app.config['CATALOG_SNAPSHOT_SIZE']
+    app.extensions['catalog_snapshot'] = CatalogSnapshot(size) if size > 0 else None
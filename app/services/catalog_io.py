@@ -0,0 +1,302 @@
+# app/services/catalog_io.py
+# Streaming bulk import/export of the Book catalog (CSV and JSON Lines).
+#
+# Import reads the input lazily, validates each row with the rules declared on BookForm
+# (compiled once into plain checks, so there is no per-row form overhead), and upserts by ISBN
+# in batches: one SELECT per batch to find existing ISBNs, then one executemany INSERT and one
+# executemany UPDATE. Bad rows are reported by line number and skipped; good rows still land.
+# Prices in the files are decimal amounts ("12.34"); the table stores integer cents.
+#
+# Bulk statements skip the ORM events that maintain the search index, dashboard counters and
+# catalog version, so each batch re-indexes its books (and sets their updated_at) itself and the
+# import finishes with a stats reconcile and a catalog version bump.
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import insert, select, update
+from wtforms import DecimalField, FloatField, IntegerField
+from wtforms.validators import DataRequired, Length, NumberRange
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.forms import BookForm
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services import facets, stats
+from bookstore_flask_project.app.services.money import from_cents, to_cents
+from bookstore_flask_project.app.services.search import search_index
+
+# Columns in import/export files, in export order
+COLUMNS = ('title', 'author', 'isbn', 'description', 'price', 'stock_quantity', 'category', 'publication_date')
+# ...and the Book columns they're stored in
+DB_COLUMNS = tuple('price_cents' if column == 'price' else column for column in COLUMNS)
+FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 1000
+
+
+class CatalogFileError(Exception):
+    """Raised for problems with the file as a whole (unknown format, missing header...)."""
+
+
+def _compile_rules():
+    """Turn BookForm's field validators into (column, type, required, min_len, max_len, min, max) rules."""
+    rules = []
+    for column in COLUMNS:
+        unbound = getattr(BookForm, column)
+        rule = {'type': str, 'required': False, 'min_len': None, 'max_len': None, 'min': None, 'max': None}
+        if issubclass(unbound.field_class, DecimalField):
+            rule['type'] = Decimal
+        elif issubclass(unbound.field_class, FloatField):
+            rule['type'] = float
+        elif issubclass(unbound.field_class, IntegerField):
+            rule['type'] = int
+        for validator in unbound.kwargs.get('validators', ()):
+            if isinstance(validator, DataRequired):
+                rule['required'] = True
+            elif isinstance(validator, Length):
+                rule['min_len'] = validator.min if validator.min >= 0 else None
+                rule['max_len'] = validator.max if validator.max >= 0 else None
+            elif isinstance(validator, NumberRange):
+                rule['min'], rule['max'] = validator.min, validator.max
+        rules.append((column, rule))
+    return rules
+
+
+RULES = _compile_rules()
+
+
+def validate_row(raw):
+    """Return (values, None) for a valid row or (None, message) for an invalid one.
+
+    Columns absent from the input are left out of `values`, so an upsert doesn't blank them.
+    `values` is keyed by DB_COLUMNS.
+    """
+    values = {}
+    for column, rule in RULES:
+        if column not in raw and not rule['required']:
+            continue
+        value = raw.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            if rule['required']:
+                return None, f'{column}: This field is required.'
+            values[column] = None
+            continue
+        if rule['type'] is not str:
+            try:
+                # Decimal from str, so a JSON number like 19.99 is read as written
+                value = rule['type'](str(value) if rule['type'] is Decimal else value)
+                if rule['type'] is Decimal and not value.is_finite():
+                    raise ValueError(value)
+            except (TypeError, ValueError, ArithmeticError):
+                return None, f'{column}: Not a valid {rule["type"].__name__.lower()} value.'
+            if rule['min'] is not None and value < rule['min']:
+                return None, f'{column}: Must be at least {rule["min"]}.'
+            if rule['max'] is not None and value > rule['max']:
+                return None, f'{column}: Must be at most {rule["max"]}.'
+        else:
+            value = str(value)
+            if rule['max_len'] is not None and len(value) > rule['max_len']:
+                return None, f'{column}: Field cannot be longer than {rule["max_len"]} characters.'
+            if rule['min_len'] is not None and len(value) < rule['min_len']:
+                return None, f'{column}: Field must be at least {rule["min_len"]} characters long.'
+        values[column] = value
+
+    if values.get('publication_date'):
+        # Same format the add/edit book routes accept
+        try:
+            values['publication_date'] = datetime.strptime(values['publication_date'], '%Y-%m-%d').date()
+        except ValueError:
+            return None, 'publication_date: Invalid format. Please use YYYY-MM-DD.'
+    if 'price' in values:
+        values['price_cents'] = to_cents(values.pop('price'))
+    return values, None
+
+
+def detect_format(filename, default='csv'):
+    lowered = (filename or '').lower()
+    if lowered.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if lowered.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(text_stream, fmt):
+    """Yield (line_number, raw dict or error message) from a text stream without loading it all."""
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        if reader.fieldnames is None or 'title' not in reader.fieldnames:
+            raise CatalogFileError('CSV input needs a header row including at least a "title" column.')
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f'Invalid JSON: {e}'
+                continue
+            yield line_number, row if isinstance(row, dict) else 'Expected a JSON object.'
+    else:
+        raise CatalogFileError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # (line_number, message), capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    def as_dict(self):
+        return {'processed': self.processed, 'inserted': self.inserted, 'updated': self.updated,
+                'error_count': self.error_count, 'errors': self.errors}
+
+
+def _flush_batch(batch, report):
+    """Upsert one batch of validated rows (dicts keyed by DB_COLUMNS) by ISBN."""
+    # Later rows win when the same ISBN appears twice in a batch
+    by_isbn, without_isbn = {}, []
+    for values in batch:
+        if values.get('isbn'):
+            by_isbn[values['isbn']] = values
+        else:
+            without_isbn.append(values)
+
+    existing = dict(db.session.execute(
+        select(Book.isbn, Book.id).where(Book.isbn.in_(list(by_isbn)))
+    ).all()) if by_isbn else {}
+
+    now = datetime.utcnow()
+    to_insert = without_isbn + [values for isbn, values in by_isbn.items() if isbn not in existing]
+    to_update = [{**values, 'id': existing[isbn], 'updated_at': now}
+                 for isbn, values in by_isbn.items() if isbn in existing]
+
+    touched_ids = []
+    if to_insert:
+        touched_ids.extend(db.session.execute(
+            insert(Book).returning(Book.id),
+            [{**dict.fromkeys(DB_COLUMNS), **values, 'created_at': now, 'updated_at': now} for values in to_insert]
+        ).scalars().all())
+    if to_update:
+        db.session.execute(update(Book), to_update)  # Bulk UPDATE by primary key
+        touched_ids.extend(values['id'] for values in to_update)
+
+    search_index.reindex_books(touched_ids)
+    db.session.commit()
+
+    report.inserted += len(to_insert)
+    report.updated += len(to_update)
+
+
+def import_books(text_stream, fmt='csv', batch_size=5000):
+    """Stream-import books from a text stream; returns an ImportReport."""
+    report = ImportReport()
+    batch = []
+    try:
+        for line_number, raw in read_rows(text_stream, fmt):
+            report.processed += 1
+            if isinstance(raw, str):
+                report.add_error(line_number, raw)
+                continue
+            values, error = validate_row(raw)
+            if error:
+                report.add_error(line_number, error)
+                continue
+            batch.append(values)
+            if len(batch) >= batch_size:
+                _flush_batch(batch, report)
+                batch = []
+        if batch:
+            _flush_batch(batch, report)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if report.inserted or report.updated:
+            stats.reconcile()
+            facets.rebuild()  # The bulk statements skip the facet count events
+            stats.bump_catalog_version()
+    return report
+
+
+def export_rows(batch_size=5000):
+    """Yield catalog rows as dicts, reading in primary-key order one batch at a time."""
+    columns = [Book.id] + [getattr(Book, column) for column in DB_COLUMNS]
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(Book.id > last_id).order_by(Book.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        for row in rows:
+            values = dict(zip(COLUMNS, row[1:]))
+            if values['publication_date']:
+                values['publication_date'] = values['publication_date'].isoformat()
+            if values['price'] is not None:
+                values['price'] = float(from_cents(values['price']))  # Shortest repr: 12.34, never 12.340000000000002
+            yield values
+        last_id = rows[-1][0]
+
+
+def export_books(fmt='csv', batch_size=5000):
+    """Yield the catalog as CSV or JSON Lines text chunks (one chunk per batch)."""
+    if fmt not in FORMATS:
+        raise CatalogFileError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    for count, values in enumerate(export_rows(batch_size), start=1):
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(values, ensure_ascii=False))
+            buffer.write('\n')
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def init_app(app):
+    import click
+
+    @app.cli.command('catalog-import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+                  help='Input format (default: from the file extension).')
+    @click.option('--batch-size', default=5000, show_default=True)
+    def catalog_import(path, fmt, batch_size):
+        """Bulk import/upsert books from a CSV or JSON Lines file."""
+        with open(path, newline='', encoding='utf-8') as f:
+            report = import_books(f, fmt or detect_format(path), batch_size=batch_size)
+        click.echo(f'Processed {report.processed} rows: {report.inserted} inserted, '
+                   f'{report.updated} updated, {report.error_count} rejected.')
+        for line_number, message in report.errors:
+            click.echo(f'  line {line_number}: {message}', err=True)
+
+    @app.cli.command('catalog-export')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+                  help='Output format (default: from the file extension).')
+    def catalog_export(path, fmt):
+        """Export the whole catalog to a CSV or JSON Lines file."""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in export_books(fmt or detect_format(path)):
+                f.write(chunk)
+        click.echo(f'Catalog exported to {path}.')
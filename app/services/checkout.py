@@ -0,0 +1,129 @@
+# app/services/checkout.py
+# Turning a user's cart into an order, as one transaction:
+#   1. read the cart and its books in a single joined SELECT,
+#   2. delete those cart rows, which must all still be there: the DELETE locks them, so of two
+#      checkouts of the same cart (a double submit) the second waits, finds them gone and raises
+#      EmptyCartError instead of taking stock and placing a second order,
+#   3. decrement stock for every line in a single conditional UPDATE
+#      (... WHERE stock_quantity - copies other shoppers hold >= requested), so concurrent checkouts
+#      can never oversell, nor take copies held for someone else's cart (see inventory.py),
+#   4. insert the Order with its totals (integer cents, summed from the lines read in step 1),
+#      bulk-insert its OrderItems and drop the shopper's holds on the purchased books,
+#   5. queue the 'orders.confirm' job (payment, confirmation) for after the commit.
+# If any line is short on stock the UPDATE matches fewer rows than there are lines, the whole
+# transaction is rolled back and OutOfStockError names the offending book.
+from sqlalchemy import case, delete, insert, select, update
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, Order, OrderItem
+from bookstore_flask_project.app.services import inventory, orders, recommendations, totals
+
+SHIPPING_FIELDS = ('name', 'address1', 'address2', 'city', 'state', 'zip_code', 'country')
+
+
+class CheckoutError(Exception):
+    """Base class for checkout failures; str(e) is safe to flash to the user."""
+
+
+class EmptyCartError(CheckoutError):
+    def __init__(self):
+        super().__init__('Your cart is empty. Add some books before checking out!')
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, title, available):
+        self.title = title
+        self.available = available
+        super().__init__(f"Sorry, '{title}' stock changed. Only {available} available.")
+
+
+def cart_lines(user_id):
+    """Cart rows with the book fields checkout needs, in one joined query (no per-item lazy loads)."""
+    return db.session.execute(
+        select(CartItem.id, CartItem.book_id, CartItem.quantity, Book.title, Book.price_cents,
+               Book.stock_quantity)
+        .join(Book, CartItem.book_id == Book.id)
+        .where(CartItem.user_id == user_id)
+        .order_by(CartItem.book_id)  # Stable lock order across concurrent checkouts
+    ).all()
+
+
+def cart_totals(lines):
+    return totals.of_lines(lines)
+
+
+def _reserve_stock(user_id, lines):
+    """Decrement stock for all lines at once; returns True only if every line had enough."""
+    quantities = {line.book_id: line.quantity for line in lines}
+    requested = case(quantities, value=Book.id)
+    if db.session.get_bind().dialect.name != 'sqlite':
+        # Take the row locks up front, in id order, so concurrent checkouts queue instead of deadlocking
+        db.session.execute(
+            select(Book.id).where(Book.id.in_(quantities)).order_by(Book.id).with_for_update()
+        ).all()
+    unheld = Book.stock_quantity
+    if inventory.holds_enabled():
+        unheld = Book.stock_quantity - inventory.held_by_others(user_id)
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id.in_(quantities), unheld >= requested)
+        .values(stock_quantity=Book.stock_quantity - requested)
+        .execution_options(synchronize_session=False, stock_deltas=quantities)  # stock_deltas: see stats.py
+    )
+    return result.rowcount == len(quantities)
+
+
+def _first_short_line(user_id, lines):
+    stock = inventory.available(user_id, [line.book_id for line in lines])
+    for line in lines:
+        available = stock.get(line.book_id, 0)
+        if available < line.quantity:
+            return line, available
+    return lines[0], stock.get(lines[0].book_id, 0)
+
+
+def place_order(user_id, shipping=None, status='pending_payment'):
+    """Check out `user_id`'s cart and return the new Order; raises CheckoutError subclasses."""
+    lines = cart_lines(user_id)
+    if not lines:
+        raise EmptyCartError()
+
+    shipping = shipping or {}
+    try:
+        # Only the rows we priced; anything added to the cart meanwhile stays there
+        deleted = db.session.execute(
+            delete(CartItem).where(CartItem.id.in_([line.id for line in lines]))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted != len(lines):
+            db.session.rollback()  # Another checkout took (some of) them first
+            raise EmptyCartError()
+        if not _reserve_stock(user_id, lines):
+            db.session.rollback()
+            line, available = _first_short_line(user_id, lines)
+            raise OutOfStockError(line.title, available)
+
+        order = Order(
+            user_id=user_id,
+            **cart_totals(lines).order_columns(),
+            status=status,
+            **{f'shipping_{field}': shipping.get(field) for field in SHIPPING_FIELDS}
+        )
+        db.session.add(order)
+        db.session.flush()  # To get order.id for OrderItems
+
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.id, 'book_id': line.book_id, 'quantity': line.quantity,
+             'unit_price_cents': line.price_cents}
+            for line in lines
+        ])
+        inventory.consume(user_id, [line.book_id for line in lines])
+        orders.enqueue_confirmation(order.id)  # Same transaction: no order without its job, or vice versa
+        recommendations.schedule_refresh()  # At most one job per refresh window
+        db.session.commit()
+    except CheckoutError:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+    return order
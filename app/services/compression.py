@@ -0,0 +1,45 @@
+# app/services/compression.py
+# Response compression for the JSON API: brotli when the client accepts it and the `brotli`
+# package is installed, gzip otherwise. Bodies under API_COMPRESS_MIN_BYTES go out as they are
+# (compressing them costs more than it saves).
+#
+# Used as an after_request hook: `bp.after_request(compress_response)`. A compressed response
+# gets `Vary: Accept-Encoding`, and its ETag is made weak, since the bytes differ per encoding
+# while the content is the same.
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+
+def _encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=current_app.config.get('API_BROTLI_QUALITY', 5))
+    return gzip.compress(data, compresslevel=current_app.config.get('API_GZIP_LEVEL', 6))
+
+
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(_encodings())
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config.get('API_COMPRESS_MIN_BYTES', 1024):
+        return response
+    response.set_data(compress(data, encoding))  # Also updates Content-Length
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
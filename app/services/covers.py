@@ -0,0 +1,266 @@
+# app/services/covers.py
+# Cover image storage, resizing and serving.
+#
+# Uploads are stored content-addressed: a cover's key is the SHA-256 of its bytes plus its
+# detected image type ('3f9a...c2.jpg'), kept at UPLOAD_FOLDER/3f/3f9a...c2.jpg, and that key is
+# what Book.cover_image_filename holds. Identical covers uploaded for different books therefore
+# share one file, and a cover URL never changes meaning, so covers are served with
+# `Cache-Control: public, max-age=<1 year>, immutable`.
+#
+# Resized variants (COVER_SIZES, each as WebP and JPEG) are produced by a small thread pool
+# off the request thread. Until a variant exists its URL serves the original with a short
+# max-age and queues the work. Files go out through send_file, which uses the server's
+# zero-copy file wrapper, or an X-Sendfile header when USE_X_SENDFILE is on.
+#
+# Pillow is optional: without it uploads are still checked by their magic bytes, stored and
+# served as uploaded, just never resized.
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import abort, current_app, request, send_file, url_for
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional dependency
+    Image = ImageOps = None
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Served while a variant is still being generated; short so clients pick up the variant soon
+PENDING_MAX_AGE = 60
+KEY_RE = re.compile(r'^[0-9a-f]{64}\.(jpg|png|gif|webp)$')
+# Leading bytes of each accepted image type -> canonical extension
+SIGNATURES = ((b'\xff\xd8\xff', 'jpg'), (b'\x89PNG\r\n\x1a\n', 'png'), (b'GIF87a', 'gif'), (b'GIF89a', 'gif'))
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+CHUNK_SIZE = 64 * 1024
+
+
+class CoverError(Exception):
+    """Raised for unusable uploads; str(e) is safe to flash to the user."""
+
+
+def _sniff_type(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, ext in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+class CoverStore:
+    """Flask extension: content-addressed cover storage with background thumbnailing."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('UPLOAD_FOLDER', os.path.join(app.instance_path, 'uploads'))
+        app.config.setdefault('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif', 'webp'})
+        app.config.setdefault('COVER_SIZES', {'thumb': (160, 240), 'medium': (400, 600)})
+        app.config.setdefault('COVER_WORKERS', 2)
+        app.config.setdefault('COVER_MAX_PIXELS', 40_000_000)
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        app.extensions['cover_store'] = self
+        app.add_template_global(self.url, 'cover_url')
+
+        @app.cli.command('covers-gc')
+        def covers_gc():
+            """Delete stored covers (and their variants) that no book refers to any more."""
+            print(f'Removed {self.collect_garbage()} unreferenced covers.')
+
+    # --- paths ---------------------------------------------------------------------------------
+
+    @staticmethod
+    def _folder():
+        return current_app.config['UPLOAD_FOLDER']
+
+    @staticmethod
+    def _original_path(folder, key):
+        return os.path.join(folder, key[:2], key)
+
+    @staticmethod
+    def _variant_path(folder, key, size, fmt):
+        digest = key.split('.', 1)[0]
+        return os.path.join(folder, key[:2], f'{digest}.{size}.{fmt}')
+
+    # --- writes --------------------------------------------------------------------------------
+
+    def save(self, file_storage):
+        """Store an uploaded werkzeug FileStorage and return its key; raises CoverError.
+
+        Storing the same bytes twice is a no-op that returns the same key.
+        """
+        folder = self._folder()
+        head = file_storage.stream.read(16)
+        ext = _sniff_type(head)
+        allowed = {'jpg' if e == 'jpeg' else e for e in current_app.config['ALLOWED_EXTENSIONS']}
+        if ext is None or ext not in allowed:
+            raise CoverError(f'Cover images must be one of: {", ".join(sorted(allowed))}.')
+
+        # Hash while copying to a temp file in the same folder, then rename into place
+        digest = hashlib.sha256(head)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(head)
+                for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+            if Image is not None:
+                self._check_image(tmp_path)
+            key = f'{digest.hexdigest()}.{ext}'
+            path = self._original_path(folder, key)
+            if os.path.exists(path):
+                os.remove(tmp_path)  # Already stored for another book
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.generate_variants(key)
+        return key
+
+    @staticmethod
+    def _check_image(path):
+        max_pixels = current_app.config['COVER_MAX_PIXELS']
+        try:
+            with Image.open(path) as image:
+                if image.width * image.height > max_pixels:
+                    raise CoverError('That cover image is too large.')
+                image.verify()
+        except CoverError:
+            raise
+        except Exception:
+            raise CoverError('That file is not a readable image.')
+
+    def generate_variants(self, key):
+        """Queue thumbnail generation for `key` (runs inline when COVER_WORKERS is 0)."""
+        if Image is None:
+            return
+        config = current_app.config
+        job = (config['UPLOAD_FOLDER'], key, dict(config['COVER_SIZES']), current_app.logger)
+        with self._lock:
+            if key in self._in_flight:
+                return
+            self._in_flight.add(key)
+            if config['COVER_WORKERS'] and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=config['COVER_WORKERS'],
+                                                    thread_name_prefix='cover-thumbs')
+            executor = self._executor if config['COVER_WORKERS'] else None
+        if executor is None:
+            self._render_variants(*job)
+        else:
+            executor.submit(self._render_variants, *job)
+
+    def _render_variants(self, folder, key, sizes, logger):
+        # Runs on a worker thread: no app context, everything it needs is passed in
+        try:
+            with Image.open(self._original_path(folder, key)) as original:
+                original = ImageOps.exif_transpose(original)
+                for size, box in sizes.items():
+                    resized = original.copy()
+                    resized.thumbnail(box, Image.LANCZOS)
+                    if resized.mode not in ('RGB', 'RGBA'):
+                        resized = resized.convert('RGBA')  # Palette/CMYK/etc. covers
+                    for fmt, pil_format in VARIANT_FORMATS.items():
+                        path = self._variant_path(folder, key, size, fmt)
+                        if os.path.exists(path):
+                            continue
+                        image = resized if pil_format == 'WEBP' else resized.convert('RGB')
+                        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.variant-')
+                        with os.fdopen(fd, 'wb') as out:
+                            image.save(out, pil_format, quality=82)
+                        os.replace(tmp_path, path)
+        except Exception:
+            logger.exception('Could not generate cover variants for %s', key)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def release(self, key):
+        """Delete a cover's files if no book uses it any more; call after committing the change."""
+        if not key or not KEY_RE.match(key):
+            return False
+        if db.session.query(Book.id).filter(Book.cover_image_filename == key).first() is not None:
+            return False
+        folder = self._folder()
+        paths = [self._original_path(folder, key)]
+        paths += [self._variant_path(folder, key, size, fmt)
+                  for size in current_app.config['COVER_SIZES'] for fmt in VARIANT_FORMATS]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def collect_garbage(self):
+        referenced = {key for key, in db.session.query(Book.cover_image_filename).distinct()}
+        removed = 0
+        folder = self._folder()
+        for shard in os.listdir(folder):
+            shard_path = os.path.join(folder, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                if KEY_RE.match(name) and name not in referenced and self.release(name):
+                    removed += 1
+        return removed
+
+    # --- reads ---------------------------------------------------------------------------------
+
+    def url(self, key, size=None):
+        """URL for a cover (or one of its COVER_SIZES), or None if there is no cover."""
+        if not key:
+            return None
+        if size is None:
+            return url_for('customer.cover', key=key)
+        return url_for('customer.cover_variant', size=size, key=key)
+
+    def send(self, key, size=None):
+        """Response for a cover request; 404s for unknown keys or sizes."""
+        if not KEY_RE.match(key) or (size is not None and size not in current_app.config['COVER_SIZES']):
+            abort(404)
+        folder = self._folder()
+        original = self._original_path(folder, key)
+        if not os.path.exists(original):
+            abort(404)
+
+        if size is not None and Image is not None:
+            fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpg'
+            path = self._variant_path(folder, key, size, fmt)
+            if os.path.exists(path):
+                response = self._send(path, fmt, IMMUTABLE_MAX_AGE)
+                response.vary.add('Accept')
+                return response
+            self.generate_variants(key)
+            response = self._send(original, key.rsplit('.', 1)[1], PENDING_MAX_AGE)
+            response.vary.add('Accept')
+            return response
+        # Without Pillow a "variant" is the original, which never changes either
+        return self._send(original, key.rsplit('.', 1)[1], IMMUTABLE_MAX_AGE)
+
+    @staticmethod
+    def _send(path, fmt, max_age):
+        response = send_file(path, mimetype=MIMETYPES[fmt], max_age=max_age, conditional=True)
+        response.cache_control.public = True
+        if max_age == IMMUTABLE_MAX_AGE:
+            response.cache_control.immutable = True
+        return response
+
+
+cover_store = CoverStore()
@@ -0,0 +1,124 @@
+# app/services/database.py
+# Database engine tuning, driven by config (ProductionConfig in config.py turns it all on):
+#
+# - Server databases (Postgres, MySQL): pool size, overflow, checkout timeout, recycle age and
+#   pre-ping from the DB_POOL_* settings.
+# - SQLite: SQLITE_BUSY_TIMEOUT seconds of waiting for the write lock before "database is locked",
+#   and per-connection PRAGMAs set by a connect event: SQLITE_JOURNAL_MODE ('wal' lets readers and
+#   the writer work at the same time, instead of readers holding off commits) and
+#   SQLITE_SYNCHRONOUS ('normal' skips the fsync per commit; still safe in WAL mode, a power cut
+#   can only lose the last commits).
+# - Read replica: with SQLALCHEMY_REPLICA_URI set, views decorated with @read_only send their
+#   plain SELECTs to the 'replica' bind. Everything else (writes, SELECT ... FOR UPDATE, raw
+#   text() statements, other views) stays on the primary.
+#
+# configure_engines() runs before db.init_app (Flask-SQLAlchemy reads the engine options there),
+# init_app() after it. Options given explicitly in SQLALCHEMY_ENGINE_OPTIONS win over the DB_POOL_*
+# / SQLITE_BUSY_TIMEOUT ones.
+#
+# This module is imported by app/__init__.py before `db` exists (for the session class), so it
+# takes the engines from the extension instead of importing `db`.
+from functools import partial, wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA = 'replica'  # Bind key of the read replica
+JOURNAL_MODES = {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'}
+SYNCHRONOUS_LEVELS = {'off', 'normal', 'full', 'extra'}
+POOL_OPTIONS = (
+    ('DB_POOL_SIZE', 'pool_size'),
+    ('DB_MAX_OVERFLOW', 'max_overflow'),
+    ('DB_POOL_TIMEOUT', 'pool_timeout'),
+    ('DB_POOL_RECYCLE', 'pool_recycle'),
+    ('DB_POOL_PRE_PING', 'pool_pre_ping'),
+)
+
+
+def engine_options(config, uri):
+    """Engine options for `uri` from the DB_POOL_* / SQLITE_BUSY_TIMEOUT settings."""
+    if make_url(uri).get_backend_name() == 'sqlite':
+        # SQLite connections aren't pooled over a network; the knob that matters is the lock wait
+        timeout = config.get('SQLITE_BUSY_TIMEOUT')
+        return {'connect_args': {'timeout': timeout}} if timeout is not None else {}
+    return {option: config[key] for key, option in POOL_OPTIONS if config.get(key) is not None}
+
+
+def configure_engines(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS and the replica bind; call before db.init_app(app)."""
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}),
+    }
+    replica_uri = config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA, {'url': replica_uri, **engine_options(config, replica_uri)})
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def _setting(config, key, allowed):
+    value = (config.get(key) or '').lower()
+    if value and value not in allowed:
+        raise ValueError(f"{key} must be one of {', '.join(sorted(allowed))}, not {value!r}")
+    return value
+
+
+def _set_sqlite_pragmas(journal_mode, synchronous, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if journal_mode:
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        if synchronous:
+            cursor.execute(f'PRAGMA synchronous={synchronous}')
+    finally:
+        cursor.close()
+
+
+def init_app(app, db):
+    """Set the SQLITE_* PRAGMAs on every new connection of the app's SQLite engines."""
+    journal_mode = _setting(app.config, 'SQLITE_JOURNAL_MODE', JOURNAL_MODES)
+    synchronous = _setting(app.config, 'SQLITE_SYNCHRONOUS', SYNCHRONOUS_LEVELS)
+    if not (journal_mode or synchronous):
+        return
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', partial(_set_sqlite_pragmas, journal_mode, synchronous))
+
+
+def read_only(view):
+    """Send the view's plain SELECTs to the read replica, when one is configured.
+
+    Replicas lag a little behind the primary, so only use it on views that don't write and don't
+    need to read what the same user has just written (catalog pages, not the cart or orders).
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        g._db_read_only = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.pop('_db_read_only', None)
+
+    return decorated_function
+
+
+def _is_plain_select(clause):
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSession(Session):
+    """Session that reads from the 'replica' bind inside @read_only views (see read_only)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_app_context() and g.get('_db_read_only')
+                and not self._flushing and _is_plain_select(clause)):
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,361 @@
+# app/services/facets.py
+# Faceted browsing: filter the catalog by category, author, price range and availability, with
+# the number of books behind each choice shown next to it.
+#
+# Counting those with GROUP BYs over Book on every page view would scan the catalog several times
+# per request, so the counts are kept in FacetCount rows, adjusted in the same transaction as the
+# change (the same way as the dashboard counters in stats.py):
+#   - mapper events on Book for add/edit/delete,
+#   - a do_orm_execute hook for the stock UPDATEs tagged with `stock_deltas` (checkout,
+#     cancellations), which only matter to the counts when a book goes in or out of stock.
+# Each book counts towards the whole-catalog scope ('') and towards a scope per selection of up to
+# two of the low-cardinality facets ('category=Fiction', 'category=Fiction&stock=in_stock'...), so
+# the panel for the plain listing or for such a selection is a couple of indexed lookups. A facet's
+# counts leave out its own filter (picking a category still shows the other categories' counts).
+# Anything else (a search, an author, all three) is counted with GROUP BYs over the books that
+# match, which the search index or the filters' indexes narrow down.
+# `flask facets-rebuild` recomputes the counts, e.g. after changing FACET_PRICE_EDGES, and fills
+# them in the first place after the migration that adds them; until then the panel counts live,
+# since a GET (on a read replica, perhaps) mustn't write.
+from bisect import bisect_right
+from collections import Counter, namedtuple
+from itertools import combinations
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, case, event, func, insert, inspect, select, update
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, FacetCount
+from bookstore_flask_project.app.services.money import format_cents
+from bookstore_flask_project.app.services.search import search_index
+
+FACETS = ('category', 'author', 'price', 'stock')
+# Facets whose selected values get precomputed scopes, up to MAX_SCOPED_FILTERS of them at a time;
+# authors are too many for that
+SCOPED_FACETS = ('category', 'price', 'stock')
+MAX_SCOPED_FILTERS = 2
+IN_STOCK, OUT_OF_STOCK = 'in_stock', 'out_of_stock'
+STOCK_LABELS = {IN_STOCK: 'In stock', OUT_OF_STOCK: 'Out of stock'}
+DEFAULT_PRICE_EDGES = (1000, 2000, 3000, 5000)
+# The Book columns the facet values are derived from
+FACET_COLUMNS = ('category', 'author', 'price_cents', 'stock_quantity')
+
+Filters = namedtuple('Filters', FACETS, defaults=(None,) * len(FACETS))
+FacetValue = namedtuple('FacetValue', 'value label count selected')
+
+
+def _config(key, default):
+    try:
+        return current_app.config[key]
+    except RuntimeError:  # Outside an app context (e.g. a bare script)
+        return default
+
+
+def price_edges():
+    return tuple(_config('FACET_PRICE_EDGES', DEFAULT_PRICE_EDGES))
+
+
+def price_buckets(edges=None):
+    """The price facet's values in order: '0-1000', '1000-2000', ..., '5000-' (cents)."""
+    edges = price_edges() if edges is None else edges
+    bounds = (0, *edges)
+    return [f'{low}-{high}' for low, high in zip(bounds, (*edges, ''))]
+
+
+def price_bucket(price_cents, edges=None):
+    edges = price_edges() if edges is None else edges
+    return price_buckets(edges)[bisect_right(edges, price_cents)]
+
+
+def _price_range(bucket):
+    low, high = bucket.split('-')
+    return int(low), int(high) if high else None
+
+
+def price_label(bucket):
+    low, high = _price_range(bucket)
+    if not low:
+        return f'Under {format_cents(high)}'
+    if high is None:
+        return f'{format_cents(low)} and up'
+    return f'{format_cents(low)} - {format_cents(high)}'
+
+
+def _label(facet, value):
+    if facet == 'price':
+        return price_label(value)
+    if facet == 'stock':
+        return STOCK_LABELS[value]
+    return value
+
+
+def scope_key(selection):
+    """The scope of a selection of (facet, value) pairs, listed in SCOPED_FACETS order."""
+    return '&'.join(f'{facet}={value}' for facet, value in selection)
+
+
+def parse_filters(args):
+    """Filters from request args (?category=&author=&price=1000-2000&stock=in_stock); unknown values are dropped."""
+    price, stock = args.get('price'), args.get('stock')
+    return Filters(
+        category=args.get('category') or None,
+        author=args.get('author') or None,
+        price=price if price in price_buckets() else None,
+        stock=stock if stock in STOCK_LABELS else None,
+    )
+
+
+def _condition(facet, value):
+    if facet == 'price':
+        low, high = _price_range(value)
+        return Book.price_cents >= low if high is None else and_(Book.price_cents >= low, Book.price_cents < high)
+    if facet == 'stock':
+        return Book.stock_quantity > 0 if value == IN_STOCK else Book.stock_quantity <= 0
+    return getattr(Book, facet) == value
+
+
+def apply_filters(query, filters, skip=None):
+    """`query` (over Book) narrowed to the books matching `filters`, leaving out facet `skip`'s own filter."""
+    for facet, value in filters._asdict().items():
+        if value is not None and facet != skip:
+            query = query.filter(_condition(facet, value))
+    return query
+
+
+# --- maintenance ------------------------------------------------------------------------------
+
+def _book_values(category, author, price_cents, stock_quantity, edges=None):
+    """{facet: value} of one book; a book without a category or author isn't counted under that facet."""
+    values = {'category': category, 'author': author, 'price': price_bucket(price_cents or 0, edges),
+              'stock': IN_STOCK if (stock_quantity or 0) > 0 else OUT_OF_STOCK}
+    return {facet: value for facet, value in values.items() if value}
+
+
+def _keys(values):
+    """The (scope, facet, value) counters a book with these facet values counts towards."""
+    scoped = [(facet, values[facet]) for facet in SCOPED_FACETS if facet in values]
+    keys = []
+    for size in range(MAX_SCOPED_FILTERS + 1):
+        for selection in combinations(scoped, size):
+            scope, selected = scope_key(selection), {facet for facet, _ in selection}
+            keys.extend((scope, facet, value) for facet, value in values.items() if facet not in selected)
+    return keys
+
+
+def _adjust(connection, deltas):
+    """Apply {(scope, facet, value): delta} as in-place increments, adding missing rows.
+
+    One lookup of which rows exist, then one executemany UPDATE and one INSERT, rather than a
+    statement per counter (a book edit can move a dozen).
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = FacetCount.__table__
+    # An IN per key column (SQLite scans the table for a row-value IN list); the few extra
+    # combinations that also match are dropped here
+    scopes, facets, values = (sorted({key[index] for key in deltas}) for index in range(3))
+    existing = {tuple(row) for row in connection.execute(
+        select(table.c.scope, table.c.facet, table.c.value)
+        .where(table.c.scope.in_(scopes), table.c.facet.in_(facets), table.c.value.in_(values))
+    )} & deltas.keys()
+    updates = [{'b_scope': scope, 'b_facet': facet, 'b_value': value, 'b_delta': delta}
+               for (scope, facet, value), delta in deltas.items() if (scope, facet, value) in existing]
+    inserts = [{'scope': scope, 'facet': facet, 'value': value, 'count': delta}
+               for (scope, facet, value), delta in deltas.items() if (scope, facet, value) not in existing]
+    if updates:
+        connection.execute(
+            update(table).where(table.c.scope == bindparam('b_scope'), table.c.facet == bindparam('b_facet'),
+                                table.c.value == bindparam('b_value'))
+            .values(count=table.c.count + bindparam('b_delta')),
+            updates,
+        )
+    if inserts:
+        connection.execute(insert(table), inserts)
+
+
+def _change(old_values, new_values):
+    deltas = Counter(_keys(new_values))
+    deltas.subtract(_keys(old_values))
+    return deltas
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    """No-op; registered for its active_history flag."""
+
+
+# Setting one of these on an expired Book (e.g. after a commit) would otherwise not load the value it
+# replaces, and the update event couldn't tell which counts the book leaves
+for _column in FACET_COLUMNS:
+    event.listen(getattr(Book, _column), 'set', _load_old_value, active_history=True)
+
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    return history.deleted[0] if history.has_changes() and history.deleted else state.attrs[key].value
+
+
+@event.listens_for(Book, 'after_insert')
+def _book_inserted(mapper, connection, target):
+    _adjust(connection, Counter(_keys(_book_values(
+        target.category, target.author, target.price_cents, target.stock_quantity))))
+
+
+@event.listens_for(Book, 'after_update')
+def _book_updated(mapper, connection, target):
+    state = inspect(target)
+    old = _book_values(*(_previous(state, key) for key in FACET_COLUMNS))
+    new = _book_values(*(getattr(target, key) for key in FACET_COLUMNS))
+    if old != new:
+        _adjust(connection, _change(old, new))
+
+
+@event.listens_for(Book, 'before_delete')
+def _book_deleted(mapper, connection, target):
+    _adjust(connection, Counter({key: -1 for key in _keys(_book_values(
+        target.category, target.author, target.price_cents, target.stock_quantity))}))
+
+
+def _bulk_statement_hook(orm_execute_state):
+    """Move books that went in or out of stock in a bulk stock UPDATE (no mapper events) between the stock counts."""
+    stock_deltas = orm_execute_state.execution_options.get('stock_deltas')
+    if not (orm_execute_state.is_update and stock_deltas):
+        return None
+    result = orm_execute_state.invoke_statement()
+    # stock_deltas holds how much each book's stock went *down*, so the old level is new + delta
+    books = orm_execute_state.session.execute(
+        select(Book.id, Book.category, Book.author, Book.price_cents, Book.stock_quantity)
+        .where(Book.id.in_(stock_deltas))
+    ).all()
+    deltas = Counter()
+    for book_id, category, author, price_cents, stock in books:
+        old_stock = stock + stock_deltas[book_id]
+        if (old_stock > 0) != (stock > 0):
+            deltas.update(_change(_book_values(category, author, price_cents, old_stock),
+                                  _book_values(category, author, price_cents, stock)))
+    if deltas:
+        _adjust(orm_execute_state.session.connection(), deltas)
+    return result
+
+
+def rebuild(batch_size=5000):
+    """Recompute every count from the Book table; returns how many counters there are."""
+    edges = price_edges()
+    counts = Counter()
+    rows = db.session.execute(
+        select(Book.category, Book.author, Book.price_cents, Book.stock_quantity)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        counts.update(_keys(_book_values(*row, edges=edges)))
+    db.session.execute(FacetCount.__table__.delete())
+    entries = [{'scope': scope, 'facet': facet, 'value': value, 'count': count}
+               for (scope, facet, value), count in counts.items()]
+    for offset in range(0, len(entries), batch_size):
+        db.session.execute(insert(FacetCount.__table__), entries[offset:offset + batch_size])
+    db.session.commit()
+    return len(entries)
+
+
+# --- reads ------------------------------------------------------------------------------------
+
+def _precomputed_scopes(filters, search_text):
+    """{facet: scope} when the panel can be read from FacetCount, else None."""
+    selected = [(facet, getattr(filters, facet)) for facet in SCOPED_FACETS if getattr(filters, facet) is not None]
+    if search_text or filters.author is not None or len(selected) > MAX_SCOPED_FILTERS:
+        return None
+    return {name: scope_key([(facet, value) for facet, value in selected if facet != name]) for name in FACETS}
+
+
+def _stored_counts(scopes, author_limit):
+    table = FacetCount.__table__
+    wanted = {(scope, facet) for facet, scope in scopes.items() if facet != 'author'}
+    # An index range over the (at most three) scopes, narrowed to each facet's own scope here
+    rows = [(facet, value, count) for scope, facet, value, count in db.session.execute(
+        select(table.c.scope, table.c.facet, table.c.value, table.c.count)
+        .where(table.c.scope.in_(sorted({scope for scope, _ in wanted})),
+               table.c.facet.in_(sorted({facet for _, facet in wanted})), table.c.count > 0)
+    ) if (scope, facet) in wanted]
+    # The busiest authors only, straight off the (scope, facet, count) index
+    rows += db.session.execute(
+        select(table.c.facet, table.c.value, table.c.count)
+        .where(table.c.scope == scopes['author'], table.c.facet == 'author', table.c.count > 0)
+        .order_by(table.c.count.desc(), table.c.value).limit(author_limit)
+    ).all()
+    return rows
+
+
+def _counts_missing():
+    """True on a catalog whose counts were never built (every book counts in the whole-catalog scope)."""
+    return db.session.query(FacetCount.scope).first() is None and db.session.query(Book.id).first() is not None
+
+
+def _facet_expression(facet):
+    if facet == 'price':
+        edges, buckets = price_edges(), price_buckets()
+        return case(*((Book.price_cents < edge, bucket) for edge, bucket in zip(edges, buckets)),
+                    else_=buckets[-1])
+    if facet == 'stock':
+        return case((Book.stock_quantity > 0, IN_STOCK), else_=OUT_OF_STOCK)
+    return getattr(Book, facet)
+
+
+def _live_counts(base_query, filters, author_limit):
+    """GROUP BY counts over the books matching `base_query` and the filters (each facet without its own)."""
+    rows = []
+    for facet in FACETS:
+        expression = _facet_expression(facet)
+        query = apply_filters(base_query, filters, skip=facet) \
+            .with_entities(expression, func.count()).filter(expression.isnot(None)) \
+            .group_by(expression).order_by(None)
+        if facet == 'author':
+            query = query.order_by(func.count().desc(), expression).limit(author_limit)
+        rows.extend((facet, value, count) for value, count in query)
+    return rows
+
+
+def _ordered(facet, counts):
+    if facet == 'price':
+        return [value for value in price_buckets() if value in counts]
+    if facet == 'stock':
+        return [value for value in STOCK_LABELS if value in counts]
+    return sorted(counts, key=lambda value: (-counts[value], value))  # Most books first
+
+
+def panel(filters=None, search_text=''):
+    """{facet: [FacetValue...]} for the filter panel of a listing, searched for `search_text` if given."""
+    filters = filters or Filters()
+    author_limit = _config('FACET_AUTHOR_LIMIT', 10)
+    search_text = search_text.strip()
+    scopes = _precomputed_scopes(filters, search_text)
+    if scopes is not None:
+        rows = _stored_counts(scopes, author_limit)
+        if not rows and _counts_missing():
+            rows = _live_counts(Book.query, filters, author_limit)  # Until `flask facets-rebuild` has run
+    else:
+        base_query = search_index.ranked(search_text)[0] if search_text else Book.query
+        rows = _live_counts(base_query, filters, author_limit)
+
+    counts = {facet: {} for facet in FACETS}
+    for facet, value, count in rows:
+        counts[facet][value] = count
+    # A selected value stays in the panel (so it can be cleared) even with nothing left under it
+    for facet, value in filters._asdict().items():
+        if value is not None:
+            counts[facet].setdefault(value, 0)
+
+    return {facet: [FacetValue(value, _label(facet, value), counts[facet][value], value == getattr(filters, facet))
+                    for value in _ordered(facet, counts[facet])]
+            for facet in FACETS}
+
+
+def init_app(app):
+    app.config.setdefault('FACET_PRICE_EDGES', DEFAULT_PRICE_EDGES)
+    app.config.setdefault('FACET_AUTHOR_LIMIT', 10)
+    if not event.contains(db.session, 'do_orm_execute', _bulk_statement_hook):
+        event.listen(db.session, 'do_orm_execute', _bulk_statement_hook)
+
+    @app.cli.command('facets-rebuild')
+    def facets_rebuild():
+        """Recompute the browse page's facet counts from the Book table."""
+        print(f'Rebuilt {rebuild()} facet counts.')
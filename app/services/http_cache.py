@@ -0,0 +1,81 @@
+# app/services/http_cache.py
+# HTTP validators (ETag / Last-Modified) for catalog pages.
+#
+# Routes compute validators from cheap lookups (a book's updated_at, which sales move too; for
+# listings the catalog version kept by stats.py and the stock window) *before* doing any real work, and return a bodiless 304 when the client's
+# If-None-Match / If-Modified-Since still match. Anonymous responses are marked public so a CDN
+# or browser can reuse them for HTTP_CACHE_MAX_AGE seconds; pages for logged-in users vary per
+# user, so they get a per-user ETag and `private, no-cache`.
+import hashlib
+
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services import stats
+
+
+class Validators:
+    def __init__(self, etag, last_modified=None, version=None):
+        self.etag = etag
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+        self.version = version  # The listing version, or the book's own updated_at: for cache keys
+
+
+def _viewer_tag():
+    return f'u{current_user.id}' if current_user.is_authenticated else 'anon'
+
+
+def _digest(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+
+
+def book_validators(book_id, *request_parts, related=None):
+    """Validators for a book page, or None if the book doesn't exist (a primary-key lookup).
+
+    `request_parts` distinguish representations of the same book (e.g. the API's field selection).
+    `related` is the (version, last_modified) of other content on the page, such as
+    recommendations.version(); the page is as new as the later of it and the book.
+    """
+    row = db.session.query(Book.updated_at, Book.created_at).filter(Book.id == book_id).first()
+    if row is None:
+        return None
+    version = changed = row.updated_at or row.created_at
+    related_version, related_changed = related or (None, None)
+    if related_changed and (changed is None or related_changed > changed):
+        changed = related_changed
+    return Validators(_digest('book', book_id, version, _viewer_tag(), related_version, *request_parts), changed,
+                      version)
+
+
+def catalog_validators(*request_parts):
+    """Validators for a catalog listing; `request_parts` distinguish pages (search text, cursor...)."""
+    version, changed = stats.listing_version()
+    return Validators(_digest('catalog', version, _viewer_tag(), *request_parts), changed, version)
+
+
+def not_modified(validators):
+    """A 304 response if the client's cached copy is still current, else None."""
+    # Pending flash messages must reach the page, so never short-circuit while there are some
+    if session.get('_flashes'):
+        return None
+    if is_resource_modified(request.environ, etag=validators.etag, last_modified=validators.last_modified):
+        return None
+    response = make_response('', 304)
+    return apply(response, validators)
+
+
+def apply(response, validators):
+    response.set_etag(validators.etag)
+    if validators.last_modified:
+        response.last_modified = validators.last_modified
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('HTTP_CACHE_MAX_AGE', 60)
+        response.vary.add('Cookie')
+    return response
@@ -0,0 +1,195 @@
+# app/services/identity.py
+# Cached user principals for Flask-Login.
+#
+# Flask-Login calls the user loader on every authenticated request. Instead of loading the full
+# User row each time, the loader returns a UserPrincipal (id, username, email, role), which is
+# all the pages and manager_required look at, from a two-level cache:
+#   - an in-process LRU with a TTL (IDENTITY_CACHE_TTL seconds),
+#   - optionally a shared backend (IDENTITY_CACHE_BACKEND = 'redis'), so a principal loaded
+#     by one worker is reused by the others.
+# Only on a miss in both is the user read, as one narrow SELECT by primary key.
+#
+# Changes to a user's role, password, username or email (or deleting the user) drop the cached
+# principal once the transaction commits. Other workers' in-process copies expire within the TTL,
+# so authorization doesn't trust them: has_role() (manager_required) reads the role from the
+# database unless this request just did. Code that needs the full User row can call
+# current_user.load().
+import threading
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, select
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import User
+from bookstore_flask_project.app.services.cache import LRUCache, NullCache, RedisCache
+
+# Changing any of these invalidates the cached principal
+PRINCIPAL_FIELDS = ('username', 'email', 'role')
+SECURITY_FIELDS = ('role', 'password_hash')
+
+
+def principal_key(user_id):
+    return f'principal:{user_id}'
+
+
+class UserPrincipal(UserMixin):
+    """What current_user is for logged-in users: the User fields pages need, no session attached."""
+
+    def __init__(self, id, username, email, role, fresh=False):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role  # For display; authorization goes through has_role()
+        self.fresh = fresh  # Read from the database by this request, rather than from a cache
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, user.role)
+
+    def as_dict(self):
+        return {'id': self.id, 'username': self.username, 'email': self.email, 'role': self.role}
+
+    def has_role(self, role):
+        """Whether the user has `role` now: a cached principal may predate a role change or the
+        user's deletion on another worker, so check the database (one primary-key lookup)."""
+        if self.fresh:
+            return self.role == role
+        return db.session.execute(select(User.role).where(User.id == self.id)).scalar() == role
+
+    def load(self):
+        """The full User row (e.g. to change a password or walk relationships)."""
+        return db.session.get(User, self.id)
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.username}>'
+
+
+class IdentityCache:
+    """Flask extension: the Flask-Login user loader, backed by an LRU and an optional shared cache."""
+
+    def __init__(self, app=None):
+        self._metrics_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, shared_backend=None):
+        app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+        app.config.setdefault('IDENTITY_CACHE_MAX_ENTRIES', 10000)
+        app.config.setdefault('IDENTITY_CACHE_BACKEND', None)
+        ttl = app.config['IDENTITY_CACHE_TTL']
+        local = LRUCache(max_entries=app.config['IDENTITY_CACHE_MAX_ENTRIES'], default_ttl=ttl) if ttl else NullCache()
+        if shared_backend is None:
+            shared_backend = _make_shared_backend(app.config)
+        app.extensions['identity_cache'] = {'local': local, 'shared': shared_backend}
+        _register_invalidation_events()
+
+    @property
+    def _backends(self):
+        return current_app.extensions['identity_cache']
+
+    def load_user(self, user_id):
+        """Flask-Login user_loader: a UserPrincipal, or None for unknown ids."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        key = principal_key(user_id)
+        backends = self._backends
+        ttl = current_app.config['IDENTITY_CACHE_TTL']
+
+        fields = backends['local'].get(key)
+        if fields is None and backends['shared'] is not None:
+            fields = backends['shared'].get(key)
+            if fields is not None:
+                backends['local'].set(key, fields, ttl)
+        if fields is not None:
+            self._count(hit=True)
+            return UserPrincipal(**fields)
+
+        self._count(hit=False)
+        row = db.session.execute(
+            select(User.id, User.username, User.email, User.role).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        principal = UserPrincipal(*row, fresh=True)
+        backends['local'].set(key, principal.as_dict(), ttl)
+        if backends['shared'] is not None:
+            backends['shared'].set(key, principal.as_dict(), ttl)
+        return principal
+
+    def invalidate(self, user_id):
+        key = principal_key(user_id)
+        backends = self._backends
+        backends['local'].delete(key)
+        if backends['shared'] is not None:
+            backends['shared'].delete(key)
+
+    def _count(self, hit):
+        with self._metrics_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def metrics(self):
+        with self._metrics_lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': round(self.hits / total, 3) if total else None}
+
+
+def _make_shared_backend(config):
+    name = config['IDENTITY_CACHE_BACKEND']
+    if not name:
+        return None
+    if name == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("IDENTITY_CACHE_BACKEND='redis' requires the 'redis' package to be installed.")
+        return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), default_ttl=config['IDENTITY_CACHE_TTL'])
+    raise ValueError(f'Unknown IDENTITY_CACHE_BACKEND: {name!r}')
+
+
+identity_cache = IdentityCache()
+
+
+# --- invalidation -----------------------------------------------------------------------------
+# Same shape as the fragment cache's: collect user ids while flushing, drop them after commit.
+
+def _after_flush(session, flush_context):
+    stale = set()
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS + SECURITY_FIELDS):
+                stale.add(obj.id)
+    stale.update(obj.id for obj in session.deleted if isinstance(obj, User))
+    if stale:
+        session.info.setdefault('identity_cache_pending', set()).update(stale)
+
+
+def _after_commit(session):
+    pending = session.info.pop('identity_cache_pending', None)
+    if not pending:
+        return
+    try:
+        for user_id in pending:
+            identity_cache.invalidate(user_id)
+    except (RuntimeError, KeyError):  # No app context / extension not set up (e.g. a standalone script)
+        pass
+
+
+def _after_rollback(session):
+    session.info.pop('identity_cache_pending', None)
+
+
+def _register_invalidation_events():
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -0,0 +1,175 @@
+# app/services/inventory.py
+# Stock held for shoppers' carts, so a book in someone's cart isn't sold out from under them
+# between adding it and checking out.
+#
+# Adding a book to the cart (or raising its quantity) holds that many copies for the shopper for
+# INVENTORY_HOLD_MINUTES, and checkout turns the hold into a sale. What a shopper can still get is
+# the book's stock_quantity minus the unexpired holds of *other* shoppers, so a hold stops counting
+# the moment it expires, without any sweeper. Expired rows are deleted only to keep the table
+# small: on the next hold for the same book, and by `flask inventory-purge`.
+#
+# A hold is a committed write, which is what the cart store otherwise spares cart changes (see
+# cart.py), so only increases take one: they are the changes that can be refused. Lowering or
+# removing a line only changes the cart, and trim() shrinks the holds to it when the cart is
+# written to CartItem (in the shared stores every CART_FLUSH_INTERVAL seconds; with the session
+# store at checkout or logout). Until then, or until they expire, the surplus copies stay held.
+#
+# A hold is one conditional INSERT ... SELECT ... WHERE stock - others' holds >= wanted (with the
+# book's row locked first on databases that have row locks, as checkout does), so concurrent
+# shoppers can't hold more copies than there are. INVENTORY_HOLD_MINUTES = 0 turns holds off;
+# carts and checkout then only look at stock_quantity.
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, literal, select, update
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, StockReservation
+
+
+class NotAvailableError(Exception):
+    """Not enough unheld stock; `available` is how many copies the shopper could hold in total."""
+
+    def __init__(self, available):
+        super().__init__(f'Only {available} available.')
+        self.available = max(available, 0)
+
+
+def holds_enabled():
+    return bool(current_app.config['INVENTORY_HOLD_MINUTES'])
+
+
+def held_by_others(user_id, now=None):
+    """Correlated subquery: copies of Book held by shoppers other than `user_id` (for WHERE clauses on Book)."""
+    now = now or datetime.utcnow()
+    return select(func.coalesce(func.sum(StockReservation.quantity), 0)) \
+        .where(StockReservation.book_id == Book.id, StockReservation.user_id != user_id,
+               StockReservation.expires_at > now) \
+        .correlate(Book).scalar_subquery()
+
+
+def _lock_books(book_ids):
+    if db.session.get_bind().dialect.name != 'sqlite':
+        # Same as checkout: row locks in id order, so concurrent holds on a book queue up
+        db.session.execute(select(Book.id).where(Book.id.in_(book_ids)).order_by(Book.id).with_for_update()).all()
+
+
+def hold(user_id, book, quantity):
+    """Hold `quantity` copies of `book` for the user, replacing their earlier hold; commits.
+
+    Raises NotAvailableError (keeping any earlier hold) if other shoppers' holds leave too few.
+    """
+    if not holds_enabled():
+        if book.stock_quantity < quantity:
+            raise NotAvailableError(book.stock_quantity)
+        return
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=current_app.config['INVENTORY_HOLD_MINUTES'])
+    try:
+        _lock_books([book.id])
+        db.session.execute(
+            delete(StockReservation)
+            .where(StockReservation.book_id == book.id,
+                   (StockReservation.expires_at <= now) | (StockReservation.user_id == user_id))
+            .execution_options(synchronize_session=False)
+        )
+        wanted = select(literal(user_id), Book.id, literal(quantity), literal(expires_at)) \
+            .where(Book.id == book.id, Book.stock_quantity - held_by_others(user_id, now) >= quantity)
+        inserted = db.session.execute(
+            insert(StockReservation).from_select(['user_id', 'book_id', 'quantity', 'expires_at'], wanted)
+        ).rowcount
+        if inserted != 1:
+            db.session.rollback()  # Also restores the shopper's earlier hold
+            raise NotAvailableError(available(user_id, [book.id]).get(book.id, 0))
+        db.session.commit()
+    except NotAvailableError:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def trim(carts):
+    """Shrink holds to the carts ({user_id: {book_id: quantity}}) as they're persisted: drop those on
+    lines that are gone, lower those above the line's quantity. Runs in the caller's transaction."""
+    if not holds_enabled() or not carts:
+        return
+    held = db.session.execute(
+        select(StockReservation.id, StockReservation.user_id, StockReservation.book_id, StockReservation.quantity)
+        .where(StockReservation.user_id.in_(list(carts)))
+    ).all()
+    gone, lowered = [], []
+    for row in held:
+        quantity = carts[row.user_id].get(row.book_id, 0)
+        if not quantity:
+            gone.append(row.id)
+        elif quantity < row.quantity:
+            lowered.append({'id': row.id, 'quantity': quantity})
+    if gone:
+        db.session.execute(delete(StockReservation).where(StockReservation.id.in_(gone))
+                           .execution_options(synchronize_session=False))
+    if lowered:
+        db.session.execute(update(StockReservation), lowered)  # Bulk UPDATE by primary key
+
+
+def consume(user_id, book_ids):
+    """Checkout: the holds became a sale. Runs in the caller's transaction."""
+    db.session.execute(
+        delete(StockReservation)
+        .where(StockReservation.user_id == user_id, StockReservation.book_id.in_(book_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+# --- reads ------------------------------------------------------------------------------------
+
+def reserved(book_ids, now=None):
+    """{book_id: copies held (unexpired)} for the given books; one index-only GROUP BY."""
+    now = now or datetime.utcnow()
+    rows = db.session.execute(
+        select(StockReservation.book_id, func.sum(StockReservation.quantity))
+        .where(StockReservation.book_id.in_(book_ids), StockReservation.expires_at > now)
+        .group_by(StockReservation.book_id)
+    ).all()
+    return {book_id: int(quantity) for book_id, quantity in rows}
+
+
+def available(user_id, book_ids):
+    """{book_id: copies `user_id` could hold}: stock minus other shoppers' holds."""
+    return dict(db.session.execute(
+        select(Book.id, Book.stock_quantity - held_by_others(user_id)).where(Book.id.in_(book_ids))
+    ).all())
+
+
+def low_stock_query(threshold):
+    """Books at or below `threshold`, for keyset pagination on (stock_quantity, id): an index range scan."""
+    return Book.query.filter(Book.stock_quantity <= threshold)
+
+
+def purge_expired(batch_size=5000):
+    """Delete expired holds in batches; returns how many went."""
+    purged = 0
+    while True:
+        ids = db.session.execute(
+            select(StockReservation.id).where(StockReservation.expires_at <= datetime.utcnow()).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return purged
+        db.session.execute(delete(StockReservation).where(StockReservation.id.in_(ids))
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+        purged += len(ids)
+
+
+@event.listens_for(Book, 'before_delete')
+def _book_deleted(mapper, connection, target):
+    connection.execute(delete(StockReservation.__table__).where(StockReservation.__table__.c.book_id == target.id))
+
+
+def init_app(app):
+    app.config.setdefault('INVENTORY_HOLD_MINUTES', 15)
+
+    @app.cli.command('inventory-purge')
+    def inventory_purge():
+        """Delete expired stock holds."""
+        print(f'Purged {purge_expired()} expired holds.')
@@ -0,0 +1,248 @@
+# app/services/jobs.py
+# Background jobs, queued in the app's own database (the Job table), so they need no external
+# services: SQLite in development, whatever DATABASE_URL points at in production.
+#
+#   - Tasks are plain functions registered with @job_queue.task('name').
+#   - enqueue() adds a Job row in the *caller's* transaction, so a job exists if and only if the
+#     change that asked for it commits. An idempotency key makes enqueueing the same work twice
+#     a no-op.
+#   - Workers claim due jobs in batches with a conditional UPDATE (only rows still 'queued' are
+#     taken, so two workers never get the same job). A batch runs in one transaction with a
+#     savepoint per job, and a job is marked done inside the same savepoint as the task's own
+#     writes: a task's database effects are applied exactly once, however often it is retried.
+#     Tasks must not commit themselves.
+#   - A failing job is retried with exponential backoff up to max_attempts, then marked 'failed'.
+#     Jobs whose worker died mid-run are requeued after JOBS_LEASE_SECONDS.
+#
+# JOBS_WORKERS threads per app process start on the first enqueue; with JOBS_WORKERS = 0 run
+# `flask jobs-work` as a separate process instead.
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Job
+
+
+class UnknownTaskError(Exception):
+    pass
+
+
+class JobQueue:
+    """Flask extension: task registry, enqueueing and the in-process worker pool."""
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self._lock = threading.Lock()
+        self._pools = {}  # app -> (wake event, threads)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        import click
+
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_BATCH_SIZE', 10)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_RETRY_BACKOFF', 2.0)
+        app.config.setdefault('JOBS_LEASE_SECONDS', 300)
+        app.extensions['job_queue'] = self
+        if not event.contains(db.session, 'after_commit', _after_commit):
+            event.listen(db.session, 'after_commit', _after_commit)
+            event.listen(db.session, 'after_rollback', _after_rollback)
+
+        @app.cli.command('jobs-work')
+        @click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+        def jobs_work(burst):
+            """Run queued background jobs in this process."""
+            if burst:
+                click.echo(f'Ran {self.run_pending()} jobs.')
+            else:
+                self.work_forever(current_app._get_current_object(), threading.Event())
+
+    def task(self, name):
+        """Decorator registering a function as the task `name`; it's called with the job's payload."""
+        def register(fn):
+            self.tasks[name] = fn
+            return fn
+        return register
+
+    # --- producing -----------------------------------------------------------------------------
+
+    def enqueue(self, name, payload=None, idempotency_key=None, delay=0, max_attempts=None):
+        """Add a job in the current transaction; returns False if `idempotency_key` was already used."""
+        if name not in self.tasks:
+            raise UnknownTaskError(name)
+        values = {
+            'name': name,
+            'payload': json.dumps(payload or {}),
+            'idempotency_key': idempotency_key,
+            'status': 'queued',
+            'max_attempts': max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+            'run_at': datetime.utcnow() + timedelta(seconds=delay),
+            'created_at': datetime.utcnow(),
+        }
+        if idempotency_key is not None:
+            if db.session.execute(select(Job.id).where(Job.idempotency_key == idempotency_key)).first():
+                return False
+            try:
+                with db.session.begin_nested():  # A concurrent duplicate only undoes this insert
+                    db.session.execute(insert(Job), [values])
+            except IntegrityError:
+                return False
+        else:
+            db.session.execute(insert(Job), [values])
+        db.session.info['jobs_enqueued'] = True
+        if current_app.config['JOBS_WORKERS']:
+            self._ensure_workers(current_app._get_current_object())
+        return True
+
+    # --- consuming -----------------------------------------------------------------------------
+
+    def claim(self, limit):
+        """Atomically take up to `limit` due jobs; returns their rows (already committed as 'running')."""
+        now = datetime.utcnow()
+        lease = timedelta(seconds=current_app.config['JOBS_LEASE_SECONDS'])
+        # Requeue jobs whose worker vanished mid-run
+        db.session.execute(
+            update(Job).where(Job.status == 'running', Job.claimed_at < now - lease)
+            .values(status='queued', claim_token=None)
+        )
+        token = uuid.uuid4().hex
+        due = select(Job.id).where(Job.status == 'queued', Job.run_at <= now) \
+            .order_by(Job.run_at, Job.id).limit(limit).scalar_subquery()
+        db.session.execute(
+            update(Job).where(Job.id.in_(due), Job.status == 'queued')
+            .values(status='running', claim_token=token, claimed_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        # Plain rows rather than Job objects, so later commits don't expire them mid-batch
+        return db.session.execute(
+            select(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts, Job.claim_token)
+            .where(Job.claim_token == token).order_by(Job.id)
+        ).all()
+
+    def run_batch(self, jobs):
+        """Run claimed job rows in one transaction, each inside its own savepoint; returns how many succeeded.
+
+        A job's writes and its 'done' mark share the savepoint, so they commit (or not) together.
+        """
+        succeeded = 0
+        # Renew the lease first. Starting with a write also matters on SQLite: the transaction takes
+        # the write lock up front (waiting its turn) instead of deadlocking on a lock upgrade later.
+        db.session.execute(
+            update(Job).where(Job.claim_token.in_({job.claim_token for job in jobs}), Job.status == 'running')
+            .values(claimed_at=datetime.utcnow())
+        )
+        for job in jobs:
+            try:
+                with db.session.begin_nested():
+                    task = self.tasks.get(job.name)
+                    if task is None:
+                        raise UnknownTaskError(job.name)
+                    task(**json.loads(job.payload))
+                    db.session.execute(
+                        update(Job).where(Job.id == job.id, Job.claim_token == job.claim_token)
+                        .values(status='done', finished_at=datetime.utcnow(), last_error=None)
+                    )
+                succeeded += 1
+            except Exception as e:
+                self._record_failure(job, e)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Hand the batch back rather than leaving it 'running' until the lease expires
+            db.session.execute(
+                update(Job).where(Job.claim_token.in_({job.claim_token for job in jobs}), Job.status == 'running')
+                .values(status='queued', claim_token=None)
+            )
+            db.session.commit()
+            raise
+        return succeeded
+
+    def run(self, job):
+        """Run one claimed job row; returns True on success."""
+        return self.run_batch([job]) == 1
+
+    def _record_failure(self, job, error):
+        current_app.logger.warning('Job %s (%s) failed on attempt %s: %r', job.id, job.name, job.attempts, error)
+        if job.attempts >= job.max_attempts or isinstance(error, UnknownTaskError):
+            values = {'status': 'failed', 'finished_at': datetime.utcnow()}
+        else:
+            backoff = current_app.config['JOBS_RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+            values = {'status': 'queued', 'claim_token': None, 'run_at': datetime.utcnow() + timedelta(seconds=backoff)}
+        db.session.execute(
+            update(Job).where(Job.id == job.id, Job.claim_token == job.claim_token)
+            .values(last_error=f'{type(error).__name__}: {error}'[:2000], **values)
+        )
+
+    def run_pending(self):
+        """Run jobs until none are due (tests, cron, `flask jobs-work --burst`); returns how many ran."""
+        ran = 0
+        while True:
+            jobs = self.claim(current_app.config['JOBS_BATCH_SIZE'])
+            if not jobs:
+                return ran
+            self.run_batch(jobs)
+            ran += len(jobs)
+
+    def work_forever(self, app, wake):
+        batch_size, poll = app.config['JOBS_BATCH_SIZE'], app.config['JOBS_POLL_INTERVAL']
+        while True:
+            with app.app_context():
+                try:
+                    jobs = self.claim(batch_size)
+                    if jobs:
+                        self.run_batch(jobs)
+                except Exception:
+                    app.logger.exception('Job worker error')
+                    jobs = []
+                finally:
+                    db.session.remove()
+            if not jobs:
+                wake.wait(poll)
+                wake.clear()
+
+    def _ensure_workers(self, app):
+        if app in self._pools:
+            return
+        with self._lock:
+            if app in self._pools:
+                return
+            wake = threading.Event()
+            threads = [threading.Thread(target=self.work_forever, args=(app, wake),
+                                        name=f'job-worker-{i}', daemon=True)
+                       for i in range(app.config['JOBS_WORKERS'])]
+            self._pools[app] = (wake, threads)
+            for thread in threads:
+                thread.start()
+
+    def wake_workers(self):
+        for wake, _ in list(self._pools.values()):
+            wake.set()
+
+    # --- reads ---------------------------------------------------------------------------------
+
+    def counts(self):
+        return dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+
+
+job_queue = JobQueue()
+
+
+def _after_commit(session):
+    # New jobs are visible now; don't make the workers wait out their poll interval
+    if session.info.pop('jobs_enqueued', False):
+        job_queue.wake_workers()
+
+
+def _after_rollback(session):
+    session.info.pop('jobs_enqueued', None)
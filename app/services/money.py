@@ -0,0 +1,37 @@
+# app/services/money.py
+# Amounts of money are stored as integer cents (Book.price_cents, OrderItem.unit_price_cents,
+# Order.total_cents, the revenue_cents of the stats and report tables), so sums in SQL and in
+# Python are exact. Code and templates see Decimal amounts through the models' properties
+# (book.price, order.total_amount...) and convert at the edges with the helpers below.
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """12.34 / '12.34' / Decimal('12.34') -> 1234, rounding half up; None stays None."""
+    if amount is None:
+        return None
+    if isinstance(amount, int):
+        return amount * 100
+    # str() first, so a float like 19.99 is read as written rather than as its binary expansion
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    if not value.is_finite():
+        raise InvalidOperation(f'Not an amount of money: {amount!r}')
+    return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """1234 -> Decimal('12.34'); None stays None."""
+    if cents is None:
+        return None
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def format_cents(cents):
+    """Template filter: `{{ order.total_cents|cents }}` -> '12.34'."""
+    return f'{from_cents(cents or 0):.2f}'
+
+
+def init_app(app):
+    app.add_template_filter(format_cents, 'cents')
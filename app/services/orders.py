@@ -0,0 +1,120 @@
+# app/services/orders.py
+# Order lifecycle: which status changes are allowed, and the background work each one triggers.
+#
+#   pending_payment -> processing -> shipped -> delivered
+#          |               |
+#          +---------------+-------> cancelled
+#
+# Checkout enqueues 'orders.confirm' in the order's own transaction. With a payment gateway hooked
+# in (PAYMENT_CAPTURE) that job takes the payment and moves the order to processing, off the request
+# thread; without one it only tells the customer the order was received, and the order waits in
+# pending_payment until a manager marks it paid (processing).
+# Every status change enqueues a customer notification, and cancelling enqueues 'orders.restock',
+# which puts the order's books back in stock. All jobs carry an idempotency key
+# ('order:<id>:<step>'), and each task re-checks the order's status, so repeats are no-ops.
+import logging
+
+from flask import current_app
+from sqlalchemy import case, func, select, update
+from werkzeug.utils import import_string
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, Order, OrderItem
+from bookstore_flask_project.app.services.jobs import job_queue
+
+TRANSITIONS = {
+    'pending_payment': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+NOTIFICATIONS = {
+    'pending_payment': 'Thank you! We have received order #{id} and will confirm it once it is paid.',
+    'processing': 'Thank you! Order #{id} is confirmed and being prepared.',
+    'shipped': 'Good news: order #{id} has shipped.',
+    'delivered': 'Order #{id} has been delivered. Enjoy your books!',
+    'cancelled': 'Order #{id} has been cancelled.',
+}
+notification_logger = logging.getLogger('bookstore.notifications')
+
+
+class InvalidTransitionError(Exception):
+    """Raised for status changes the lifecycle doesn't allow; str(e) is safe to flash."""
+
+    def __init__(self, order, new_status):
+        super().__init__(f'Order #{order.id} cannot go from {order.status} to {new_status}.')
+
+
+def next_statuses(order):
+    return TRANSITIONS.get(order.status, ())
+
+
+def transition(order, new_status):
+    """Move `order` to `new_status` and queue the follow-up jobs; the caller commits."""
+    if new_status not in next_statuses(order):
+        raise InvalidTransitionError(order, new_status)
+    order.status = new_status
+    job_queue.enqueue('orders.notify', {'order_id': order.id, 'status': new_status},
+                      idempotency_key=f'order:{order.id}:notify:{new_status}')
+    if new_status == 'cancelled':
+        job_queue.enqueue('orders.restock', {'order_id': order.id}, idempotency_key=f'order:{order.id}:restock')
+
+
+def enqueue_confirmation(order_id):
+    """Called by checkout inside the order's transaction."""
+    job_queue.enqueue('orders.confirm', {'order_id': order_id}, idempotency_key=f'order:{order_id}:confirm')
+
+
+# --- tasks ------------------------------------------------------------------------------------
+# Run by job workers inside the job's transaction (see jobs.py): no commits here.
+
+@job_queue.task('orders.confirm')
+def confirm_order(order_id):
+    order = db.session.get(Order, order_id)
+    if order is None or order.status != 'pending_payment':
+        return  # Already confirmed, or cancelled before we got to it
+    capture = _payment_capture()
+    if capture is None:
+        # No gateway: nothing was paid, so the order stays pending_payment for a manager to confirm
+        job_queue.enqueue('orders.notify', {'order_id': order.id, 'status': 'pending_payment'},
+                          idempotency_key=f'order:{order.id}:notify:pending_payment')
+        return
+    capture(order)  # Raising makes the job retry with backoff
+    transition(order, 'processing')
+
+
+def _payment_capture():
+    """The PAYMENT_CAPTURE callable (or its 'module:function' import path), or None."""
+    capture = current_app.config.get('PAYMENT_CAPTURE')
+    return import_string(capture) if isinstance(capture, str) else capture
+
+
+@job_queue.task('orders.notify')
+def notify_customer(order_id, status):
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return
+    # Stand-in for an email; the logger can be routed to a mail handler
+    notification_logger.info('To user %s: %s', order.user_id, NOTIFICATIONS[status].format(id=order.id))
+
+
+@job_queue.task('orders.restock')
+def restock_order(order_id):
+    order = db.session.get(Order, order_id)
+    if order is None or order.status != 'cancelled':
+        return
+    quantities = dict(db.session.execute(
+        select(OrderItem.book_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id == order_id).group_by(OrderItem.book_id)
+    ).all())
+    if not quantities:
+        return
+    returned = case(quantities, value=Book.id)
+    db.session.execute(
+        update(Book).where(Book.id.in_(quantities))
+        .values(stock_quantity=Book.stock_quantity + returned)
+        # Negative deltas: stock went up (stats.py / cache.py keep their counters in step)
+        .execution_options(synchronize_session=False,
+                           stock_deltas={book_id: -quantity for book_id, quantity in quantities.items()})
+    )
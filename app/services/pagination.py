@@ -0,0 +1,198 @@
+# app/services/pagination.py
+# Keyset (seek) pagination. Instead of OFFSET, each page continues from the sort key of the
+# last row seen, so page 10,000 costs the same index seek as page 1.
+#
+# Usage:
+#   page = keyset_paginate(Book.query, (Book.title.asc(), Book.id.asc()),
+#                          cursor=request.args.get('cursor'), per_page=12)
+#   page.items, page.next_cursor, page.prev_cursor, page.has_next, page.has_prev, page.total
+#
+# For a column query (db.session.query(Book.id, Book.title)..., or Book.query.with_entities(...))
+# the items are tuples of those columns rather than objects.
+#
+# The last sort key must be unique (the primary key) so that ties on the other columns are
+# broken deterministically. Cursor tokens are signed with SECRET_KEY, so they are opaque to
+# clients and can't be forged to point at arbitrary keys.
+import threading
+import time
+from datetime import date, datetime
+
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql import operators
+
+CURSOR_SALT = 'keyset-cursor'
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total  # None unless the caller asked for it
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __repr__(self):
+        return f'<KeysetPage items={len(self.items)} has_next={self.has_next} has_prev={self.has_prev}>'
+
+
+class _TotalCache:
+    """Tiny TTL cache so listings that show a total don't run COUNT(*) on every page view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            self._values.pop(key, None)
+            return None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+total_cache = _TotalCache()
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=CURSOR_SALT)
+
+
+def _dump_value(value):
+    # JSON can't carry dates, so tag them
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+    return value
+
+
+def encode_cursor(values, direction):
+    return _serializer().dumps({'k': [_dump_value(v) for v in values], 'dir': direction})
+
+
+def decode_cursor(token, key_count):
+    """Return (values, direction), or (None, 'next') for a missing/invalid/tampered token."""
+    if not token:
+        return None, 'next'
+    try:
+        payload = _serializer().loads(token)
+        values = [_load_value(v) for v in payload['k']]
+        direction = payload['dir']
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None, 'next'
+    if len(values) != key_count or direction not in ('next', 'prev'):
+        return None, 'next'
+    return values, direction
+
+
+def _split_sort_key(clause):
+    """Turn `Book.title.asc()` into (Book.title, descending=False)."""
+    modifier = getattr(clause, 'modifier', None)
+    if modifier is operators.desc_op:
+        return clause.element, True
+    if modifier is operators.asc_op:
+        return clause.element, False
+    return clause, False
+
+
+def _seek_condition(keys, values, backwards):
+    # (k1, k2, ..., kn) "after" (v1, ..., vn) in the sort order.
+    if len({descending for _, descending in keys}) == 1:
+        # All keys run the same way: a row-value comparison, which the planner turns into a
+        # single range scan on the (k1, id) index and stops after per_page rows.
+        ahead = keys[0][1] == backwards
+        columns, row = tuple_(*[column for column, _ in keys]), tuple_(*values)
+        return columns > row if ahead else columns < row
+    # Mixed directions: spell it out as an OR of prefix-equalities, with a redundant bound on
+    # the leading key so the scan can still start from the index.
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        ahead = descending == backwards  # True -> the next rows have larger values
+        step = column > values[i] if ahead else column < values[i]
+        equal_prefix = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, step))
+    lead, descending = keys[0]
+    lead_bound = lead >= values[0] if descending == backwards else lead <= values[0]
+    return and_(lead_bound, or_(*clauses))
+
+
+def keyset_paginate(query, sort_keys, cursor=None, per_page=10, with_total=False,
+                    total_cache_key=None, total_ttl=None):
+    """Fetch one page of `query` ordered by `sort_keys`, continuing from `cursor`.
+
+    `with_total` adds a COUNT(*) of the whole listing; pass `total_cache_key` to reuse that
+    count for `total_ttl` seconds (KEYSET_TOTAL_TTL in config) instead of recounting per page.
+    """
+    keys = [_split_sort_key(clause) for clause in sort_keys]
+    values, direction = decode_cursor(cursor, len(keys))
+    backwards = direction == 'prev'
+
+    total = None
+    if with_total:
+        total = total_cache.get(total_cache_key) if total_cache_key is not None else None
+        if total is None:
+            total = query.order_by(None).count()
+            if total_cache_key is not None:
+                ttl = total_ttl if total_ttl is not None else current_app.config.get('KEYSET_TOTAL_TTL', 60)
+                total_cache.set(total_cache_key, total, ttl)
+
+    # The sort values ride along as extra columns so cursors can be built for computed keys too
+    page_query = query.add_columns(*[column for column, _ in keys])
+    if values is not None:
+        page_query = page_query.filter(_seek_condition(keys, values, backwards))
+    order = [(column.asc() if descending == backwards else column.desc()) for column, descending in keys]
+    rows = page_query.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    descriptions = query.column_descriptions
+    width = len(descriptions)
+    whole_entity = width == 1 and descriptions[0]['expr'] is descriptions[0]['entity']
+    items = [row[0] if whole_entity else row[:width] for row in rows]
+    next_cursor = prev_cursor = None
+    if rows:
+        # Going backwards there is always a next page (the one we came from); going forwards
+        # there is a previous page whenever we started from a cursor.
+        if backwards:
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, values is not None
+        if has_next:
+            next_cursor = encode_cursor(list(rows[-1][width:]), 'next')
+        if has_prev:
+            prev_cursor = encode_cursor(list(rows[0][width:]), 'prev')
+    return KeysetPage(items, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor, total=total)
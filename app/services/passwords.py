@@ -0,0 +1,151 @@
+# app/services/passwords.py
+# Password hashing with a configurable cost, off the request threads.
+#
+#   - PASSWORD_HASH_METHOD is a werkzeug method string: 'scrypt:32768:8:1' (werkzeug's default),
+#     'scrypt:16384:8:1' for half the cost, 'pbkdf2:sha256:600000', ... Every stored hash names
+#     the method it was made with, so changing the setting never locks anyone out: old hashes
+#     still verify, and needs_rehash() tells the login route to store a new one.
+#   - Hashing runs in a pool of PASSWORD_HASH_WORKERS processes. A burst of logins then uses at
+#     most that many cores (and, for scrypt, that many 32 MB work areas) while the web threads
+#     just wait on a future. At most PASSWORD_HASH_MAX_PENDING hashes queue for the pool; past
+#     that, callers wait up to PASSWORD_HASH_TIMEOUT seconds and then get HashingBusyError.
+#     With PASSWORD_HASH_WORKERS = 0 (and outside an app context) hashes are computed inline.
+#   - verify_dummy() costs the same as a real check, for logins with an unknown username, so
+#     response times don't tell which usernames exist.
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusyError(Exception):
+    """Too many hashes already waiting for the pool; the request should be retried later."""
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults, so 'scrypt' and 'scrypt:32768:8:1' compare equal."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        if not args:
+            args = ['32768', '8', '1']
+        if len(args) != 3:
+            raise ValueError(f"'scrypt' takes 3 arguments: {method!r}")
+    elif name == 'pbkdf2':
+        if len(args) == 0:
+            args = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+        elif len(args) == 1:
+            args.append(str(DEFAULT_PBKDF2_ITERATIONS))
+        elif len(args) != 2:
+            raise ValueError(f"'pbkdf2' takes 2 arguments: {method!r}")
+    else:
+        raise ValueError(f'Unknown password hash method: {method!r}')
+    return ':'.join([name, *(str(int(a)) if a.isdigit() else a for a in args)])
+
+
+class PasswordHasher:
+    """Flask extension: hash and verify passwords in a bounded process pool."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 64)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10.0)
+        app.extensions['password_hasher'] = {
+            'method': normalize_method(app.config['PASSWORD_HASH_METHOD']),
+            'workers': app.config['PASSWORD_HASH_WORKERS'],
+            'slots': threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING']),
+            'timeout': app.config['PASSWORD_HASH_TIMEOUT'],
+            'pool': None,
+            'dummy': None,
+            'lock': threading.Lock(),
+        }
+
+    @staticmethod
+    def _state():
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('password_hasher')
+
+    @property
+    def method(self):
+        state = self._state()
+        return state['method'] if state is not None else DEFAULT_METHOD
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._call(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if `pwhash` was made with other parameters than PASSWORD_HASH_METHOD."""
+        if not pwhash or '$' not in pwhash:
+            return True
+        try:
+            return normalize_method(pwhash.split('$', 1)[0]) != self.method
+        except ValueError:
+            return True
+
+    def verify_dummy(self, password):
+        """A verification that always fails but takes as long as a real one."""
+        state = self._state()
+        if state is None:
+            dummy = generate_password_hash('', DEFAULT_METHOD)
+        else:
+            if state['dummy'] is None:
+                state['dummy'] = self.hash('')
+            dummy = state['dummy']
+        self.verify(dummy, password)
+        return False
+
+    # --- the pool ------------------------------------------------------------------------------
+
+    def _call(self, fn, *args):
+        state = self._state()
+        if state is None or not state['workers']:
+            return fn(*args)
+        if not state['slots'].acquire(timeout=state['timeout']):
+            raise HashingBusyError()
+        try:
+            return self._pool(state).submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time and answer inline now
+            current_app.logger.warning('Password hashing pool broke; recreating it')
+            with state['lock']:
+                state['pool'] = None
+            return fn(*args)
+        finally:
+            state['slots'].release()
+
+    @staticmethod
+    def _pool(state):
+        pool = state['pool']
+        if pool is None:
+            with state['lock']:
+                if state['pool'] is None:
+                    # 'spawn' rather than fork: this process runs other threads (job workers,
+                    # the cart flusher) whose held locks a forked child would inherit
+                    state['pool'] = ProcessPoolExecutor(max_workers=state['workers'],
+                                                        mp_context=multiprocessing.get_context('spawn'))
+                pool = state['pool']
+        return pool
+
+    def shutdown(self):
+        state = self._state()
+        if state is not None and state['pool'] is not None:
+            state['pool'].shutdown()
+            state['pool'] = None
+
+
+password_hasher = PasswordHasher()
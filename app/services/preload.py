@@ -0,0 +1,47 @@
+# app/services/preload.py
+# One-time warm-up for pre-fork servers (see preload_app() in app/__init__.py).
+#
+# A worker would otherwise pay for these on its first requests: configuring the ORM mappers,
+# compiling the Jinja templates, building the URL matcher. Done in the master before forking,
+# the results are shared (copy-on-write) by every worker. Afterwards:
+# - the engines are disposed, so no database connection is inherited by the workers (each opens
+#   its own on first use);
+# - the surviving objects are moved out of the garbage collector's reach (gc.freeze()), so the
+#   collector in a worker doesn't write to, and thereby copy, the pages they live on.
+#
+# Background threads and process pools (job workers, cart flusher, password hashing) start on
+# first use, so none are running yet at fork time.
+import gc
+import time
+
+from jinja2 import TemplateError
+from sqlalchemy.orm import configure_mappers
+
+from bookstore_flask_project.app import db
+
+
+def compile_templates(app):
+    """Load (compile) every template the app can find; returns how many compiled."""
+    compiled = 0
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except TemplateError:
+            app.logger.warning('Template %s failed to compile during preload', name, exc_info=True)
+    return compiled
+
+
+def warm_up(app):
+    """Configure mappers, compile templates and the URL map, then dispose engines and freeze the GC."""
+    started = time.perf_counter()
+    with app.app_context():
+        configure_mappers()
+        templates = compile_templates(app)
+        app.url_map.update()
+        for engine in db.engines.values():
+            engine.dispose()
+    gc.collect()
+    gc.freeze()
+    app.logger.info('Preloaded in %.0f ms (%d templates)', (time.perf_counter() - started) * 1000, templates)
+    return templates
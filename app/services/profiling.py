@@ -0,0 +1,275 @@
+# app/services/profiling.py
+# Opt-in request instrumentation (PROFILING_ENABLED).
+#
+# For every request it records, per endpoint:
+#   - a latency histogram (fixed buckets, Prometheus style),
+#   - the number of SQL statements and the time spent in them, from engine cursor events,
+#   - time spent rendering templates, from Flask's template signals.
+# Statements slower than PROFILING_SLOW_QUERY_MS are logged to the 'bookstore.sql.slow' logger.
+# A PROFILING_SAMPLE_RATE fraction of requests run under cProfile; the stats of those that turn
+# out slower than PROFILING_SLOW_REQUEST_MS are kept (the last PROFILING_MAX_PROFILES of them).
+#
+# Figures are exposed to managers at /manager/metrics (JSON), /manager/metrics/prometheus
+# (text exposition format) and /manager/metrics/profiles. Every instrumented response also
+# carries a Server-Timing header, so the numbers show up in the browser's dev tools.
+# Counters are per worker process.
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float('inf'))
+slow_query_logger = logging.getLogger('bookstore.sql.slow')
+
+
+class EndpointStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, sql_statements, sql_seconds, template_seconds, status_code):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.total_seconds += seconds
+        self.sql_statements += sql_statements
+        self.sql_seconds += sql_seconds
+        self.template_seconds += template_seconds
+        if status_code >= 500:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-th quantile (what a histogram can tell)."""
+        if not self.count:
+            return None
+        target, running = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            running += n
+            if running >= target:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'requests': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total_seconds / count * 1000, 2),
+            'p50_le_ms': _ms(self.quantile(0.5)),
+            'p99_le_ms': _ms(self.quantile(0.99)),
+            'sql_statements_per_request': round(self.sql_statements / count, 2),
+            'sql_ms_per_request': round(self.sql_seconds / count * 1000, 2),
+            'template_ms_per_request': round(self.template_seconds / count * 1000, 2),
+        }
+
+
+def _ms(seconds):
+    if seconds is None:
+        return None
+    return 'inf' if seconds == float('inf') else seconds * 1000
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class RequestProfiler:
+    """Flask extension: per-endpoint timings, SQL and template instrumentation, sampled cProfile."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_queries = 0
+        self.profiles = deque(maxlen=20)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILING_ENABLED', False)
+        app.config.setdefault('PROFILING_SLOW_QUERY_MS', 100)
+        app.config.setdefault('PROFILING_SLOW_REQUEST_MS', 500)
+        app.config.setdefault('PROFILING_SAMPLE_RATE', 0.05)
+        app.config.setdefault('PROFILING_MAX_PROFILES', 20)
+        app.extensions['request_profiler'] = self
+        if not app.config['PROFILING_ENABLED']:
+            return  # Nothing is hooked in, so there is no overhead at all
+
+        self.profiles = deque(self.profiles, maxlen=app.config['PROFILING_MAX_PROFILES'])
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                               ('after_cursor_execute', _after_cursor_execute)):
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+
+    @staticmethod
+    def enabled():
+        return current_app.config.get('PROFILING_ENABLED', False)
+
+    # --- request hooks -------------------------------------------------------------------------
+
+    def _before_request(self):
+        g._profiling = {'started': time.perf_counter(), 'sql_statements': 0, 'sql_seconds': 0.0,
+                        'template_seconds': 0.0, 'template_started': [], 'profiler': None}
+        if random.random() < current_app.config['PROFILING_SAMPLE_RATE']:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # Another profiler is already active on this thread
+                return
+            g._profiling['profiler'] = profiler
+
+    def _after_request(self, response):
+        state = g.get('_profiling')
+        if state is not None:
+            elapsed = (time.perf_counter() - state['started']) * 1000
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed:.1f}, '
+                f'sql;dur={state["sql_seconds"] * 1000:.1f};desc="{state["sql_statements"]} statements", '
+                f'tpl;dur={state["template_seconds"] * 1000:.1f}'
+            )
+            state['status_code'] = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.pop('_profiling', None)
+        if state is None:
+            return
+        elapsed = time.perf_counter() - state['started']
+        profiler = state['profiler']
+        if profiler is not None:
+            profiler.disable()
+        status_code = state.get('status_code', 500 if exc is not None else 200)
+        endpoint = request.endpoint or '<unmatched>'
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.observe(elapsed, state['sql_statements'], state['sql_seconds'], state['template_seconds'],
+                          status_code)
+        if profiler is not None and elapsed * 1000 >= current_app.config['PROFILING_SLOW_REQUEST_MS']:
+            self._keep_profile(profiler, endpoint, elapsed, state)
+
+    def _keep_profile(self, profiler, endpoint, elapsed, state):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(30)
+        with self._lock:
+            self.profiles.append({
+                'at': datetime.utcnow().isoformat(timespec='seconds'),
+                'endpoint': endpoint,
+                'path': request.full_path,
+                'ms': round(elapsed * 1000, 1),
+                'sql_statements': state['sql_statements'],
+                'stats': out.getvalue(),
+            })
+
+    def _template_started(self, sender, template, context, **extra):
+        state = g.get('_profiling')
+        if state is not None:
+            state['template_started'].append(time.perf_counter())
+
+    def _template_finished(self, sender, template, context, **extra):
+        state = g.get('_profiling')
+        if state is not None and state['template_started']:
+            state['template_seconds'] += time.perf_counter() - state['template_started'].pop()
+
+    # --- reads ---------------------------------------------------------------------------------
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'endpoints': {name: stats.as_dict() for name, stats in sorted(self.endpoints.items())},
+                'slow_queries': self.slow_queries,
+                'profiles_kept': len(self.profiles),
+            }
+
+    def recent_profiles(self):
+        with self._lock:
+            return list(reversed(self.profiles))
+
+    def prometheus(self):
+        """All counters in the Prometheus text exposition format."""
+        lines = [
+            '# HELP bookstore_request_duration_seconds Request latency by endpoint.',
+            '# TYPE bookstore_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for name, stats in endpoints:
+                running = 0
+                for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                    running += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'bookstore_request_duration_seconds_bucket{{endpoint="{_label(name)}",le="{le}"}} {running}')
+                lines.append(f'bookstore_request_duration_seconds_sum{{endpoint="{_label(name)}"}} {stats.total_seconds}')
+                lines.append(f'bookstore_request_duration_seconds_count{{endpoint="{_label(name)}"}} {stats.count}')
+            for metric, kind, help_text, attr in (
+                ('bookstore_request_errors_total', 'counter', 'Responses with a 5xx status.', 'errors'),
+                ('bookstore_sql_statements_total', 'counter', 'SQL statements executed.', 'sql_statements'),
+                ('bookstore_sql_duration_seconds_total', 'counter', 'Time spent in SQL statements.', 'sql_seconds'),
+                ('bookstore_template_render_seconds_total', 'counter', 'Time spent rendering templates.',
+                 'template_seconds'),
+            ):
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} {kind}')
+                for name, stats in endpoints:
+                    lines.append(f'{metric}{{endpoint="{_label(name)}"}} {getattr(stats, attr)}')
+            lines.append('# HELP bookstore_sql_slow_queries_total Statements slower than PROFILING_SLOW_QUERY_MS.')
+            lines.append('# TYPE bookstore_sql_slow_queries_total counter')
+            lines.append(f'bookstore_sql_slow_queries_total {self.slow_queries}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.slow_queries = 0
+            self.profiles.clear()
+
+
+request_profiler = RequestProfiler()
+
+
+# --- SQL instrumentation ----------------------------------------------------------------------
+# Listeners are on the Engine class so they also cover engines created after init_app. They only
+# record anything inside an instrumented request, or log slow statements when profiling is on.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profiling_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('profiling_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if not has_request_context():
+        return
+    state = g.get('_profiling')
+    if state is None:
+        return
+    state['sql_statements'] += 1
+    state['sql_seconds'] += elapsed
+    if elapsed * 1000 >= current_app.config['PROFILING_SLOW_QUERY_MS']:
+        with request_profiler._lock:
+            request_profiler.slow_queries += 1
+        slow_query_logger.warning('%.1f ms in %s: %s', elapsed * 1000, request.endpoint, statement)
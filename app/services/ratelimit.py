@@ -0,0 +1,101 @@
+# app/services/ratelimit.py
+# In-memory token buckets for throttling the auth routes.
+#
+# Each rule is (burst, per_minute): a key (an IP address, a username) may make `burst` attempts
+# straight away, after which it earns `per_minute` more a minute. The auth routes use:
+#   - 'ip': every login and signup POST from an address (AUTH_IP_BURST / AUTH_IP_PER_MINUTE),
+#   - 'username': failed logins for a username, from any address (LOGIN_USERNAME_BURST /
+#     LOGIN_USERNAME_PER_MINUTE); a successful login refills it.
+# Buckets live in the worker process (at most RATELIMIT_MAX_KEYS of them, least recently used
+# dropped first), so with several workers the effective limit is that many times higher.
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class TokenBuckets:
+    def __init__(self, burst, per_minute, max_keys=100000):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _refill(self, key, now):
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def _wait(self, tokens):
+        return (1 - tokens) / self.rate if self.rate else float('inf')
+
+    def peek(self, key):
+        """Seconds until `key` may make an attempt (0 if it may now); takes nothing."""
+        with self._lock:
+            tokens = self._refill(key, time.monotonic())
+        return 0 if tokens >= 1 else self._wait(tokens)
+
+    def hit(self, key):
+        """Take a token for an attempt by `key`; returns 0, or the seconds to wait if there was none."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._refill(key, now)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = self._wait(tokens)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class RateLimiter:
+    """Flask extension: named token-bucket rules, configured from the app config."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('AUTH_IP_BURST', 20)
+        app.config.setdefault('AUTH_IP_PER_MINUTE', 20)
+        app.config.setdefault('LOGIN_USERNAME_BURST', 5)
+        app.config.setdefault('LOGIN_USERNAME_PER_MINUTE', 5)
+        max_keys = app.config['RATELIMIT_MAX_KEYS']
+        app.extensions['rate_limiter'] = {
+            'ip': TokenBuckets(app.config['AUTH_IP_BURST'], app.config['AUTH_IP_PER_MINUTE'], max_keys),
+            'username': TokenBuckets(app.config['LOGIN_USERNAME_BURST'], app.config['LOGIN_USERNAME_PER_MINUTE'],
+                                     max_keys),
+        }
+
+    @staticmethod
+    def _buckets(rule):
+        if not current_app.config['RATELIMIT_ENABLED']:
+            return None
+        return current_app.extensions['rate_limiter'][rule]
+
+    def hit(self, rule, key):
+        buckets = self._buckets(rule)
+        return buckets.hit(key) if buckets is not None else 0
+
+    def peek(self, rule, key):
+        buckets = self._buckets(rule)
+        return buckets.peek(key) if buckets is not None else 0
+
+    def reset(self, rule, key):
+        buckets = self._buckets(rule)
+        if buckets is not None:
+            buckets.reset(key)
+
+
+rate_limiter = RateLimiter()
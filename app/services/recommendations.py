@@ -0,0 +1,341 @@
+# app/services/recommendations.py
+# "Customers also bought": books that were ordered together with a book (on its page) or with the
+# books in a cart.
+#
+# The model is the co-purchase matrix: for each pair of books, how many orders contained both
+# (CoPurchase, sparse, stored both ways round). Serving reads BookRecommendation, the top
+# RECOMMENDATIONS_PER_BOOK partners of each book in rank order, so a book page is one primary-key
+# range joined to Book.
+#   - rebuild() ('flask recommendations-rebuild') computes the matrix from the whole order history,
+#     in batches of orders: each order's books are expanded into pairs and counted, vectorized with
+#     NumPy when it is installed and with plain Python otherwise, then ranked per book.
+#   - refresh() folds in the orders settled since the last fold (the 'recommendations.watermark'
+#     StoreStat, like the sales reports), adds their pairs to CoPurchase and re-ranks only the books
+#     they touched. Checkout schedules one refresh job per RECOMMENDATIONS_REFRESH_SECONDS window.
+# Cancelled orders count if they were cancelled after being folded in, until the next rebuild.
+# Orders of more than RECOMMENDATIONS_MAX_BASKET books (bulk purchases) are left out: they'd
+# add a pair for every two of their books and say little about what goes together.
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from heapq import nsmallest
+from itertools import chain, combinations, groupby
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, BookRecommendation, CoPurchase, Order, OrderItem, StoreStat
+from bookstore_flask_project.app.services.archive import TABLES
+from bookstore_flask_project.app.services.catalog import SUMMARY_COLUMNS, BookSummary
+from bookstore_flask_project.app.services.jobs import job_queue
+from bookstore_flask_project.app.services.stats import (
+    NON_REVENUE_STATUSES, RECOMMENDATIONS_VERSION as VERSION, RECOMMENDATIONS_WATERMARK as WATERMARK,
+)
+
+CHUNK = 500  # Ids per IN list
+
+
+def _chunks(values, size=CHUNK):
+    values = list(values)
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+
+# --- pair counting ----------------------------------------------------------------------------
+
+def _pair_counts(lines, shift, max_basket):
+    """lines: (order id, book id) rows -> (books, others, orders) of every co-purchased pair, both ways round.
+
+    `shift` is above every book id (pairs are packed into one integer as book * shift + other).
+    """
+    if np is not None:
+        if not len(lines):
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+        packed = np.fromiter(chain.from_iterable(lines), np.int64, 2 * len(lines)).reshape(-1, 2)
+        # Sorted by order, then book, and each book once per order
+        packed = np.unique(packed[:, 0] * shift + packed[:, 1])
+        orders, books = packed // shift, packed % shift
+        starts = np.flatnonzero(np.concatenate(([True], orders[1:] != orders[:-1])))
+        sizes = np.diff(np.append(starts, len(books)))
+        left, right = [], []
+        # All orders of one size at once: a (orders, size) matrix of books, paired column by column
+        for size in np.unique(sizes):
+            if size < 2 or size > max_basket:
+                continue
+            baskets = books[starts[sizes == size][:, None] + np.arange(size)]
+            i, j = np.triu_indices(size, 1)
+            left.append(baskets[:, i].ravel())
+            right.append(baskets[:, j].ravel())
+        if not left:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+        pairs, counts = np.unique(np.concatenate(left + right) * shift + np.concatenate(right + left),
+                                  return_counts=True)
+        return pairs // shift, pairs % shift, counts
+    counts = Counter()
+    for _, group in groupby(sorted(set(map(tuple, lines))), key=lambda line: line[0]):
+        basket = [book_id for _, book_id in group]
+        if 2 <= len(basket) <= max_basket:
+            for book_id, other_id in combinations(basket, 2):
+                counts[book_id, other_id] += 1
+                counts[other_id, book_id] += 1
+    return [pair[0] for pair in counts], [pair[1] for pair in counts], list(counts.values())
+
+
+def _merge(parts, shift):
+    """Sum the pair counts of several batches."""
+    if np is not None:
+        if not parts:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+        pairs = np.concatenate([books * shift + others for books, others, _ in parts])
+        unique, inverse = np.unique(pairs, return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([counts for _, _, counts in parts])).astype(np.int64)
+        return unique // shift, unique % shift, counts
+    total = Counter()
+    for books, others, counts in parts:
+        total.update(dict(zip(zip(books, others), counts)))
+    return [pair[0] for pair in total], [pair[1] for pair in total], list(total.values())
+
+
+def _top_k(books, others, counts, k, min_orders):
+    """(book, rank, other, orders) of each book's k most co-purchased partners; ties go to the lower id."""
+    if np is not None:
+        keep = counts >= min_orders
+        books, others, counts = books[keep], others[keep], counts[keep]
+        order = np.lexsort((others, -counts, books))
+        books, others, counts = books[order], others[order], counts[order]
+        positions = np.arange(len(books))
+        first = np.concatenate(([True], books[1:] != books[:-1])) if len(books) else np.empty(0, bool)
+        rank = positions - np.maximum.accumulate(np.where(first, positions, 0)) + 1
+        top = rank <= k
+        return zip(books[top].tolist(), rank[top].tolist(), others[top].tolist(), counts[top].tolist())
+    partners = defaultdict(list)
+    for book_id, other_id, count in zip(books, others, counts):
+        if count >= min_orders:
+            partners[book_id].append((-count, other_id))
+    return [(book_id, rank, other_id, -negative)
+            for book_id, candidates in partners.items()
+            for rank, (negative, other_id) in enumerate(nsmallest(k, candidates), 1)]
+
+
+# --- maintenance ------------------------------------------------------------------------------
+
+def _settings():
+    config = current_app.config
+    return (config['RECOMMENDATIONS_PER_BOOK'], config['RECOMMENDATIONS_MIN_ORDERS'],
+            config['RECOMMENDATIONS_MAX_BASKET'])
+
+
+def _order_lines(orders=Order, items=OrderItem):
+    return select(items.order_id, items.book_id).join(orders, items.order_id == orders.id) \
+        .where(orders.status.notin_(NON_REVENUE_STATUSES))
+
+
+def _bump_version(connection):
+    result = connection.execute(update(StoreStat.__table__).where(StoreStat.__table__.c.name == VERSION)
+                                .values(value=StoreStat.__table__.c.value + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(StoreStat.__table__).values(name=VERSION, value=1))
+
+
+def rebuild(batch_orders=50000):
+    """Recompute the co-purchase counts and every book's recommendations from the order history.
+
+    Returns how many pairs there are. The caller commits.
+    """
+    per_book, min_orders, max_basket = _settings()
+    db.session.execute(delete(StoreStat).where(StoreStat.name == WATERMARK))
+    high = db.session.execute(select(func.coalesce(func.max(OrderItem.id), 0))).scalar()
+    shift = max(db.session.execute(select(func.coalesce(func.max(items.book_id), 0))).scalar()
+                for _, items in TABLES) + 1
+    parts = []
+    # Archived orders too (see archive.py); their items are all below `high`
+    for orders, items in TABLES:
+        last_order = db.session.execute(select(func.coalesce(func.max(items.order_id), 0))).scalar()
+        for low in range(0, last_order, batch_orders):
+            lines = db.session.execute(_order_lines(orders, items).where(
+                items.order_id > low, items.order_id <= low + batch_orders, items.id <= high)).all()
+            parts.append(_pair_counts(lines, shift, max_basket))
+    books, others, counts = _merge(parts, shift)
+    ranked = [{'book_id': b, 'rank': r, 'recommended_id': o, 'orders': c}
+              for b, r, o, c in _top_k(books, others, counts, per_book, min_orders)]
+    if np is not None:
+        books, others, counts = books.tolist(), others.tolist(), counts.tolist()
+    rows = [{'book_id': b, 'other_id': o, 'orders': c} for b, o, c in zip(books, others, counts)]
+
+    # Core inserts: millions of plain rows, nothing for the ORM to track
+    connection = db.session.connection()
+    connection.execute(delete(BookRecommendation.__table__))
+    connection.execute(delete(CoPurchase.__table__))
+    for chunk in _chunks(rows, 10000):
+        connection.execute(insert(CoPurchase.__table__), chunk)
+    for chunk in _chunks(ranked, 10000):
+        connection.execute(insert(BookRecommendation.__table__), chunk)
+    connection.execute(insert(StoreStat.__table__), [{'name': WATERMARK, 'value': high}])
+    _bump_version(connection)
+    return len(rows)
+
+
+def _add_pairs(connection, books, others, counts):
+    """Add pair counts to CoPurchase: bulk UPDATE of every pair, then bulk INSERT of the ones it lacked.
+
+    Both look up each pair by primary key; new orders touch few pairs of the books they contain.
+    """
+    table = CoPurchase.__table__
+    rows = [{'b_book': b, 'b_other': o, 'b_orders': c} for b, o, c in zip(books, others, counts)]
+    pair = (table.c.book_id == bindparam('b_book')) & (table.c.other_id == bindparam('b_other'))
+    connection.execute(update(table).where(pair).values(orders=table.c.orders + bindparam('b_orders')), rows)
+    missing = select(bindparam('b_book'), bindparam('b_other'), bindparam('b_orders')) \
+        .where(~select(table.c.book_id).where(pair).exists())
+    connection.execute(insert(table).from_select(['book_id', 'other_id', 'orders'], missing), rows)
+
+
+def _rerank(connection, book_ids, per_book, min_orders):
+    """Replace the recommendations of `book_ids` with their current top partners in CoPurchase."""
+    for chunk in _chunks(book_ids):
+        rank = func.row_number().over(partition_by=CoPurchase.book_id,
+                                      order_by=(CoPurchase.orders.desc(), CoPurchase.other_id)).label('rank')
+        ranked = select(CoPurchase.book_id, CoPurchase.other_id, CoPurchase.orders, rank) \
+            .where(CoPurchase.book_id.in_(chunk), CoPurchase.orders >= min_orders).subquery()
+        rows = connection.execute(select(ranked).where(ranked.c.rank <= per_book)).all()
+        connection.execute(delete(BookRecommendation).where(BookRecommendation.book_id.in_(chunk)))
+        if rows:
+            connection.execute(insert(BookRecommendation), [
+                {'book_id': book_id, 'rank': rank, 'recommended_id': other_id, 'orders': orders}
+                for book_id, other_id, orders, rank in rows
+            ])
+
+
+def refresh():
+    """Fold the orders settled since the last refresh into the recommendations; returns how many
+    order items were folded. The caller commits (the refresh job runs in the job's transaction).
+    """
+    row = db.session.execute(select(StoreStat.value).where(StoreStat.name == WATERMARK)).first()
+    if row is None:
+        rebuild()
+        return 0
+    watermark = int(row.value)
+    # As for the sales reports: the last few seconds' orders wait for the next refresh, in case a
+    # transaction with a lower id is still in flight
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['RECOMMENDATIONS_SETTLE_SECONDS'])
+    high = db.session.execute(
+        select(func.max(OrderItem.id)).join(Order, OrderItem.order_id == Order.id)
+        .where(OrderItem.id > watermark, Order.order_date <= cutoff)
+    ).scalar()
+    if high is None:
+        return 0
+    # Claim the range first; a concurrent refresh that got there first makes this match nothing
+    claimed = db.session.execute(
+        update(StoreStat).where(StoreStat.name == WATERMARK, StoreStat.value == watermark).values(value=high)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return 0
+
+    per_book, min_orders, max_basket = _settings()
+    new_orders = select(OrderItem.order_id).where(OrderItem.id > watermark, OrderItem.id <= high)
+    lines = db.session.execute(_order_lines().where(OrderItem.order_id.in_(new_orders))).all()
+    shift = max((book_id for _, book_id in lines), default=0) + 1
+    books, others, counts = _pair_counts(lines, shift, max_basket)
+    if np is not None:
+        books, others, counts = books.tolist(), others.tolist(), counts.tolist()
+    connection = db.session.connection()
+    if books:
+        _add_pairs(connection, books, others, counts)
+        _rerank(connection, sorted(set(books)), per_book, min_orders)
+        _bump_version(connection)
+    return len(lines)
+
+
+@event.listens_for(Book, 'before_delete')
+def _book_deleted(mapper, connection, target):
+    # Only the deleted book's partners can list it: drop its pairs (primary-key ranges), then re-rank
+    # the partners so the next book up takes its place
+    partners = connection.execute(select(CoPurchase.other_id).where(CoPurchase.book_id == target.id)).scalars().all()
+    for chunk in _chunks(partners):
+        connection.execute(delete(CoPurchase).where(CoPurchase.book_id.in_(chunk), CoPurchase.other_id == target.id))
+    connection.execute(delete(BookRecommendation).where(BookRecommendation.book_id == target.id))
+    connection.execute(delete(CoPurchase).where(CoPurchase.book_id == target.id))
+    if partners:
+        per_book, min_orders, _ = _settings()
+        _rerank(connection, partners, per_book, min_orders)
+        _bump_version(connection)  # Their cached lists and validators still link to the deleted book
+
+
+@job_queue.task('recommendations.refresh')
+def refresh_task():
+    refresh()
+
+
+def schedule_refresh():
+    """Called by checkout in the order's transaction: one refresh job per RECOMMENDATIONS_REFRESH_SECONDS,
+    due once the window's orders have settled. With 0, run `flask recommendations-refresh` from cron.
+    """
+    interval = current_app.config['RECOMMENDATIONS_REFRESH_SECONDS']
+    if interval <= 0:
+        return
+    now = time.time()
+    window = int(now // interval)
+    job_queue.enqueue('recommendations.refresh', idempotency_key=f'recommendations:refresh:{window}',
+                      delay=(window + 1) * interval - now + current_app.config['RECOMMENDATIONS_SETTLE_SECONDS'])
+
+
+# --- reads ------------------------------------------------------------------------------------
+
+def version():
+    """(version, last_modified) of the recommendations, bumped whenever they change: one primary-key
+    lookup, for cache keys and HTTP validators."""
+    row = db.session.execute(select(StoreStat.value, StoreStat.updated_at).where(StoreStat.name == VERSION)).first()
+    return (int(row.value), row.updated_at) if row else (0, None)
+
+
+def for_book(book_id, limit=None):
+    """In-stock books most often bought with `book_id`, best first (BookSummary tuples)."""
+    limit = limit or current_app.config['RECOMMENDATIONS_SHOWN']
+    rows = db.session.query(*SUMMARY_COLUMNS) \
+        .join(BookRecommendation, BookRecommendation.recommended_id == Book.id) \
+        .filter(BookRecommendation.book_id == book_id, Book.stock_quantity > 0) \
+        .order_by(BookRecommendation.rank).limit(limit)
+    return [BookSummary._make(row) for row in rows]
+
+
+def for_books(book_ids, limit=None):
+    """In-stock books most often bought with any of `book_ids` (e.g. a cart), themselves excluded."""
+    if not book_ids:
+        return []
+    limit = limit or current_app.config['RECOMMENDATIONS_SHOWN']
+    score = func.sum(BookRecommendation.orders).label('score')
+    scored = select(BookRecommendation.recommended_id, score) \
+        .where(BookRecommendation.book_id.in_(book_ids), BookRecommendation.recommended_id.notin_(book_ids)) \
+        .group_by(BookRecommendation.recommended_id).subquery()
+    rows = db.session.query(*SUMMARY_COLUMNS).join(scored, scored.c.recommended_id == Book.id) \
+        .filter(Book.stock_quantity > 0).order_by(scored.c.score.desc(), Book.id).limit(limit)
+    return [BookSummary._make(row) for row in rows]
+
+
+def init_app(app):
+    app.config.setdefault('RECOMMENDATIONS_PER_BOOK', 20)
+    app.config.setdefault('RECOMMENDATIONS_SHOWN', 6)
+    app.config.setdefault('RECOMMENDATIONS_MIN_ORDERS', 1)
+    app.config.setdefault('RECOMMENDATIONS_MAX_BASKET', 50)
+    app.config.setdefault('RECOMMENDATIONS_REFRESH_SECONDS', 60)
+    app.config.setdefault('RECOMMENDATIONS_SETTLE_SECONDS', 5)
+
+    @app.cli.command('recommendations-rebuild')
+    def recommendations_rebuild():
+        """Recompute the co-purchase recommendations from the full order history."""
+        pairs = rebuild()
+        db.session.commit()
+        print(f'Counted {pairs} co-purchased pairs.')
+
+    @app.cli.command('recommendations-refresh')
+    def recommendations_refresh():
+        """Fold orders placed since the last refresh into the recommendations."""
+        folded = refresh()
+        db.session.commit()
+        print(f'Folded {folded} order items.')
@@ -0,0 +1,337 @@
+# app/services/reports.py
+# Sales reports for managers: revenue by day/week/month and by category, top sellers and their
+# sell-through rate (units sold / (units sold + units still in stock)).
+#
+# Reports read daily buckets rather than the whole order history: CategorySalesDaily (units and
+# revenue per day and category: the revenue series and category breakdown) and SalesDaily (per
+# day and book: top sellers). Both are extended incrementally: refresh() folds in the OrderItem
+# rows added since the last fold (the 'reports.watermark' StoreStat holds the last folded id) with
+# one GROUP BY per table, and every report starts with one. Orders moving in or out of a revenue status (e.g.
+# cancelled) adjust their day's buckets in the same transaction, by a mapper event.
+# `flask reports-rebuild` recomputes the buckets from scratch.
+#
+# Grouping happens in SQL. What SQL can't express portably (filling in days without sales,
+# moving averages, resampling to weeks or months, the category-by-period pivot) is done on
+# columnar arrays, vectorized with NumPy when it is installed and with plain Python otherwise.
+# Categories are the books' current ones. Revenue is summed in integer cents throughout and turned
+# into Decimal amounts only in the returned report.
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, delete, event, func, insert, inspect, select, true, tuple_, update
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import (
+    ArchivedOrder, ArchivedOrderItem, Book, CategorySalesDaily, Order, OrderItem, SalesDaily, StoreStat,
+)
+from bookstore_flask_project.app.services.money import from_cents
+from bookstore_flask_project.app.services.stats import NON_REVENUE_STATUSES, REPORTS_WATERMARK as WATERMARK
+
+GRANULARITIES = ('day', 'week', 'month')
+UNCATEGORIZED = 'Uncategorized'
+MOVING_AVERAGE_DAYS = 7
+
+
+def _as_date(value):
+    # SQLite's date() returns 'YYYY-MM-DD' strings, Postgres returns dates
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def _order_day(orders=Order):
+    return func.date(orders.order_date)
+
+
+# --- buckets ----------------------------------------------------------------------------------
+
+def _category():
+    return func.coalesce(func.nullif(Book.category, ''), UNCATEGORIZED)
+
+
+def _add_to_buckets(connection, model, key, rows, sign=1, fresh=False):
+    """rows: (day, key value, units, revenue in cents); bulk UPDATE of existing buckets, bulk INSERT of new ones.
+
+    `fresh` skips looking for existing buckets (the table was just emptied).
+    """
+    if not rows:
+        return
+    table = model.__table__
+    day_column, key_column = table.c.day, table.c[key]
+    existing = set()
+    if not fresh:
+        pairs = [(row[0], row[1]) for row in rows]
+        for offset in range(0, len(pairs), 500):
+            existing.update(tuple(pair) for pair in connection.execute(
+                select(day_column, key_column).where(tuple_(day_column, key_column).in_(pairs[offset:offset + 500]))
+            ))
+    updates = [{'b_day': day, 'b_key': value, 'b_units': sign * units, 'b_revenue': sign * revenue_cents}
+               for day, value, units, revenue_cents in rows if (day, value) in existing]
+    inserts = [{'day': day, key: value, 'units': sign * units, 'revenue_cents': sign * revenue_cents}
+               for day, value, units, revenue_cents in rows if (day, value) not in existing]
+    if updates:
+        connection.execute(
+            update(table).where(day_column == bindparam('b_day'), key_column == bindparam('b_key'))
+            .values(units=table.c.units + bindparam('b_units'),
+                    revenue_cents=table.c.revenue_cents + bindparam('b_revenue')),
+            updates,
+        )
+    if inserts:
+        connection.execute(insert(table), inserts)
+
+
+def _fold_items(connection, condition, sign=1, fresh=False, revenue_only=True, tables=(Order, OrderItem)):
+    """Add the order items matching `condition` to both bucket tables; returns how many there were.
+
+    Only items of orders in a revenue status count, unless `revenue_only` is False. `tables` are the
+    order and item models to read (the archive's, from rebuild()).
+    """
+    orders, order_items = tables
+    day, category = _order_day(orders), _category()
+    units, revenue = func.sum(order_items.quantity), func.sum(order_items.quantity * order_items.unit_price_cents)
+    items = select().select_from(order_items).join(orders, order_items.order_id == orders.id).where(condition)
+    if revenue_only:
+        items = items.where(orders.status.notin_(NON_REVENUE_STATUSES))
+    by_book = connection.execute(
+        items.add_columns(day, order_items.book_id, units, revenue, func.count(order_items.id))
+        .group_by(day, order_items.book_id)
+    ).all()
+    by_category = connection.execute(
+        items.join(Book, order_items.book_id == Book.id).add_columns(day, category, units, revenue)
+        .group_by(day, category)
+    ).all()
+    _add_to_buckets(connection, SalesDaily, 'book_id',
+                    [(_as_date(d), book_id, u, r) for d, book_id, u, r, _ in by_book], sign, fresh)
+    _add_to_buckets(connection, CategorySalesDaily, 'category',
+                    [(_as_date(d), c, u, r) for d, c, u, r in by_category], sign, fresh)
+    return sum(row[4] for row in by_book)
+
+
+def refresh():
+    """Fold order items added since the last refresh into the buckets; returns how many were folded.
+
+    Commits when there was anything to fold, so call it before making other changes.
+    """
+    row = db.session.execute(select(StoreStat.value).where(StoreStat.name == WATERMARK)).first()
+    if row is None:
+        return rebuild()
+    watermark = int(row.value)
+    # Leave the last few seconds' orders for the next refresh: on databases where ids can commit out
+    # of order, a transaction still in flight could otherwise end up below the watermark
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['REPORTS_SETTLE_SECONDS'])
+    high = db.session.execute(
+        select(func.max(OrderItem.id)).join(Order, OrderItem.order_id == Order.id)
+        .where(OrderItem.id > watermark, Order.order_date <= cutoff)
+    ).scalar()
+    if high is None:
+        return 0
+    # Claim the range before reading it; a concurrent refresh that got there first makes this match nothing
+    claimed = db.session.execute(
+        update(StoreStat).where(StoreStat.name == WATERMARK, StoreStat.value == watermark).values(value=high)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return 0
+    folded = _fold_items(db.session.connection(), and_(OrderItem.id > watermark, OrderItem.id <= high))
+    db.session.commit()
+    return folded
+
+
+def rebuild():
+    """Recompute the buckets from the whole order history ('flask reports-rebuild')."""
+    db.session.execute(delete(StoreStat).where(StoreStat.name == WATERMARK))
+    db.session.execute(delete(SalesDaily))
+    db.session.execute(delete(CategorySalesDaily))
+    high = db.session.execute(select(func.coalesce(func.max(OrderItem.id), 0))).scalar()
+    db.session.execute(insert(StoreStat), [{'name': WATERMARK, 'value': high}])
+    # Archived orders first (see archive.py), then the recent ones on top
+    folded = _fold_items(db.session.connection(), true(), fresh=True, tables=(ArchivedOrder, ArchivedOrderItem))
+    folded += _fold_items(db.session.connection(), OrderItem.id <= high)
+    db.session.commit()
+    return folded
+
+
+@event.listens_for(Order, 'after_update')
+def _order_status_changed(mapper, connection, target):
+    """An order entering or leaving a revenue status moves its folded items in or out of the buckets."""
+    history = inspect(target).attrs.status.history
+    if not history.has_changes() or not history.deleted:
+        return
+    was, now = history.deleted[0] not in NON_REVENUE_STATUSES, target.status not in NON_REVENUE_STATUSES
+    if was == now:
+        return
+    watermark = connection.execute(select(StoreStat.value).where(StoreStat.name == WATERMARK)).scalar()
+    if not watermark:
+        return  # Nothing folded yet; the next refresh sees the current status
+    # The row already has its new status, so don't filter on it
+    _fold_items(connection, and_(OrderItem.order_id == target.id, OrderItem.id <= watermark),
+                sign=1 if now else -1, revenue_only=False)
+
+
+# --- columnar rollups -------------------------------------------------------------------------
+
+def _dense(n_days, start, rows):
+    """rows: (day, value) -> a list/array of n_days values, zero where there was no row."""
+    if np is not None:
+        values = np.zeros(n_days)
+        if rows:
+            index = np.fromiter(((d - start).days for d, _ in rows), dtype=np.int64, count=len(rows))
+            np.add.at(values, index, np.fromiter((v for _, v in rows), dtype=float, count=len(rows)))
+        return values
+    values = [0.0] * n_days
+    for d, v in rows:
+        values[(d - start).days] += v
+    return values
+
+
+def _moving_average(values, window):
+    if np is not None:
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        counts = np.minimum(np.arange(1, len(values) + 1), window)
+        return (sums[1:] - sums[np.maximum(np.arange(1, len(values) + 1) - window, 0)]) / counts
+    averages, running = [], 0.0
+    for i, value in enumerate(values):
+        running += value
+        if i >= window:
+            running -= values[i - window]
+        averages.append(running / min(i + 1, window))
+    return averages
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _period_starts(start, end, granularity):
+    """Offsets (in days from `start`) where each period begins; weeks start on Mondays."""
+    if granularity == 'day':
+        return list(range((end - start).days + 1))
+    offsets = [0]
+    boundary = start + timedelta(days=7 - start.weekday()) if granularity == 'week' else _next_month(start)
+    while boundary <= end:
+        offsets.append((boundary - start).days)
+        boundary = boundary + timedelta(days=7) if granularity == 'week' else _next_month(boundary)
+    return offsets
+
+
+def _resample(values, offsets):
+    """Sum daily values into the periods beginning at `offsets`."""
+    if np is not None:
+        return np.add.reduceat(values, offsets)
+    bounds = list(offsets) + [len(values)]
+    return [sum(values[bounds[i]:bounds[i + 1]]) for i in range(len(offsets))]
+
+
+def _pivot(start, offsets, rows, labels):
+    """rows: (day, label, value) -> {label: [value per period]}."""
+    row_of = {label: i for i, label in enumerate(labels)}
+    if np is not None:
+        matrix = np.zeros((len(labels), len(offsets)))
+        if rows:
+            days = np.fromiter(((d - start).days for d, _, _ in rows), dtype=np.int64, count=len(rows))
+            periods = np.searchsorted(offsets, days, side='right') - 1
+            categories = np.fromiter((row_of[label] for _, label, _ in rows), dtype=np.int64, count=len(rows))
+            np.add.at(matrix, (categories, periods), np.fromiter((v for _, _, v in rows), dtype=float, count=len(rows)))
+        return {label: [from_cents(round(v)) for v in matrix[i]] for label, i in row_of.items()}
+    matrix = [[0.0] * len(offsets) for _ in labels]
+    for d, label, value in rows:
+        matrix[row_of[label]][bisect_right(offsets, (d - start).days) - 1] += value
+    return {label: [from_cents(round(v)) for v in matrix[i]] for label, i in row_of.items()}
+
+
+# --- reports ----------------------------------------------------------------------------------
+
+def sales_report(start, end, granularity='day', top_n=10):
+    """Everything the reports page shows for the days start..end (inclusive)."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity!r}')
+    refresh()
+    in_range = (CategorySalesDaily.day >= start, CategorySalesDaily.day <= end)
+
+    by_category_day = db.session.execute(
+        select(CategorySalesDaily.day, CategorySalesDaily.category, CategorySalesDaily.units,
+               CategorySalesDaily.revenue_cents).where(*in_range)
+    ).all()
+    categories = db.session.execute(
+        select(CategorySalesDaily.category, func.sum(CategorySalesDaily.units),
+               func.sum(CategorySalesDaily.revenue_cents))
+        .where(*in_range).group_by(CategorySalesDaily.category)
+        .order_by(func.sum(CategorySalesDaily.revenue_cents).desc())
+    ).all()
+    # Orders per day come from the orders themselves (an order spans several buckets), recent and
+    # archived; order_date is indexed in both
+    orders = []
+    for model in (Order, ArchivedOrder):
+        day = _order_day(model)
+        orders += db.session.execute(
+            select(day, func.count(model.id))
+            .where(model.order_date >= datetime.combine(start, time.min),
+                   model.order_date < datetime.combine(end + timedelta(days=1), time.min),
+                   model.status.notin_(NON_REVENUE_STATUSES))
+            .group_by(day)
+        ).all()
+    # Rank on the bucket table alone, then join just the top rows to Book
+    units_sold = func.sum(SalesDaily.units).label('units')
+    top = select(SalesDaily.book_id, units_sold, func.sum(SalesDaily.revenue_cents).label('revenue_cents')) \
+        .where(SalesDaily.day >= start, SalesDaily.day <= end).group_by(SalesDaily.book_id) \
+        .having(units_sold > 0).order_by(units_sold.desc()).limit(top_n).subquery()
+    top_sellers = db.session.execute(
+        select(Book.id, Book.title, Book.stock_quantity, top.c.units, top.c.revenue_cents)
+        .join(top, top.c.book_id == Book.id).order_by(top.c.units.desc())
+    ).all()
+
+    n_days = (end - start).days + 1
+    revenue = _dense(n_days, start, [(d, r) for d, _, _, r in by_category_day])
+    units = _dense(n_days, start, [(d, u) for d, _, u, _ in by_category_day])
+    order_counts = _dense(n_days, start, [(_as_date(d), n) for d, n in orders])
+    average = _moving_average(revenue, MOVING_AVERAGE_DAYS)
+    offsets = _period_starts(start, end, granularity)
+    period_revenue, period_units, period_orders = (_resample(v, offsets) for v in (revenue, units, order_counts))
+    # The moving average is a daily figure: report its value on each period's last day
+    last_days = [offset - 1 for offset in offsets[1:]] + [n_days - 1]
+
+    # Cents are whole numbers, exact in the float arrays too; amounts become Decimal only here
+    total_cents, total_orders = int(round(sum(revenue))), int(sum(order_counts))
+    category_names = [name for name, _, _ in categories]
+    return {
+        'start': start,
+        'end': end,
+        'granularity': granularity,
+        'totals': {
+            'revenue': from_cents(total_cents),
+            'units': int(sum(units)),
+            'orders': total_orders,
+            'average_order_value': from_cents(round(total_cents / total_orders)) if total_orders else from_cents(0),
+        },
+        'series': [
+            {'period': start + timedelta(days=offset), 'revenue': from_cents(round(period_revenue[i])),
+             'units': int(period_units[i]), 'orders': int(period_orders[i]),
+             'revenue_moving_average': from_cents(round(average[last_days[i]]))}
+            for i, offset in enumerate(offsets)
+        ],
+        'categories': [
+            {'category': name, 'units': int(u or 0), 'revenue': from_cents(r or 0),
+             'share': round((r or 0) / total_cents, 3) if total_cents else 0}
+            for name, u, r in categories
+        ],
+        'category_periods': _pivot(start, offsets, [(d, c, r) for d, c, _, r in by_category_day],
+                                   category_names),
+        'top_sellers': [
+            {'id': book_id, 'title': title, 'units': int(u), 'revenue': from_cents(r or 0), 'stock': stock,
+             'sell_through': round(u / (u + max(stock or 0, 0)), 3)}
+            for book_id, title, stock, u, r in top_sellers
+        ],
+    }
+
+
+def init_app(app):
+    app.config.setdefault('REPORTS_SETTLE_SECONDS', 5)
+
+    @app.cli.command('reports-rebuild')
+    def reports_rebuild():
+        """Recompute the daily sales buckets from the full order history."""
+        print(f'Folded {rebuild()} order items.')
@@ -0,0 +1,319 @@
+# app/services/search.py
+# Full-text search over the book catalog.
+#
+# The backend is picked from the database dialect (or SEARCH_BACKEND in config):
+#   - 'sqlite_fts'  : an FTS5 virtual table (book_fts) keyed by Book.id, kept in sync
+#                     by the manager routes through index_book()/remove_book().
+#   - 'postgres'    : a tsvector expression with a GIN index; Postgres maintains the
+#                     index itself, so the sync hooks are no-ops.
+#   - 'like'        : the old four-column ILIKE scan, used when nothing better exists.
+#
+# The index is created by a migration (or `flask search-rebuild`), never by a request: picking
+# the backend only looks for it, and falls back to 'like' for the life of the process if it's
+# missing, so restart the app after creating it.
+import re
+
+from flask import current_app
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+ISBN_RE = re.compile(r'^(?:\d{9}[\dXx]|\d{13})$')
+
+# Columns that go into the index, in FTS column order
+INDEXED_COLUMNS = ('title', 'author', 'isbn', 'category')
+
+
+def normalize_isbn(value):
+    """Strip hyphens/spaces; return the bare ISBN or None if it does not look like one."""
+    if not value:
+        return None
+    candidate = re.sub(r'[\s-]', '', value)
+    return candidate.upper() if ISBN_RE.match(candidate) else None
+
+
+def tokenize(query_text):
+    return TOKEN_RE.findall(query_text.lower())
+
+
+class SearchBackend:
+    name = 'base'
+
+    def setup(self):
+        """Create whatever index structures the backend needs and commit. Safe to call repeatedly."""
+
+    def available(self):
+        """Whether the index structures exist; only reads, so it's safe inside a request."""
+        return True
+
+    def index_book(self, book):
+        """Add or refresh a book in the index. Must run inside the caller's transaction."""
+
+    def remove_book(self, book_id):
+        """Drop a book from the index. Must run inside the caller's transaction."""
+
+    def reindex_books(self, book_ids):
+        """Add or refresh many books by id, e.g. after bulk writes. Runs in the caller's transaction."""
+
+    def rebuild(self, batch_size=5000):
+        """Repopulate the index from the Book table."""
+
+    def ranked(self, query_text):
+        """Return (unordered Book query, sort keys) for the matches, best match first.
+
+        The sort keys always end with Book.id so the result can be keyset-paginated.
+        """
+        raise NotImplementedError
+
+    def search(self, query_text):
+        """Return a Book query ordered by relevance."""
+        query, sort_keys = self.ranked(query_text)
+        return query.order_by(*sort_keys)
+
+
+class LikeSearchBackend(SearchBackend):
+    name = 'like'
+
+    def ranked(self, query_text):
+        like_query = f"%{query_text}%"
+        query = Book.query.filter(
+            db.or_(
+                Book.title.ilike(like_query),
+                Book.author.ilike(like_query),
+                Book.isbn.ilike(like_query),
+                Book.category.ilike(like_query)
+            )
+        )
+        return query, (Book.title.asc(), Book.id.asc())
+
+
+class SQLiteFTSBackend(SearchBackend):
+    name = 'sqlite_fts'
+    table = 'book_fts'
+    # bm25 weights per column: a title hit matters most, an ISBN substring least
+    weights = (10.0, 5.0, 1.0, 2.0)
+
+    def available(self):
+        return db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': self.table}
+        ).first() is not None
+
+    def setup(self):
+        if self.available():
+            return
+        # Same statement as the 5e0d3b7a9c14 migration
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            f"{', '.join(INDEXED_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        db.session.commit()
+
+    def _row(self, book):
+        return {'rowid': book.id, **{col: getattr(book, col) or '' for col in INDEXED_COLUMNS}}
+
+    @property
+    def _insert(self):
+        return text(f"INSERT INTO {self.table} (rowid, {', '.join(INDEXED_COLUMNS)}) "
+                    f"VALUES (:rowid, {', '.join(':' + col for col in INDEXED_COLUMNS)})")
+
+    def index_book(self, book):
+        self.remove_book(book.id)
+        db.session.execute(self._insert, self._row(book))
+
+    def remove_book(self, book_id):
+        db.session.execute(text(f"DELETE FROM {self.table} WHERE rowid = :rowid"), {'rowid': book_id})
+
+    def reindex_books(self, book_ids):
+        if not book_ids:
+            return
+        columns = [Book.id] + [getattr(Book, col) for col in INDEXED_COLUMNS]
+        rows = db.session.execute(db.select(*columns).where(Book.id.in_(book_ids))).all()
+        db.session.execute(text(f"DELETE FROM {self.table} WHERE rowid = :rowid"),
+                           [{'rowid': book_id} for book_id in book_ids])
+        if rows:
+            db.session.execute(self._insert, [
+                {'rowid': row[0], **{col: value or '' for col, value in zip(INDEXED_COLUMNS, row[1:])}}
+                for row in rows
+            ])
+
+    def rebuild(self, batch_size=5000):
+        db.session.execute(text(f"DELETE FROM {self.table}"))
+        insert = self._insert
+        columns = [Book.id] + [getattr(Book, col) for col in INDEXED_COLUMNS]
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(*columns).where(Book.id > last_id).order_by(Book.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(insert, [
+                {'rowid': row[0], **{col: value or '' for col, value in zip(INDEXED_COLUMNS, row[1:])}}
+                for row in rows
+            ])
+            last_id = rows[-1][0]
+        db.session.execute(text(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')"))
+        db.session.commit()
+
+    @staticmethod
+    def match_expression(query_text):
+        # Quote every token so user input can't inject FTS syntax, and make each one a prefix match
+        return ' '.join(f'"{token}"*' for token in tokenize(query_text))
+
+    def ranked(self, query_text):
+        expression = self.match_expression(query_text)
+        if not expression:
+            return Book.query.filter(db.false()), (Book.id.asc(),)
+        weights = ', '.join(str(w) for w in self.weights)
+        ranked = text(
+            f"SELECT rowid AS book_id, bm25({self.table}, {weights}) AS rank "
+            f"FROM {self.table} WHERE {self.table} MATCH :expression"
+        ).bindparams(expression=expression).columns(book_id=Integer, rank=Float).subquery('ranked')
+        # bm25() is lower-is-better
+        return Book.query.join(ranked, ranked.c.book_id == Book.id), (ranked.c.rank.asc(), Book.id.asc())
+
+
+class PostgresSearchBackend(SearchBackend):
+    name = 'postgres'
+    index_name = 'ix_book_search_tsv'
+    config = 'simple'
+
+    def _document(self):
+        # Weighted document; must match the GIN index expression exactly for the planner to use it
+        return (
+            f"setweight(to_tsvector('{self.config}', coalesce(book.title, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(book.author, '')), 'B') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(book.category, '')), 'C') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(book.isbn, '')), 'D')"
+        )
+
+    def available(self):
+        return db.session.execute(text("SELECT to_regclass(:name) IS NOT NULL"),
+                                  {'name': self.index_name}).scalar()
+
+    def setup(self):
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.index_name} ON book USING GIN (({self._document()}))"
+        ))
+        db.session.commit()
+
+    def rebuild(self, batch_size=5000):
+        db.session.execute(text(f"REINDEX INDEX {self.index_name}"))
+        db.session.commit()
+
+    @staticmethod
+    def tsquery(query_text):
+        return ' & '.join(f'{token}:*' for token in tokenize(query_text))
+
+    def ranked(self, query_text):
+        tsquery = self.tsquery(query_text)
+        if not tsquery:
+            return Book.query.filter(db.false()), (Book.id.asc(),)
+        document = db.literal_column(f'({self._document()})')
+        ts_query = db.func.to_tsquery(self.config, tsquery)
+        query = Book.query.filter(document.op('@@')(ts_query))
+        return query, (db.func.ts_rank(document, ts_query).desc(), Book.id.asc())
+
+
+def include_in_migrations(name, type_, parent_names):
+    """Alembic include_name hook: the search index (book_fts and its FTS5 shadow tables, the tsvector
+    index) isn't in the models, so autogenerate must not offer to drop it."""
+    if type_ == 'table':
+        return not name.startswith(SQLiteFTSBackend.table)
+    if type_ == 'index':
+        return name != PostgresSearchBackend.index_name
+    return True
+
+
+BACKENDS = {
+    'like': LikeSearchBackend,
+    'sqlite_fts': SQLiteFTSBackend,
+    'postgres': PostgresSearchBackend,
+}
+
+
+class SearchIndex:
+    """Flask extension wrapper choosing a backend per app and exposing the catalog search API."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.extensions['search'] = {'backend': None}
+
+        @app.cli.command('search-rebuild')
+        def search_rebuild():
+            """Create the full-text book index if it's missing, and rebuild it."""
+            backend = self.setup()
+            backend.rebuild()
+            print(f'Search index rebuilt using the {backend.name} backend.')
+
+    def _configured_backend(self):
+        name = current_app.config['SEARCH_BACKEND']
+        if name == 'auto':
+            dialect = db.engine.dialect.name
+            name = {'sqlite': 'sqlite_fts', 'postgresql': 'postgres'}.get(dialect, 'like')
+        return BACKENDS[name]()
+
+    def _select_backend(self):
+        backend = self._configured_backend()
+        if not backend.available():
+            current_app.logger.warning('Search index for %s missing (run `flask db upgrade` or `flask search-rebuild`); '
+                                       'falling back to ILIKE.', backend.name)
+            backend = LikeSearchBackend()
+        return backend
+
+    def setup(self):
+        """Create the index for this database and use it; commits. For `flask search-rebuild` and for
+        scripts that build the schema with db.create_all(), never for requests."""
+        backend = self._configured_backend()
+        try:
+            backend.setup()
+        except (OperationalError, ProgrammingError) as e:
+            # e.g. SQLite built without FTS5, or no rights to create the index
+            db.session.rollback()
+            current_app.logger.warning('Search backend %s unavailable (%s); falling back to ILIKE.', backend.name, e)
+            backend = LikeSearchBackend()
+        current_app.extensions['search']['backend'] = backend
+        return backend
+
+    @property
+    def backend(self):
+        state = current_app.extensions['search']
+        if state['backend'] is None:
+            state['backend'] = self._select_backend()
+        return state['backend']
+
+    def index_book(self, book):
+        self.backend.index_book(book)
+
+    def remove_book(self, book_id):
+        self.backend.remove_book(book_id)
+
+    def reindex_books(self, book_ids):
+        self.backend.reindex_books(book_ids)
+
+    def ranked(self, query_text):
+        """(Book query, sort keys) for a search box string: exact ISBN first, then full-text matches."""
+        query_text = query_text.strip()
+        isbn = normalize_isbn(query_text)
+        if isbn:
+            # Exact ISBN lookups go straight to the unique index on Book.isbn
+            exact = Book.query.filter(Book.isbn.in_({isbn, query_text}))
+            if exact.first() is not None:
+                return exact, (Book.title.asc(), Book.id.asc())
+        return self.backend.ranked(query_text)
+
+    def search(self, query_text):
+        """Book query for a search box string, best match first."""
+        query, sort_keys = self.ranked(query_text)
+        return query.order_by(*sort_keys)
+
+
+search_index = SearchIndex()
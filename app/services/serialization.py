@@ -0,0 +1,40 @@
+# app/services/serialization.py
+# JSON encoding for the API (app/routes/api_routes.py).
+#
+# Uses orjson when it is installed: it encodes dates and datetimes natively and is several times
+# faster than the json module, which is the fallback (with the same compact output). Rows are
+# turned into dicts straight from column queries, so no ORM objects are built for a response.
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """`payload` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+def rows_as_dicts(rows, fields):
+    """Tuples from a column query -> dicts keyed by `fields` (in the same order)."""
+    return [dict(zip(fields, row)) for row in rows]
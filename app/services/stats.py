@@ -0,0 +1,294 @@
+# app/services/stats.py
+# Materialized statistics for the manager dashboard.
+#
+# Counters live in StoreStat rows and per-book sales in BookSales. They are adjusted inside the
+# same transaction as the change that affects them, by SQLAlchemy events:
+#   - mapper events on User / Book / Order / OrderItem for ordinary ORM flushes
+#     (signup, add/edit/delete book, update_order_status),
+#   - a do_orm_execute hook for the bulk statements checkout issues (bulk OrderItem insert,
+#     conditional stock UPDATE tagged with the `stock_deltas` execution option).
+# Each adjustment is an in-place `value = value + delta` UPDATE, so concurrent writers never
+# lose increments. `flask stats-reconcile` (run it from cron) recomputes everything from the
+# base tables and corrects any drift, e.g. from rows changed outside the app. Revenue is kept in
+# integer cents, like the prices it's summed from.
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, func, insert, select, update, inspect
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import (
+    ArchivedOrder, ArchivedOrderItem, Book, BookSales, Order, OrderItem, StoreStat, User,
+)
+from bookstore_flask_project.app.services.money import from_cents
+
+BOOKS = 'books'
+USERS = 'users'
+REVENUE = 'revenue_cents'
+LOW_STOCK = 'books.low_stock'
+# Bumped when a book is added, edited or deleted; its updated_at is the catalog's Last-Modified.
+# Stock changes leave it alone, or every sale would invalidate the catalog's caches and all
+# checkouts would queue on this one row (see listing_version() for pages that show stock)
+CATALOG_VERSION = 'catalog.version'
+# Book columns that aren't catalog content
+NON_CONTENT_COLUMNS = ('stock_quantity', 'updated_at')
+# Last OrderItem id folded into the sales report buckets (see reports.py)
+REPORTS_WATERMARK = 'reports.watermark'
+# Last OrderItem id folded into the co-purchase counts, and a version bumped whenever the
+# recommendations change (see recommendations.py)
+RECOMMENDATIONS_WATERMARK = 'recommendations.watermark'
+RECOMMENDATIONS_VERSION = 'recommendations.version'
+ORDER_STATUSES = ('pending_payment', 'processing', 'shipped', 'delivered', 'cancelled')
+# Orders in these states don't count towards revenue or sales
+NON_REVENUE_STATUSES = ('cancelled',)
+
+
+def order_status_key(status):
+    return f'orders.{status}'
+
+
+def _low_stock_threshold():
+    try:
+        return current_app.config['LOW_STOCK_THRESHOLD']
+    except RuntimeError:  # Outside an app context (e.g. a bare script)
+        return 5
+
+
+def _bump(connection, name, delta):
+    if not delta:
+        return
+    result = connection.execute(
+        update(StoreStat.__table__).where(StoreStat.__table__.c.name == name)
+        .values(value=StoreStat.__table__.c.value + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(StoreStat.__table__).values(name=name, value=delta))
+
+
+def _record_sales(connection, lines, sign=1):
+    """lines: iterable of (book_id, quantity, unit price in cents)."""
+    table = BookSales.__table__
+    for book_id, quantity, unit_price_cents in lines:
+        units, revenue_cents = sign * quantity, sign * quantity * unit_price_cents
+        result = connection.execute(
+            update(table).where(table.c.book_id == book_id)
+            .values(units_sold=table.c.units_sold + units, revenue_cents=table.c.revenue_cents + revenue_cents)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(book_id=book_id, units_sold=units, revenue_cents=revenue_cents))
+
+
+def _is_low(stock):
+    return stock is not None and stock <= _low_stock_threshold()
+
+
+# --- ORM flush events -------------------------------------------------------------------------
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    _bump(connection, USERS, 1)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _bump(connection, USERS, -1)
+
+
+@event.listens_for(Book, 'after_insert')
+def _book_inserted(mapper, connection, target):
+    _bump(connection, BOOKS, 1)
+    _bump(connection, CATALOG_VERSION, 1)
+    if _is_low(target.stock_quantity):
+        _bump(connection, LOW_STOCK, 1)
+
+
+@event.listens_for(Book, 'after_update')
+def _book_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs
+           if attr.key not in NON_CONTENT_COLUMNS):
+        _bump(connection, CATALOG_VERSION, 1)
+    history = state.attrs.stock_quantity.history
+    if not history.has_changes() or not history.deleted:
+        return
+    was_low, is_low = _is_low(history.deleted[0]), _is_low(target.stock_quantity)
+    if was_low != is_low:
+        _bump(connection, LOW_STOCK, 1 if is_low else -1)
+
+
+@event.listens_for(Book, 'before_delete')
+def _book_deleted(mapper, connection, target):
+    _bump(connection, BOOKS, -1)
+    _bump(connection, CATALOG_VERSION, 1)
+    if _is_low(target.stock_quantity):
+        _bump(connection, LOW_STOCK, -1)
+    connection.execute(BookSales.__table__.delete().where(BookSales.__table__.c.book_id == target.id))
+
+
+def _counts_as_revenue(status):
+    return status not in NON_REVENUE_STATUSES
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, target):
+    _bump(connection, order_status_key(target.status), 1)
+    if _counts_as_revenue(target.status):
+        _bump(connection, REVENUE, target.total_cents or 0)
+
+
+@event.listens_for(Order, 'after_update')
+def _order_updated(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if not history.has_changes() or not history.deleted:
+        return
+    old, new = history.deleted[0], target.status
+    _bump(connection, order_status_key(old), -1)
+    _bump(connection, order_status_key(new), 1)
+    if _counts_as_revenue(old) != _counts_as_revenue(new):
+        sign = 1 if _counts_as_revenue(new) else -1
+        _bump(connection, REVENUE, sign * (target.total_cents or 0))
+        items = connection.execute(
+            select(OrderItem.book_id, OrderItem.quantity, OrderItem.unit_price_cents)
+            .where(OrderItem.order_id == target.id)
+        ).all()
+        _record_sales(connection, items, sign)
+
+
+@event.listens_for(Order, 'after_delete')
+def _order_deleted(mapper, connection, target):
+    _bump(connection, order_status_key(target.status), -1)
+    if _counts_as_revenue(target.status):
+        _bump(connection, REVENUE, -(target.total_cents or 0))
+
+
+@event.listens_for(OrderItem, 'after_insert')
+def _order_item_inserted(mapper, connection, target):
+    _record_sales(connection, [(target.book_id, target.quantity, target.unit_price_cents)])
+
+
+# --- bulk statements --------------------------------------------------------------------------
+
+def _bulk_statement_hook(orm_execute_state):
+    """Keep stats in step with the bulk INSERT/UPDATE statements checkout and restocking use (no mapper events)."""
+    stock_deltas = orm_execute_state.execution_options.get('stock_deltas')
+    if orm_execute_state.is_update and stock_deltas:
+        result = orm_execute_state.invoke_statement()
+        # stock_deltas holds how much each book's stock went *down* (negative for restocks), so the
+        # old level is new + delta; count books crossing into low stock minus those leaving it
+        new_stock = orm_execute_state.session.execute(
+            select(Book.id, Book.stock_quantity).where(Book.id.in_(stock_deltas))
+        ).all()
+        crossed = sum(int(_is_low(stock)) - int(_is_low(stock + stock_deltas[book_id]))
+                      for book_id, stock in new_stock)
+        connection = orm_execute_state.session.connection()
+        _bump(connection, LOW_STOCK, crossed)
+        return result
+
+    mapper = orm_execute_state.bind_mapper
+    if orm_execute_state.is_insert and mapper is not None and mapper.class_ is OrderItem:
+        params = orm_execute_state.parameters
+        rows = params if isinstance(params, list) else [params] if params else []
+        _record_sales(orm_execute_state.session.connection(),
+                      [(row['book_id'], row['quantity'], row['unit_price_cents']) for row in rows])
+    return None
+
+
+# --- reads ------------------------------------------------------------------------------------
+
+def reconcile():
+    """Recompute every counter from the base tables (the periodic drift-correction job)."""
+    values = {
+        BOOKS: db.session.query(func.count(Book.id)).scalar(),
+        USERS: db.session.query(func.count(User.id)).scalar(),
+        LOW_STOCK: db.session.query(func.count(Book.id))
+            .filter(Book.stock_quantity <= _low_stock_threshold()).scalar(),
+        REVENUE: 0,
+    }
+    values.update({order_status_key(status): 0 for status in ORDER_STATUSES})
+    sales = {}
+    # Archived orders (see archive.py) still count
+    for orders, items in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        values[REVENUE] += db.session.query(func.coalesce(func.sum(orders.total_cents), 0)) \
+            .filter(orders.status.notin_(NON_REVENUE_STATUSES)).scalar()
+        for status, count in db.session.query(orders.status, func.count(orders.id)).group_by(orders.status):
+            values[order_status_key(status)] = values.get(order_status_key(status), 0) + count
+        by_book = db.session.query(
+            items.book_id,
+            func.sum(items.quantity),
+            func.sum(items.quantity * items.unit_price_cents)
+        ).join(orders, items.order_id == orders.id) \
+            .filter(orders.status.notin_(NON_REVENUE_STATUSES)) \
+            .group_by(items.book_id)
+        for book_id, units, revenue_cents in by_book:
+            units_before, revenue_before = sales.get(book_id, (0, 0))
+            sales[book_id] = (units_before + units, revenue_before + revenue_cents)
+
+    # The versions and watermarks aren't derivable from the base tables; keep them (versions only
+    # ever have to move forward, and each watermark goes with the table it was folded into)
+    db.session.execute(StoreStat.__table__.delete().where(StoreStat.__table__.c.name.notin_(
+        (CATALOG_VERSION, REPORTS_WATERMARK, RECOMMENDATIONS_WATERMARK, RECOMMENDATIONS_VERSION))))
+    db.session.execute(insert(StoreStat.__table__), [{'name': k, 'value': v} for k, v in values.items()])
+
+    db.session.execute(BookSales.__table__.delete())
+    if sales:
+        db.session.execute(insert(BookSales.__table__), [
+            {'book_id': book_id, 'units_sold': units, 'revenue_cents': revenue_cents}
+            for book_id, (units, revenue_cents) in sales.items()
+        ])
+    db.session.commit()
+    return values
+
+
+def snapshot(top_n=5):
+    """Dashboard figures: a handful of primary-key rows plus an indexed top-N, independent of table size."""
+    counters = dict(db.session.query(StoreStat.name, StoreStat.value).all())
+    if not counters:
+        counters = reconcile()  # First read on a fresh database
+    top_sellers = db.session.query(Book.id, Book.title, BookSales.units_sold, BookSales.revenue_cents) \
+        .join(Book, BookSales.book_id == Book.id) \
+        .filter(BookSales.units_sold > 0) \
+        .order_by(BookSales.units_sold.desc()).limit(top_n).all()
+    return {
+        'total_books': int(counters.get(BOOKS, 0)),
+        'total_users': int(counters.get(USERS, 0)),
+        'pending_orders': int(counters.get(order_status_key('pending_payment'), 0)),
+        'low_stock_books': int(counters.get(LOW_STOCK, 0)),
+        'revenue': from_cents(counters.get(REVENUE, 0)),
+        'top_sellers': top_sellers,
+    }
+
+
+def bump_catalog_version():
+    """For bulk catalog changes made outside the ORM events (e.g. the catalog import)."""
+    _bump(db.session.connection(), CATALOG_VERSION, 1)
+    db.session.commit()
+
+
+def catalog_version():
+    """(version, last_modified) of the catalog's content, stock aside: one primary-key lookup."""
+    row = db.session.query(StoreStat.value, StoreStat.updated_at).filter(StoreStat.name == CATALOG_VERSION).first()
+    return (int(row.value), row.updated_at) if row else (0, None)
+
+
+def listing_version():
+    """(version, last_modified) for listings, which show stock: the catalog version plus the current
+    CATALOG_STOCK_TTL window, so the stock on a cached listing is at most that many seconds old."""
+    version, changed = catalog_version()
+    ttl = current_app.config['CATALOG_STOCK_TTL']
+    window = int(time.time() // ttl)
+    window_start = datetime.utcfromtimestamp(window * ttl)
+    return f'{version}.{window}', max(changed, window_start) if changed else window_start
+
+
+def init_app(app):
+    app.config.setdefault('LOW_STOCK_THRESHOLD', 5)
+    app.config.setdefault('CATALOG_STOCK_TTL', 60)
+    if not event.contains(db.session, 'do_orm_execute', _bulk_statement_hook):
+        event.listen(db.session, 'do_orm_execute', _bulk_statement_hook)
+
+    @app.cli.command('stats-reconcile')
+    def stats_reconcile():
+        """Recompute dashboard statistics from the base tables."""
+        values = reconcile()
+        print(f'Reconciled {len(values)} counters.')
@@ -0,0 +1,107 @@
+# app/services/totals.py
+# Cart and order totals, in integer cents.
+#
+# A cart's totals are one aggregate query over CartItem joined to Book (or, for lines already
+# loaded, an integer sum with no query at all); nothing loops over lazily loaded books. An
+# order's totals are computed once, when it's placed, and stored on the Order row
+# (subtotal_cents, total_cents, line_count, item_count), so order pages and reports never
+# re-sum line items. `flask orders-retotal` recomputes the stored totals from OrderItem and
+# reports the orders whose totals had drifted (e.g. items edited outside the app).
+from collections import namedtuple
+
+from sqlalchemy import func, select, update
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, Order, OrderItem
+from bookstore_flask_project.app.services.money import from_cents
+
+
+class Totals(namedtuple('Totals', 'subtotal_cents line_count item_count')):
+    """Sums for a cart or an order. Shipping and tax aren't charged yet, so total == subtotal."""
+
+    @property
+    def total_cents(self):
+        return self.subtotal_cents
+
+    @property
+    def subtotal(self):
+        return from_cents(self.subtotal_cents)
+
+    @property
+    def total(self):
+        return from_cents(self.total_cents)
+
+    def order_columns(self):
+        """Keyword arguments for Order(...)."""
+        return {'subtotal_cents': self.subtotal_cents, 'total_cents': self.total_cents,
+                'line_count': self.line_count, 'item_count': self.item_count}
+
+
+EMPTY = Totals(0, 0, 0)
+
+
+def of_lines(lines):
+    """Totals of already loaded lines: anything with `quantity` and `price_cents` (or a `book` that has it)."""
+    subtotal = items = count = 0
+    for line in lines:
+        price_cents = line.price_cents if hasattr(line, 'price_cents') else line.book.price_cents
+        subtotal += price_cents * line.quantity
+        items += line.quantity
+        count += 1
+    return Totals(subtotal, count, items)
+
+
+def for_cart(user_id):
+    """Totals of the user's CartItem rows: one aggregate query."""
+    row = db.session.execute(
+        select(func.coalesce(func.sum(CartItem.quantity * Book.price_cents), 0), func.count(CartItem.id),
+               func.coalesce(func.sum(CartItem.quantity), 0))
+        .join(Book, CartItem.book_id == Book.id)
+        .where(CartItem.user_id == user_id)
+    ).one()
+    return Totals(int(row[0]), int(row[1]), int(row[2]))
+
+
+def _item_sums():
+    """Correlated subqueries over an order's items, for UPDATE ... SET on Order."""
+    of_order = OrderItem.order_id == Order.id
+
+    def scalar(expression):
+        return select(func.coalesce(expression, 0)).where(of_order).correlate(Order).scalar_subquery()
+
+    return {
+        'subtotal_cents': scalar(func.sum(OrderItem.quantity * OrderItem.unit_price_cents)),
+        'line_count': scalar(func.count(OrderItem.id)),
+        'item_count': scalar(func.sum(OrderItem.quantity)),
+    }
+
+
+def retotal_orders(order_ids=None):
+    """Recompute stored order totals from their items (all orders, or `order_ids`); commits.
+
+    Returns the ids of orders whose stored totals were wrong.
+    """
+    sums = _item_sums()
+    drifted = select(Order.id).where(
+        (Order.subtotal_cents != sums['subtotal_cents']) | (Order.total_cents != sums['subtotal_cents'])
+        | (Order.line_count != sums['line_count']) | (Order.item_count != sums['item_count'])
+    )
+    if order_ids is not None:
+        drifted = drifted.where(Order.id.in_(order_ids))
+    ids = db.session.execute(drifted).scalars().all()
+    if ids:
+        db.session.execute(
+            update(Order).where(Order.id.in_(ids))
+            .values(**sums, total_cents=sums['subtotal_cents'])
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return ids
+
+
+def init_app(app):
+    @app.cli.command('orders-retotal')
+    def orders_retotal():
+        """Recompute stored order totals from their line items."""
+        ids = retotal_orders()
+        print(f'Corrected the totals of {len(ids)} orders.')
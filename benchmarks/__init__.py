@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Standalone benchmark scripts, run as modules, e.g.:
+#   python -m bookstore_flask_project.benchmarks.bench_search --sizes 10000 100000
@@ -0,0 +1,55 @@
+# benchmarks/bench_api.py
+# A page of books as JSON: ORM objects through the json module (what a naive endpoint would do)
+# versus the API's column query + fast encoder, then whole API requests and the response size
+# with each compression the client can ask for.
+import argparse
+import json
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services import compression, serialization
+from bookstore_flask_project.app.routes.api_routes import BOOK_FIELDS, DEFAULT_BOOK_FIELDS
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, timed, summarize
+
+
+def orm_json(limit):
+    db.session.expunge_all()  # Each request starts with an empty session
+    books = Book.query.order_by(Book.title, Book.id).limit(limit).all()
+    return json.dumps({'data': [{field: getattr(book, field) for field in DEFAULT_BOOK_FIELDS} for book in books]})
+
+
+def columns_fast(limit):
+    rows = db.session.query(*[BOOK_FIELDS[field] for field in DEFAULT_BOOK_FIELDS]) \
+        .order_by(Book.title, Book.id).limit(limit).all()
+    return serialization.dumps({'data': serialization.rows_as_dicts(rows, DEFAULT_BOOK_FIELDS)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON API serialization and compression')
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed_books(args.books)
+    client = app.test_client()
+    url = f'/api/v1/books?limit={args.limit}'
+
+    results = {'books_per_page': args.limit, 'orjson': serialization.orjson is not None,
+               'brotli': compression.brotli is not None}
+    results['orm_objects_json'] = summarize(timed(lambda: orm_json(args.limit), args.repeat))
+    results['columns_fast_encoder'] = summarize(timed(lambda: columns_fast(args.limit), args.repeat))
+    results['api_identity'] = summarize(timed(lambda: client.get(url, headers={'Accept-Encoding': 'identity'}),
+                                              args.repeat))
+    results['api_gzip'] = summarize(timed(lambda: client.get(url, headers={'Accept-Encoding': 'gzip'}), args.repeat))
+    sizes = {}
+    for encoding in ('identity', 'gzip', 'br'):
+        response = client.get(url, headers={'Accept-Encoding': encoding})
+        sizes[response.headers.get('Content-Encoding', 'identity')] = len(response.data)
+    results['bytes'] = sizes
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/bench_archive.py
+# The order queries that read the hot tables, before and after `flask orders-archive` moves the old
+# delivered/cancelled orders out: the manager's order list (first page, and its COUNT(*) total), a
+# customer's order history, the pending-payment count and the per-status counts. Also the archival
+# run itself: how long it takes, and the longest single batch (how long it holds the write lock).
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, Order, OrderItem, User
+from bookstore_flask_project.app.services import archive
+from bookstore_flask_project.app.services.pagination import keyset_paginate, total_cache
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, summarize, timed
+
+
+def seed_orders(rng, count, days, book_ids, user_ids, batch_size=50000):
+    """`count` orders over the last `days` days, oldest first; all but the last month's are over."""
+    now = datetime.utcnow()
+    for offset in range(0, count, batch_size):
+        orders, items = [], []
+        for order_id in range(offset + 1, min(offset + batch_size, count) + 1):
+            placed = now - timedelta(seconds=(count - order_id) * days * 86400 // count + 60)
+            if now - placed > timedelta(days=30):
+                status = 'cancelled' if rng.random() < 0.05 else 'delivered'
+            else:
+                status = rng.choice(('pending_payment', 'processing', 'shipped', 'delivered'))
+            orders.append({'id': order_id, 'user_id': rng.choice(user_ids), 'status': status, 'order_date': placed,
+                           'total_cents': 0})
+            for book_id in rng.sample(book_ids, rng.randint(1, 4)):
+                items.append({'order_id': order_id, 'book_id': book_id, 'quantity': 1, 'unit_price_cents': 999})
+        db.session.execute(Order.__table__.insert(), orders)
+        db.session.execute(OrderItem.__table__.insert(), items)
+        db.session.commit()
+
+
+def hot_queries(user_id, repeat):
+    def manager_page():
+        keyset_paginate(Order.with_customer(), (Order.order_date.desc(), Order.id.desc()), per_page=10)
+
+    def manager_total():
+        total_cache.clear()
+        keyset_paginate(Order.with_customer(), (Order.order_date.desc(), Order.id.desc()), per_page=10,
+                        with_total=True, total_cache_key='manager.orders')
+
+    def customer_history():
+        archive.customer_history(user_id, per_page=10)
+
+    def pending_count():
+        db.session.query(func.count(Order.id)).filter(Order.status == 'pending_payment').scalar()
+
+    def status_counts():
+        db.session.query(Order.status, func.count(Order.id)).group_by(Order.status).all()
+
+    results = {}
+    for name, query in (('manager_page', manager_page), ('manager_total', manager_total),
+                        ('customer_history', customer_history), ('pending_count', pending_count),
+                        ('status_counts', status_counts)):
+        def request():
+            db.session.remove()
+            query()
+        results[name] = summarize(timed(request, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot order-table queries before and after archiving old orders')
+    parser.add_argument('--orders', type=int, default=500000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--archive-after-days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    make_app(JOBS_WORKERS=0)
+    rng = seed_books(2000)
+    db.session.execute(User.__table__.insert(), [
+        {'id': user_id, 'username': f'customer{user_id}', 'email': f'customer{user_id}@example.com',
+         'role': 'customer'} for user_id in range(1, args.customers + 1)])
+    db.session.commit()
+    book_ids = [book_id for book_id, in db.session.query(Book.id)]
+    seed_orders(rng, args.orders, args.days, book_ids, list(range(1, args.customers + 1)))
+    user_id = rng.randint(1, args.customers)
+
+    results = {'before': hot_queries(user_id, args.repeat)}
+
+    batches, move = [], archive._move
+
+    def timed_move(connection, order_ids):
+        started = time.perf_counter()
+        move(connection, order_ids)
+        batches.append((time.perf_counter() - started) * 1000)
+
+    archive._move = timed_move
+    started = time.perf_counter()
+    moved = archive.archive_orders(args.archive_after_days)
+    results['archive'] = {'orders': moved, 'hot_orders_left': db.session.query(func.count(Order.id)).scalar(),
+                          'seconds': round(time.perf_counter() - started, 2), 'batches': len(batches),
+                          'longest_batch_ms': round(max(batches, default=0), 1)}
+    archive._move = move
+
+    results['after'] = hot_queries(user_id, args.repeat)
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_cart.py
+# Cart rendering and totals for a large cart (default 150 lines):
+#   - the old way: CartItem rows, a lazy load per book and a float sum in Python,
+#   - totals.for_cart(): one aggregate query over CartItem joined to Book, in integer cents,
+#   - the cart page itself through the test client (cart store + one Book query, integer sum).
+# Also reports the error of the float sum against the exact total (binary floats can't hold 0.10),
+# and what cart changes cost with stock holds on and off (INVENTORY_HOLD_MINUTES=0): raising a
+# line's quantity, lowering it, removing the line and adding it back; SQL statements and commits
+# per call included.
+import argparse
+import json
+import random
+import time
+from decimal import Decimal
+
+from jinja2 import ChoiceLoader, DictLoader
+from sqlalchemy import event
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, User
+from bookstore_flask_project.app.services import cart as cart_service
+from bookstore_flask_project.app.services import totals
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, timed, summarize, count_queries, login
+
+# The real cart template isn't in the tree; this one renders what it would: a row per line with its subtotal
+CART_TEMPLATE = (
+    '{% for item in cart_items %}<tr><td>{{ item.book.title }}</td><td>{{ item.book.price_cents|cents }}</td>'
+    '<td>{{ item.quantity }}</td><td>{{ item.subtotal_cents|cents }}</td></tr>{% endfor %}'
+    '<p>{{ totals.item_count }} items: {{ totals.total_cents|cents }}</p>'
+)
+
+
+def float_loop_total(user_id):
+    """What view_cart used to do: lazily load each line's book and sum float prices."""
+    db.session.expunge_all()  # Don't let the identity map hide the lazy loads
+    return sum(float(item.book.price) * item.quantity for item in CartItem.query.filter_by(user_id=user_id))
+
+
+def mutations(user_id, book_ids, repeat):
+    """Latency, statements and commits per cart change, cycling through the cart's lines."""
+    steps = {
+        'raise': lambda book, quantity: cart_service.add(user_id, book, 1),
+        'lower': lambda book, quantity: cart_service.set_quantity(user_id, book, quantity),
+        'remove': lambda book, quantity: cart_service.remove(user_id, book.id),
+        'add_back': lambda book, quantity: cart_service.add(user_id, book, quantity),
+    }
+    samples = {name: [] for name in steps}
+    counts = {name: [0, 0] for name in steps}  # Statements, commits
+
+    def count(name, kind):
+        def listener(*args):
+            counts[name][kind] += 1
+        return listener
+
+    for i in range(repeat):
+        book_id = book_ids[i % len(book_ids)]
+        quantity = cart_service.get_items(user_id)[book_id]
+        for name, step in steps.items():
+            db.session.remove()
+            statements, commits = count(name, 0), count(name, 1)
+            event.listen(db.engine, 'before_cursor_execute', statements)
+            event.listen(db.engine, 'commit', commits)
+            started = time.perf_counter()
+            step(db.session.get(Book, book_id), quantity)  # As the routes do: load the book, change the cart
+            samples[name].append((time.perf_counter() - started) * 1000)
+            event.remove(db.engine, 'before_cursor_execute', statements)
+            event.remove(db.engine, 'commit', commits)
+    return {name: {**summarize(samples[name]), 'statements': round(counts[name][0] / repeat, 2),
+                   'commits': round(counts[name][1] / repeat, 2)} for name in steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cart rendering and totals with many line items')
+    parser.add_argument('--lines', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = make_app(CART_STORE='memory', JOBS_WORKERS=0)
+    app.jinja_loader = ChoiceLoader([DictLoader({'customer/cart.html': CART_TEMPLATE}), app.jinja_loader])
+    seed_books(args.lines)
+    rng = random.Random(3)
+    # Prices like 0.10 and 19.99 that binary floats can't represent exactly
+    db.session.execute(db.update(Book), [{'id': book_id, 'price_cents': rng.choice((10, 30, 1999, 4995, 1234))}
+                                         for book_id, in db.session.query(Book.id)])
+    user = User(username='reader', email='reader@example.com')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all(CartItem(user_id=user.id, book_id=book_id, quantity=rng.randint(1, 3))
+                       for book_id, in db.session.query(Book.id).limit(args.lines))
+    db.session.commit()
+    user_id = user.id
+    client = app.test_client()
+    login(client, user_id)
+
+    def render_page():
+        db.session.remove()
+        assert client.get('/cart').status_code == 200
+
+    results = {'lines': args.lines}
+    for name, fn in (('float_loop', lambda: float_loop_total(user_id)),
+                     ('sql_totals', lambda: totals.for_cart(user_id)),
+                     ('cart_page', render_page)):
+        fn()  # Warm up (the cart page also loads the cart into the store)
+        with count_queries() as queries:
+            fn()
+        results[name] = {**summarize(timed(fn, args.repeat)), 'queries': queries[0]}
+
+    exact = totals.for_cart(user_id).total
+    float_sum = float_loop_total(user_id)
+    results['total'] = str(exact)
+    results['float_sum_error'] = float(Decimal(float_sum) - exact)  # The float's exact binary value
+
+    db.session.execute(db.update(Book).values(stock_quantity=10000))  # Room to raise any line
+    db.session.commit()
+    results['mutations'] = {}
+    for hold_minutes in (app.config['INVENTORY_HOLD_MINUTES'], 0):
+        app.config['INVENTORY_HOLD_MINUTES'] = hold_minutes
+        results['mutations'][f'holds_{"on" if hold_minutes else "off"}'] = mutations(
+            user_id, sorted(cart_service.get_items(user_id)), args.repeat)
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_checkout.py
+# Concurrency stress test for checkout: many threads race to buy the same low-stock book.
+# Fails (exit status 1) if more copies were sold than were in stock; reports checkouts/sec.
+import argparse
+import json
+import sys
+import threading
+import time
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, OrderItem, User
+from bookstore_flask_project.app.services import checkout as checkout_service
+from bookstore_flask_project.benchmarks.utils import make_app
+
+
+def seed(shoppers, stock, quantity):
+    book = Book(title='Limited Edition', price=25.0, stock_quantity=stock)
+    db.session.add(book)
+    users = [User(username=f'shopper{i}', email=f'shopper{i}@example.com') for i in range(shoppers)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all(CartItem(user_id=user.id, book_id=book.id, quantity=quantity) for user in users)
+    db.session.commit()
+    return book.id, [user.id for user in users]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent checkout oversell test')
+    parser.add_argument('--shoppers', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=25)
+    parser.add_argument('--quantity', type=int, default=1)
+    args = parser.parse_args()
+
+    # Writers queue on SQLite's lock rather than erroring out under contention
+    app = make_app(SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}})
+    book_id, user_ids = seed(args.shoppers, args.stock, args.quantity)
+    db.session.remove()
+
+    outcomes = {'ordered': 0, 'out_of_stock': 0, 'error': 0}
+    lock = threading.Lock()
+    pending = iter(user_ids)
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    user_id = next(pending, None)
+                if user_id is None:
+                    return
+                try:
+                    checkout_service.place_order(user_id, {'name': f'user {user_id}'})
+                    outcome = 'ordered'
+                except checkout_service.OutOfStockError:
+                    outcome = 'out_of_stock'
+                except Exception:
+                    db.session.rollback()
+                    outcome = 'error'
+                with lock:
+                    outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    sold = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+        .filter(OrderItem.book_id == book_id).scalar()
+    remaining = db.session.get(Book, book_id).stock_quantity
+    oversold = sold > args.stock or remaining < 0 or sold + remaining != args.stock
+    print(json.dumps({
+        **outcomes,
+        'stock': args.stock, 'sold': sold, 'remaining': remaining, 'oversold': oversold,
+        'seconds': round(elapsed, 3),
+        'checkouts_per_sec': round(args.shoppers / elapsed, 1),
+    }))
+    sys.exit(1 if oversold else 0)
+
+
+if __name__ == '__main__':
+    main()
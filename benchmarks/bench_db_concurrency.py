@@ -0,0 +1,132 @@
+# benchmarks/bench_db_concurrency.py
+# Load test of the SQLite engine settings: checkout threads and catalog-reading threads work on
+# the same database file for a fixed time, once with SQLite's defaults (rollback journal,
+# synchronous=full, 5 s busy timeout) and once with ProductionConfig's (WAL, synchronous=normal,
+# 30 s busy timeout). Reports orders/sec, checkout latency, reads/sec and "database is locked"
+# failures (retried) for each.
+import argparse
+import json
+import random
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, User
+from bookstore_flask_project.app.services import checkout as checkout_service
+from bookstore_flask_project.app.services.pagination import keyset_paginate
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, summarize
+from config import Config, ProductionConfig
+
+SQLITE_SETTINGS = ('SQLITE_BUSY_TIMEOUT', 'SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS')
+PROFILES = {name: {key: getattr(config, key) for key in SQLITE_SETTINGS}
+            for name, config in (('default', Config), ('production', ProductionConfig))}
+
+
+def seed(books, writers):
+    seed_books(books)
+    db.session.execute(db.update(Book).values(stock_quantity=1_000_000))  # Nobody runs out
+    users = [User(username=f'writer{i}', email=f'writer{i}@example.com') for i in range(writers)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def retrying(fn, *args):
+    """Call fn until it gets past "database is locked"; returns how many attempts failed."""
+    failures = 0
+    while True:
+        try:
+            fn(*args)
+            return failures
+        except OperationalError:
+            db.session.rollback()
+            failures += 1
+
+
+def add_to_cart(user_id, book_id):
+    db.session.add(CartItem(user_id=user_id, book_id=book_id, quantity=1))
+    db.session.commit()
+
+
+def place_order(user_id):
+    checkout_service.place_order(user_id, {'name': f'user {user_id}'})
+
+
+def browse(rng, books):
+    """A catalog page at a random spot, then a per-category stock summary (a longer read)."""
+    start = db.session.get(Book, rng.randint(1, books))
+    query = Book.query.filter(db.or_(Book.title > start.title, db.and_(Book.title == start.title, Book.id > start.id)))
+    keyset_paginate(query, (Book.title.asc(), Book.id.asc()), per_page=12)
+    db.session.query(Book.category, db.func.count(), db.func.sum(Book.stock_quantity)).group_by(Book.category).all()
+
+
+def run(profile, args):
+    app = make_app(JOBS_WORKERS=0, PASSWORD_HASH_WORKERS=0, COVER_WORKERS=0, **PROFILES[profile])
+    user_ids = seed(args.books, args.writers)
+    journal_mode = db.session.execute(text('PRAGMA journal_mode')).scalar()
+    db.session.remove()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, counts = [], {'orders': 0, 'reads': 0, 'write_locked': 0, 'read_locked': 0}
+
+    def writer(user_id):
+        rng = random.Random(user_id)
+        with app.app_context():
+            while not stop.is_set():
+                # A checkout as the shopper sees it: lock failures are retried, and count in its latency
+                started = time.perf_counter()
+                failures = retrying(add_to_cart, user_id, rng.randint(1, args.books)) + retrying(place_order, user_id)
+                with lock:
+                    counts['orders'] += 1
+                    counts['write_locked'] += failures
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+    def reader(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    browse(rng, args.books)
+                    outcome = 'reads'
+                except OperationalError:
+                    outcome = 'read_locked'
+                db.session.remove()  # Ends the read transaction, as the end of a request would
+                with lock:
+                    counts[outcome] += 1
+
+    threads = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        **PROFILES[profile], 'journal_mode': journal_mode, **counts,
+        'orders_per_sec': round(counts['orders'] / args.seconds, 1),
+        'reads_per_sec': round(counts['reads'] / args.seconds, 1),
+        'checkout': summarize(latencies) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent writers and readers under each SQLite profile')
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                        help='Run only this profile (repeatable); default: all')
+    args = parser.parse_args()
+
+    print(json.dumps({profile: run(profile, args) for profile in args.profile or sorted(PROFILES)}))
+
+
+if __name__ == '__main__':
+    main()
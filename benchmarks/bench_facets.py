@@ -0,0 +1,96 @@
+# benchmarks/bench_facets.py
+# The browse page's filter panel (counts per category, author, price range, availability) for a
+# few selections, computed two ways: GROUP BYs over the matching books every time (`group_by`),
+# and facets.panel(), which reads the precomputed FacetCount rows where they cover the selection.
+# Also what keeping the counts costs the writes that maintain them: a book edit through the ORM and
+# checkout's bulk stock decrement, timed with the facet events attached and detached.
+import argparse
+import json
+import random
+
+from sqlalchemy import case, event, update
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services import facets
+from bookstore_flask_project.app.services.search import search_index
+from bookstore_flask_project.benchmarks.utils import count_queries, make_app, seed_books, summarize, timed
+
+SELECTIONS = {
+    'plain': ({}, ''),
+    'category': ({'category': 'Fiction'}, ''),
+    'price': ({'price': '1000-2000'}, ''),
+    'in_stock': ({'stock': facets.IN_STOCK}, ''),
+    'category+in_stock': ({'category': 'Fiction', 'stock': facets.IN_STOCK}, ''),
+    'category+price+in_stock': ({'category': 'Fiction', 'price': '1000-2000', 'stock': facets.IN_STOCK}, ''),
+    'author': ({'author': 'A. River'}, ''),
+    'search': ({}, 'the'),
+    'search+category': ({'category': 'Fiction'}, 'the'),
+}
+MAPPER_EVENTS = (('after_insert', facets._book_inserted), ('after_update', facets._book_updated),
+                 ('before_delete', facets._book_deleted))
+
+
+def group_by(filters, search_text):
+    base_query = search_index.ranked(search_text)[0] if search_text else Book.query
+    return facets._live_counts(base_query, filters, 10)
+
+
+def measure(build, filters, search_text, repeat):
+    def request():
+        db.session.remove()
+        build(filters, search_text)
+    with count_queries() as queries:
+        request()
+    return {**summarize(timed(request, repeat)), 'queries': queries[0]}
+
+
+def write_costs(rng, book_ids, repeat):
+    def edit():
+        book = db.session.get(Book, rng.choice(book_ids))
+        book.price_cents = rng.randint(300, 6000)
+        book.stock_quantity = rng.randint(0, 3)
+        db.session.commit()
+
+    def decrement():
+        quantities = {book_id: 1 for book_id in rng.sample(book_ids, 3)}
+        db.session.execute(
+            update(Book).where(Book.id.in_(quantities), Book.stock_quantity >= 1)
+            .values(stock_quantity=Book.stock_quantity - case(quantities, value=Book.id))
+            .execution_options(synchronize_session=False, stock_deltas=quantities)
+        )
+        db.session.commit()
+
+    return {'book_edit': summarize(timed(edit, repeat)), 'stock_decrement': summarize(timed(decrement, repeat))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Facet panel: GROUP BY per request vs precomputed counts')
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    make_app()
+    rng = seed_books(args.books)
+    search_index.backend.rebuild()
+    facets.rebuild()  # seed_books bulk-inserts, past the events
+    book_ids = [book_id for book_id, in db.session.query(Book.id)]
+
+    results = {'panels': {}}
+    for name, (selected, search_text) in SELECTIONS.items():
+        filters = facets.Filters(**selected)
+        results['panels'][name] = {
+            'group_by': measure(group_by, filters, search_text, args.repeat),
+            'panel': measure(facets.panel, filters, search_text, args.repeat),
+        }
+
+    results['writes'] = {'with_facets': write_costs(random.Random(1), book_ids, args.repeat * 4)}
+    for name, listener in MAPPER_EVENTS:
+        event.remove(Book, name, listener)
+    event.remove(db.session, 'do_orm_execute', facets._bulk_statement_hook)
+    results['writes']['without_facets'] = write_costs(random.Random(2), book_ids, args.repeat * 4)
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
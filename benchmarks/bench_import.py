@@ -0,0 +1,73 @@
+# benchmarks/bench_import.py
+# Throughput of the streaming catalog import/export (rows/second), first load and re-import (upsert).
+import argparse
+import csv
+import json
+import os
+import random
+import string
+import tempfile
+import time
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.services import catalog_io
+from bookstore_flask_project.benchmarks.utils import make_app, random_title, CATEGORIES, WORDS
+
+
+def write_csv(path, rows, seed=42):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=catalog_io.COLUMNS)
+        writer.writeheader()
+        for i in range(1, rows + 1):
+            writer.writerow({
+                'title': random_title(rng),
+                'author': f"{rng.choice(string.ascii_uppercase)}. {rng.choice(WORDS).capitalize()}",
+                'isbn': f'979{i:010d}',
+                'description': ' '.join(rng.choice(WORDS) for _ in range(20)),
+                'price': round(rng.uniform(3, 60), 2),
+                'stock_quantity': rng.randint(0, 50),
+                'category': rng.choice(CATEGORIES),
+                'publication_date': f'{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            })
+
+
+def timed_import(path, batch_size):
+    started = time.perf_counter()
+    with open(path, newline='', encoding='utf-8') as f:
+        report = catalog_io.import_books(f, 'csv', batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    return {'seconds': round(elapsed, 2), 'rows_per_sec': round(report.processed / elapsed),
+            'inserted': report.inserted, 'updated': report.updated, 'rejected': report.error_count}
+
+
+def run(rows, batch_size):
+    make_app()
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_csv(path, rows)
+        results = {'rows': rows, 'batch_size': batch_size}
+        results['import'] = timed_import(path, batch_size)
+        results['reimport'] = timed_import(path, batch_size)  # Every row is now an update
+
+        started = time.perf_counter()
+        exported = sum(chunk.count('\n') for chunk in catalog_io.export_books('csv', batch_size)) - 1
+        elapsed = time.perf_counter() - started
+        results['export'] = {'seconds': round(elapsed, 2), 'rows_per_sec': round(exported / elapsed)}
+    finally:
+        os.remove(path)
+    db.session.remove()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog import/export throughput')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.batch_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_jobs.py
+# Throughput of the background job queue: N confirmation jobs drained by 1..K worker threads.
+# Fails (exit status 1) if any order wasn't confirmed exactly once.
+import argparse
+import json
+import sys
+import threading
+import time
+
+from sqlalchemy import insert
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Job, Order, User
+from bookstore_flask_project.app.services import orders
+from bookstore_flask_project.app.services.jobs import job_queue
+from bookstore_flask_project.benchmarks.utils import make_app
+
+
+def seed(count):
+    user = User(username='buyer', email='buyer@example.com')
+    db.session.add(user)
+    db.session.flush()
+    order_ids = db.session.execute(
+        insert(Order).returning(Order.id),
+        [{'user_id': user.id, 'total_cents': 1000, 'status': 'pending_payment'} for _ in range(count)]
+    ).scalars().all()
+    for order_id in order_ids:
+        orders.enqueue_confirmation(order_id)
+    db.session.commit()
+
+
+def run(jobs, workers, batch_size):
+    # Workers queue on SQLite's write lock rather than erroring out under contention; a stand-in
+    # gateway that accepts every payment, so each confirmation moves its order to processing
+    app = make_app(JOBS_WORKERS=0, JOBS_BATCH_SIZE=batch_size, PAYMENT_CAPTURE=lambda order: None,
+                   SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}})
+    seed(jobs)
+    db.session.remove()
+
+    def worker():
+        with app.app_context():
+            job_queue.run_pending()
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Each confirmation also queued a notification, which the workers ran too
+    counts = job_queue.counts()
+    processed = db.session.query(Order).filter_by(status='processing').count()
+    notifications = db.session.query(Job).filter_by(name='orders.notify').count()
+    db.session.remove()
+    return {'jobs': jobs, 'workers': workers, 'seconds': round(elapsed, 2),
+            'jobs_per_sec': round(counts.get('done', 0) / elapsed), 'statuses': counts,
+            'exactly_once': processed == jobs and notifications == jobs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Background job queue throughput')
+    parser.add_argument('--jobs', type=int, default=5000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--batch-size', type=int, default=20)
+    args = parser.parse_args()
+    ok = True
+    for workers in args.workers:
+        result = run(args.jobs, workers, args.batch_size)
+        ok = ok and result['exactly_once']
+        print(json.dumps(result))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_listing.py
+# Catalog listing pages of 12 and 100 books built three ways: Book objects with their description
+# (what the listings loaded before), BookSummary tuples from a column query, and a hit in the
+# in-process catalog snapshot. Reports latency and memory per page from tracemalloc: the peak
+# while building it and what is still held once built (the page, plus the Book objects in the
+# session). The session starts empty each time, as in a request; `baseline` is an empty query.
+import argparse
+import json
+import tracemalloc
+
+from sqlalchemy.orm import undefer
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services import catalog, stats
+from bookstore_flask_project.app.services.pagination import keyset_paginate
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, summarize, timed
+
+
+def book_objects(per_page):
+    return keyset_paginate(Book.query.options(undefer(Book.description)), catalog.LISTING_ORDER, per_page=per_page)
+
+
+def summaries(per_page):
+    return catalog.summary_page(Book.query, catalog.LISTING_ORDER, per_page=per_page)
+
+
+def snapshot_hit(per_page):
+    return catalog.listing_page(None, per_page, version=stats.listing_version()[0])
+
+
+def empty_query(per_page):
+    return db.session.query(Book.id).filter(db.false()).all()
+
+
+def memory_kb(build, per_page, repeat=20):
+    """(peak, retained) KB while building a page: everything allocated on the way, and what the page holds."""
+    samples = []
+    for _ in range(repeat):
+        db.session.remove()
+        tracemalloc.start()
+        page = build(per_page)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        samples.append((peak, retained))
+        del page
+    peak, retained = min(samples)
+    return {'peak_kb': round(peak / 1024, 1), 'retained_kb': round(retained / 1024, 1)}
+
+
+def run(build, per_page, repeat):
+    def request():
+        db.session.remove()  # A fresh session per page view, as per request
+        build(per_page)
+    return {**summarize(timed(request, repeat)), **memory_kb(build, per_page)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog listing pages: Book objects vs summaries vs snapshot')
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--description-chars', type=int, default=2000, help='Typical blurb length to pad to')
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    make_app()
+    seed_books(args.books)
+    db.session.execute(db.update(Book).values(description=db.func.substr(
+        db.func.replace(db.func.hex(db.func.zeroblob(args.description_chars // 2)), '0', 'a'), 1, args.description_chars)))
+    db.session.commit()
+    snapshot_hit(12), snapshot_hit(100)  # Fill the snapshot
+
+    # What any query in a fresh session allocates, for scale
+    results = {'baseline': memory_kb(empty_query, 0)}
+    for per_page in (12, 100):
+        results[f'{per_page}_items'] = {name: run(build, per_page, args.repeat) for name, build in (
+            ('book_objects', book_objects), ('summaries', summaries), ('snapshot_hit', snapshot_hit))}
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_login.py
+# Login throughput under concurrency, for a few PASSWORD_HASH_METHOD costs, with hashing inline
+# (PASSWORD_HASH_WORKERS=0) or in the process pool. While the logins run, a probe thread keeps
+# requesting a cheap page, to show how much a login burst slows everything else down.
+import argparse
+import json
+import threading
+import time
+
+from jinja2 import ChoiceLoader, DictLoader
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import User
+from bookstore_flask_project.app.services.passwords import password_hasher
+from bookstore_flask_project.benchmarks.utils import make_app, summarize
+
+SCENARIOS = (
+    ('scrypt:32768:8:1', 0),
+    ('scrypt:32768:8:1', 2),
+    ('scrypt:16384:8:1', 2),
+    ('pbkdf2:sha256:600000', 2),
+)
+
+
+def run(method, workers, threads, logins_per_thread):
+    app = make_app(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers, RATELIMIT_ENABLED=False)
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader({'auth/login.html': 'Sign in'})])
+    users = [User(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(threads)]
+    for user in users:
+        user.set_password('correct horse')
+    db.session.add_all(users)
+    db.session.commit()
+    db.session.remove()
+    password_hasher.verify_dummy('warm up')  # Start the pool outside the timed part
+
+    def log_in(i, latencies, errors):
+        for _ in range(logins_per_thread):
+            started = time.perf_counter()
+            response = app.test_client().post('/auth/login', data={'username': f'reader{i}',
+                                                                   'password': 'correct horse'})
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 302 or '/auth/login' in response.location:
+                errors.append(response.status_code)
+
+    done = threading.Event()
+    probe_latencies = []
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/auth/login')
+            probe_latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    latencies, errors = [], []
+    workers_threads = [threading.Thread(target=log_in, args=(i, latencies, errors)) for i in range(threads)]
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    for thread in workers_threads:
+        thread.start()
+    for thread in workers_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+    password_hasher.shutdown()
+    return {
+        'method': method, 'hash_workers': workers, 'threads': threads,
+        'logins_per_sec': round(len(latencies) / elapsed, 1), 'failed': len(errors),
+        'login_ms': summarize(latencies), 'probe_ms': summarize(probe_latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login throughput by hash cost and hashing mode')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=5, help='Logins per thread')
+    args = parser.parse_args()
+    for method, workers in SCENARIOS:
+        print(json.dumps(run(method, workers, args.threads, args.logins)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# benchmarks/bench_pagination.py
+# Page-1 vs deep-page latency: Flask-SQLAlchemy paginate() (OFFSET + COUNT) vs keyset cursors.
+import argparse
+import json
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services.pagination import keyset_paginate, encode_cursor
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, timed, summarize
+
+PER_PAGE = 12
+
+
+def cursor_for_page(page):
+    """Cursor that lands on `page` (1-based) of the title listing; computed once, outside the timings."""
+    if page == 1:
+        return None
+    anchor = db.session.query(Book.title, Book.id).order_by(Book.title.asc(), Book.id.asc()) \
+        .offset((page - 1) * PER_PAGE - 1).first()
+    return encode_cursor(list(anchor), 'next')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keyset vs OFFSET pagination latency')
+    parser.add_argument('--books', type=int, default=150000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed_books(args.books)
+    with app.test_request_context():  # cursors are signed with the app's SECRET_KEY
+        for page in args.pages:
+            query = Book.query.order_by(Book.title.asc())
+            offset = timed(lambda: query.paginate(page=page, per_page=PER_PAGE, error_out=False).items,
+                           args.repeat)
+            cursor = cursor_for_page(page)
+            keyset = timed(lambda: keyset_paginate(Book.query, (Book.title.asc(), Book.id.asc()),
+                                                   cursor=cursor, per_page=PER_PAGE).items, args.repeat)
+            print(json.dumps({'books': args.books, 'page': page,
+                              'offset': summarize(offset), 'keyset': summarize(keyset)}))
+
+
+if __name__ == '__main__':
+    main()
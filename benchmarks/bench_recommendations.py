@@ -0,0 +1,120 @@
+# benchmarks/bench_recommendations.py
+# "Customers also bought" over a large order history (skewed towards popular books, like real sales).
+#   - build: recommendations.rebuild() over every order line, with NumPy and with the plain Python
+#     fallback; `count_seconds` is the pair counting alone, the rest is reading lines and writing rows.
+#   - refresh: folding a batch of new orders into the stored counts (compare with the build).
+#   - serve: a book page's and a cart's recommendations from BookRecommendation, vs the self-join of
+#     OrderItem that computes them per request.
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, Order, OrderItem, User
+from bookstore_flask_project.app.services import recommendations
+from bookstore_flask_project.benchmarks.utils import count_queries, make_app, seed_books, summarize, timed
+
+
+def seed_orders(rng, count, book_ids, user_id, first_id=1, batch_size=50000):
+    """`count` orders of 1-6 books, popular books far more often; Core inserts, past the ORM events."""
+    weights = list(accumulate(1 / rank for rank in range(1, len(book_ids) + 1)))
+    placed = datetime.utcnow() - timedelta(minutes=5)
+    for offset in range(first_id, first_id + count, batch_size):
+        orders, items = [], []
+        for order_id in range(offset, min(offset + batch_size, first_id + count)):
+            orders.append({'id': order_id, 'user_id': user_id, 'status': 'delivered', 'order_date': placed})
+            for book_id in set(rng.choices(book_ids, cum_weights=weights, k=rng.randint(1, 6))):
+                items.append({'order_id': order_id, 'book_id': book_id, 'quantity': 1, 'unit_price_cents': 999})
+        db.session.execute(Order.__table__.insert(), orders)
+        db.session.execute(OrderItem.__table__.insert(), items)
+        db.session.commit()
+
+
+def timed_build(use_numpy):
+    numpy, counted = recommendations.np, [0.0]
+    pair_counts = recommendations._pair_counts
+
+    def counting(*args):
+        started = time.perf_counter()
+        result = pair_counts(*args)
+        counted[0] += time.perf_counter() - started
+        return result
+
+    recommendations.np = numpy if use_numpy else None
+    recommendations._pair_counts = counting
+    try:
+        started = time.perf_counter()
+        pairs = recommendations.rebuild()
+        db.session.commit()
+        seconds = time.perf_counter() - started
+    finally:
+        recommendations.np, recommendations._pair_counts = numpy, pair_counts
+    return {'seconds': round(seconds, 2), 'count_seconds': round(counted[0], 2), 'pairs': pairs}
+
+
+def live_for_book(book_id, limit):
+    """The per-request alternative: count co-purchases of `book_id` straight from OrderItem."""
+    other = aliased(OrderItem)
+    top = select(other.book_id, func.count().label('orders')) \
+        .join(OrderItem, OrderItem.order_id == other.order_id) \
+        .where(OrderItem.book_id == book_id, other.book_id != book_id) \
+        .group_by(other.book_id).order_by(func.count().desc(), other.book_id).limit(limit).subquery()
+    return db.session.query(Book.id, Book.title).join(top, top.c.book_id == Book.id) \
+        .filter(Book.stock_quantity > 0).all()
+
+
+def measure(fn, repeat):
+    def request():
+        db.session.remove()
+        fn()
+    with count_queries() as queries:
+        request()
+    return {**summarize(timed(request, repeat)), 'queries': queries[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Co-purchase recommendations: build, refresh and serving cost')
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--new-orders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = make_app(RECOMMENDATIONS_SETTLE_SECONDS=0, JOBS_WORKERS=0)
+    rng = seed_books(args.books)
+    user = User(username='bench', email='bench@example.com', role='customer')
+    db.session.add(user)
+    db.session.commit()
+    book_ids = [book_id for book_id, in db.session.query(Book.id)]
+    rng.shuffle(book_ids)  # Popularity unrelated to id
+    seed_orders(rng, args.orders, book_ids, user.id)
+    lines = db.session.query(func.count(OrderItem.id)).scalar()
+
+    results = {'order_lines': lines, 'build': {'python': timed_build(False)}}
+    if recommendations.np is not None:
+        results['build']['numpy'] = timed_build(True)
+
+    seed_orders(rng, args.new_orders, book_ids, user.id, first_id=args.orders + 1)
+    started = time.perf_counter()
+    folded = recommendations.refresh()
+    db.session.commit()
+    results['refresh'] = {'orders': args.new_orders, 'lines': folded,
+                          'seconds': round(time.perf_counter() - started, 3)}
+
+    popular, cart = book_ids[0], book_ids[:3]
+    shown = app.config['RECOMMENDATIONS_SHOWN']
+    results['serve'] = {
+        'book_live': measure(lambda: live_for_book(popular, shown), max(1, args.repeat // 10)),
+        'book_stored': measure(lambda: recommendations.for_book(popular), args.repeat),
+        'cart_stored': measure(lambda: recommendations.for_books(cart), args.repeat),
+    }
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
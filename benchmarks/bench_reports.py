@@ -0,0 +1,93 @@
+# benchmarks/bench_reports.py
+# Sales report latency: aggregating the full order history on every request versus the daily
+# buckets of app/services/reports.py (first build, a refresh after new orders, a warm read).
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, Order, OrderItem, User
+from bookstore_flask_project.app.services import reports
+from bookstore_flask_project.app.services.money import from_cents
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books
+
+
+def seed_orders(rng, count, days, book_ids, user_id, first_id=1):
+    """Orders spread over the last `days` days, 1-4 items each; Core inserts, so stats events don't fire."""
+    connection = db.session.connection()
+    now = datetime.utcnow() - timedelta(minutes=1)
+    orders, items = [], []
+    for order_id in range(first_id, first_id + count):
+        orders.append({'id': order_id, 'user_id': user_id, 'total_cents': 0,
+                       'status': rng.choice(('processing', 'shipped', 'delivered', 'delivered', 'cancelled')),
+                       'order_date': now - timedelta(seconds=rng.randint(0, (days - 1) * 86400))})
+        for book_id in rng.sample(book_ids, rng.randint(1, 4)):
+            items.append({'order_id': order_id, 'book_id': book_id, 'quantity': rng.randint(1, 3),
+                          'unit_price_cents': rng.randint(300, 6000)})
+    connection.execute(Order.__table__.insert(), orders)
+    connection.execute(OrderItem.__table__.insert(), items)
+    db.session.commit()
+
+
+def full_scan_report(start, end):
+    """What the report costs without buckets: the same groupings straight from OrderItem."""
+    day = func.date(Order.order_date)
+    base = select().select_from(OrderItem).join(Order, OrderItem.order_id == Order.id) \
+        .where(Order.order_date >= start, Order.order_date < end + timedelta(days=1),
+               Order.status != 'cancelled')
+    revenue = func.sum(OrderItem.quantity * OrderItem.unit_price_cents)
+    db.session.execute(base.add_columns(day, revenue).group_by(day)).all()
+    db.session.execute(base.join(Book, OrderItem.book_id == Book.id)
+                       .add_columns(Book.category, revenue).group_by(Book.category)).all()
+    db.session.execute(base.add_columns(OrderItem.book_id, func.sum(OrderItem.quantity))
+                       .group_by(OrderItem.book_id).order_by(func.sum(OrderItem.quantity).desc()).limit(10)).all()
+
+
+def timed_ms(fn):
+    started = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sales report latency with and without daily buckets')
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--new-orders', type=int, default=200)
+    args = parser.parse_args()
+
+    make_app(REPORTS_SETTLE_SECONDS=0)
+    rng = random.Random(7)
+    seed_books(args.books)
+    user = User(username='reader', email='reader@example.com')
+    db.session.add(user)
+    db.session.commit()
+    book_ids = [book_id for book_id, in db.session.query(Book.id)]
+    seed_orders(rng, args.orders, args.days, book_ids, user.id)
+    end = date.today()
+    start = end - timedelta(days=args.days - 1)
+
+    results = {'orders': args.orders, 'numpy': reports.np is not None}
+    results['full_scan_ms'] = timed_ms(lambda: full_scan_report(start, end))
+    results['first_report_ms'] = timed_ms(lambda: reports.sales_report(start, end))  # Builds the buckets
+    results['warm_report_ms'] = timed_ms(lambda: reports.sales_report(start, end))
+    results['warm_report_by_month_ms'] = timed_ms(lambda: reports.sales_report(start, end, 'month'))
+    seed_orders(rng, args.new_orders, 1, book_ids, user.id, first_id=args.orders + 1)
+    results['after_new_orders_ms'] = timed_ms(lambda: reports.sales_report(start, end))
+
+    # The buckets must agree with a from-scratch aggregation
+    expected = db.session.execute(
+        select(func.sum(OrderItem.quantity * OrderItem.unit_price_cents))
+        .join(Order, OrderItem.order_id == Order.id).where(Order.status != 'cancelled')
+    ).scalar()
+    results['totals_match'] = reports.sales_report(start, end)['totals']['revenue'] == from_cents(expected)
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
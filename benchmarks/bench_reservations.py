@@ -0,0 +1,139 @@
+# benchmarks/bench_reservations.py
+# Concurrency test for cart holds: many simulated shoppers race for a low-stock book. Each adds
+# it to their cart, then buys it, abandons the cart or removes the line. A second wave arrives
+# after the abandoned holds have expired. Run with holds on and off (INVENTORY_HOLD_MINUTES=0).
+#
+# Checks, exiting 1 on failure: nothing is oversold, copies held never exceed stock, and with
+# holds on no shopper who got the book into their cart is turned away at checkout.
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, OrderItem, StockReservation, User
+from bookstore_flask_project.app.services import cart as cart_service
+from bookstore_flask_project.app.services import checkout as checkout_service
+from bookstore_flask_project.app.services import inventory
+from bookstore_flask_project.benchmarks.utils import make_app
+
+
+def run(hold_minutes, shoppers, threads, stock, seed):
+    # Writers queue on SQLite's lock rather than erroring out under contention
+    app = make_app(CART_STORE='memory', INVENTORY_HOLD_MINUTES=hold_minutes, JOBS_WORKERS=0,
+                   SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}})
+    book = Book(title='Limited Edition', price=25.0, stock_quantity=stock)
+    users = [User(username=f'shopper{i}', email=f'shopper{i}@example.com') for i in range(shoppers * 2)]
+    db.session.add_all([book, *users])
+    db.session.commit()
+    book_id, user_ids = book.id, [user.id for user in users]
+    db.session.remove()
+
+    rng = random.Random(seed)
+    plans = {user_id: rng.choices(('buy', 'abandon', 'remove'), weights=(70, 20, 10))[0]
+             for user_id in user_ids[:shoppers]}
+    plans.update({user_id: 'buy' for user_id in user_ids[shoppers:]})
+    outcomes = {'add_rejected': 0, 'bought': 0, 'abandoned': 0, 'removed': 0, 'turned_away_at_checkout': 0,
+                'error': 0}
+    max_held = [0]
+    lock = threading.Lock()
+
+    def shop(user_id):
+        book = db.session.get(Book, book_id)
+        try:
+            cart_service.add(user_id, book, 1)
+        except cart_service.NotEnoughStockError:
+            return 'add_rejected'
+        time.sleep(rng.uniform(0, 0.02))  # Browsing a little before deciding
+        plan = plans[user_id]
+        if plan == 'abandon':
+            return 'abandoned'
+        if plan == 'remove':
+            cart_service.remove(user_id, book_id)
+            return 'removed'
+        cart_service.flush(user_id)
+        try:
+            checkout_service.place_order(user_id, {'name': f'user {user_id}'})
+        except checkout_service.OutOfStockError:
+            return 'turned_away_at_checkout'
+        cart_service.forget(user_id)
+        return 'bought'
+
+    def wave(wave_user_ids):
+        pending = iter(wave_user_ids)
+
+        def worker():
+            with app.app_context():
+                while True:
+                    with lock:
+                        user_id = next(pending, None)
+                    if user_id is None:
+                        return
+                    try:
+                        outcome = shop(user_id)
+                    except Exception:
+                        db.session.rollback()
+                        outcome = 'error'
+                    finally:
+                        db.session.remove()
+                    held = db.session.execute(
+                        select(func.coalesce(func.sum(StockReservation.quantity), 0))
+                        .where(StockReservation.book_id == book_id)
+                    ).scalar()
+                    db.session.remove()
+                    with lock:
+                        outcomes[outcome] += 1
+                        max_held[0] = max(max_held[0], held)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    started = time.perf_counter()
+    wave(user_ids[:shoppers])
+    if hold_minutes:
+        time.sleep(hold_minutes * 60)  # Let the abandoned holds expire
+    wave(user_ids[shoppers:])
+    elapsed = time.perf_counter() - started
+
+    sold = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter(OrderItem.book_id == book_id).scalar()
+    remaining = db.session.get(Book, book_id).stock_quantity
+    with app.test_request_context():
+        unsold_but_free = stock - sold - sum(inventory.reserved([book_id]).values())
+    db.session.remove()
+    return {
+        'hold_minutes': hold_minutes, **outcomes,
+        'stock': stock, 'sold': sold, 'remaining': remaining, 'max_copies_held': max_held[0],
+        'unsold_and_unheld': unsold_but_free,
+        'oversold': sold > stock or sold + remaining != stock,
+        'seconds': round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent shoppers racing for a low-stock book')
+    parser.add_argument('--shoppers', type=int, default=200, help='Per wave')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=25)
+    parser.add_argument('--hold-seconds', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    failed = False
+    for hold_minutes in (0, args.hold_seconds / 60):
+        result = run(hold_minutes, args.shoppers, args.threads, args.stock, args.seed)
+        print(json.dumps(result))
+        failed |= result['oversold'] or result['error'] > 0
+        if hold_minutes:
+            failed |= result['max_copies_held'] > args.stock or result['turned_away_at_checkout'] > 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
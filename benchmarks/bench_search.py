@@ -0,0 +1,41 @@
+# benchmarks/bench_search.py
+# p50/p99 latency of catalog search: FTS index vs the old four-column ILIKE scan.
+import argparse
+import itertools
+import json
+import random
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.services.search import search_index, LikeSearchBackend
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, timed, summarize, WORDS
+
+
+def run(size, repeat):
+    make_app()
+    seed_books(size)
+    search_index.backend.rebuild()
+    rng = random.Random(7)
+    queries = [rng.choice(WORDS)[:rng.randint(3, 6)] for _ in range(repeat)]
+    queries += [f'978{rng.randint(1, size):010d}' for _ in range(repeat // 10)]
+
+    like = LikeSearchBackend()
+    results = {'size': size, 'backend': search_index.backend.name}
+    for label, search in (('ilike', like.search), ('index', search_index.search)):
+        pending = itertools.cycle(queries)
+        samples = timed(lambda: search(next(pending)).limit(12).all(), len(queries))
+        results[label] = summarize(samples)
+    db.session.remove()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search latency: FTS index vs ILIKE')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    for size in args.sizes:
+        print(json.dumps(run(size, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
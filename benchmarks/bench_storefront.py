@@ -0,0 +1,419 @@
+# benchmarks/bench_storefront.py
+# End-to-end load test of the storefront: seeds a catalog, customers and an order history at the
+# chosen scale, then virtual users replay a weighted traffic mix (browse, search, book pages, cart
+# changes, checkout, order history, manager listings) for a fixed time. Requests go through the
+# Flask test client (--transport client: the app alone), through a local threaded WSGI server
+# over HTTP (--transport server: plus the HTTP stack and real concurrency), or both.
+#
+# The result is one JSON document (stdout, and --output FILE) with, per scenario, throughput,
+# latency percentiles, status codes and SQL statements per request (from the Server-Timing header
+# of app/services/profiling.py), plus the profiler's per-endpoint figures. --compare BASELINE
+# prints the change from an earlier result.
+#
+# Seeding 1M books takes a while; pass --db FILE to seed once and reuse the database afterwards.
+#
+# Pages whose real template is missing fall back to the minimal templates below, which touch
+# the same attributes the real pages render. The real layout is swapped for a bare one as well.
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from datetime import datetime, timedelta
+
+from jinja2 import ChoiceLoader, DictLoader, FileSystemLoader
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, Order, OrderItem, User
+from bookstore_flask_project.app.services import reports, stats
+from bookstore_flask_project.app.services.profiling import request_profiler
+from bookstore_flask_project.app.services.search import search_index
+from bookstore_flask_project.benchmarks.bench_db_concurrency import PROFILES
+from bookstore_flask_project.benchmarks.utils import WORDS, make_app, percentile, seed_books, summarize
+
+PASSWORD = 'load-test'
+HASH_METHOD = 'pbkdf2:sha256:1000'  # Logins aren't what this measures (see bench_login.py)
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+BASE_TEMPLATE = ('{% for category, message in get_flashed_messages(with_categories=true) %}{{ message }}{% endfor %}'
+                 '{% block content %}{% endblock %}')
+FALLBACK_TEMPLATES = {
+    'customer/browse_books.html':
+        '{% for book in books %}<a href="{{ url_for(\'customer.book_detail\', book_id=book.id) }}">{{ book.title }}</a>'
+        ' {{ book.author }} {{ book.price }}{% endfor %}{{ pagination.next_cursor }}',
+    'customer/cart.html':
+        '{% for item in cart_items %}{{ item.book.title }} {{ item.book.price }} {{ item.quantity }}{% endfor %}'
+        '{{ total_price }}',
+    'customer/checkout.html':
+        '{% for item in cart_items %}{{ item.title }} {{ item.price_cents|cents }} {{ item.quantity }}{% endfor %}',
+    'customer/order_history.html':
+        '{% for order in orders %}{{ order.id }} {{ order.order_date }} {{ order.total_amount }}{% endfor %}',
+    'manager/manage_orders.html':
+        '{% for order in orders %}{{ order.id }} {{ order.customer.username }} {{ order.status }}{% endfor %}',
+    'manager/manage_books.html':
+        '{% for book in books %}{{ book.title }} {{ book.price }} {{ book.stock_quantity }}{% endfor %}',
+}
+
+# Relative weights; --mix name=weight,... overrides them (0 drops a scenario)
+DEFAULT_MIX = {
+    'home': 5,
+    'browse': 20,
+    'search': 12,
+    'book_detail': 25,
+    'cart_add': 10,
+    'cart_view': 6,
+    'cart_update': 3,
+    'checkout': 4,
+    'order_history': 5,
+    'manager_orders': 5,
+    'manager_books': 5,
+}
+SERVER_TIMING = re.compile(r'app;dur=([\d.]+).*sql;dur=([\d.]+);desc="(\d+) statements"')
+
+
+# --- seeding ----------------------------------------------------------------------------------
+
+def seed(args):
+    """Books, customers (plus one manager) and an order history; Core inserts, then the derived tables."""
+    rng = seed_books(args.books, seed=args.seed)
+    password_hash = generate_password_hash(PASSWORD, HASH_METHOD)
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'customer{i}', 'email': f'customer{i}@example.com',
+         'password_hash': password_hash, 'role': 'customer'} for i in range(1, args.customers + 1)
+    ] + [{'id': args.customers + 1, 'username': 'manager', 'email': 'manager@example.com',
+          'password_hash': password_hash, 'role': 'manager'}])
+
+    now = datetime.utcnow() - timedelta(minutes=1)
+    for first in range(1, args.orders + 1, 10000):
+        orders, items = [], []
+        for order_id in range(first, min(first + 10000, args.orders + 1)):
+            lines = [(book_id, rng.randint(1, 3), rng.randint(300, 6000))
+                     for book_id in rng.sample(range(1, args.books + 1), rng.randint(1, 4))]
+            subtotal = sum(quantity * price for _, quantity, price in lines)
+            orders.append({'id': order_id, 'user_id': rng.randint(1, args.customers),
+                           'subtotal_cents': subtotal, 'total_cents': subtotal, 'line_count': len(lines),
+                           'item_count': sum(quantity for _, quantity, _ in lines),
+                           'status': rng.choice(('processing', 'shipped', 'delivered', 'delivered', 'cancelled')),
+                           'order_date': now - timedelta(seconds=rng.randint(0, 365 * 86400))})
+            items += [{'order_id': order_id, 'book_id': book_id, 'quantity': quantity, 'unit_price_cents': price}
+                      for book_id, quantity, price in lines]
+        connection.execute(Order.__table__.insert(), orders)
+        connection.execute(OrderItem.__table__.insert(), items)
+    db.session.commit()
+
+    search_index.backend.rebuild()
+    stats.reconcile()
+    reports.rebuild()
+    db.session.commit()
+
+
+def scale():
+    """(books, customers) already in the database; customer ids are 1..customers."""
+    books = db.session.query(db.func.count(Book.id)).scalar()
+    customers = db.session.query(db.func.count(User.id)).filter(User.role == 'customer').scalar()
+    return books, customers
+
+
+# --- transports -------------------------------------------------------------------------------
+
+class ClientSession:
+    """One browser, through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # Report the redirect itself, like the test client does
+
+
+class HttpSession:
+    """One browser, over HTTP to the local server (cookies kept, redirects not followed)."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                  _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=120) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers
+
+
+# --- traffic ----------------------------------------------------------------------------------
+
+class VirtualUser:
+    """A logged-in customer (with a manager session on the side) picking scenarios from the mix."""
+
+    def __init__(self, session, manager_session, books, rng):
+        self.session, self.manager_session = session, manager_session
+        self.books, self.rng = books, rng
+        self.cart = set()
+
+    def log_in(self, customer_id):
+        for session, username in ((self.session, f'customer{customer_id}'), (self.manager_session, 'manager')):
+            status, headers = session.request('POST', '/auth/login', {'username': username, 'password': PASSWORD})
+            if status != 302 or '/auth/login' in headers.get('Location', ''):
+                raise RuntimeError(f'Could not log in as {username} ({status})')
+
+    def book_id(self):
+        return self.rng.randint(1, self.books)
+
+    # Each scenario returns (session, method, path, form data)
+
+    def home(self):
+        return self.session, 'GET', '/', None
+
+    def browse(self):
+        return self.session, 'GET', '/books', None
+
+    def search(self):
+        words = ' '.join(self.rng.sample(WORDS, self.rng.randint(1, 2)))
+        return self.session, 'GET', f'/books?search={urllib.parse.quote(words)}', None
+
+    def book_detail(self):
+        return self.session, 'GET', f'/book/{self.book_id()}', None
+
+    def cart_add(self):
+        book_id = self.book_id()
+        self.cart.add(book_id)
+        return self.session, 'POST', f'/cart/add/{book_id}', {'quantity': 1}
+
+    def cart_view(self):
+        return self.session, 'GET', '/cart', None
+
+    def cart_update(self):
+        if not self.cart:
+            return self.cart_add()
+        book_id = self.rng.choice(sorted(self.cart))
+        return self.session, 'POST', f'/cart/update/{book_id}', {'quantity': self.rng.randint(1, 2)}
+
+    def checkout(self):
+        self.cart.clear()
+        return self.session, 'POST', '/checkout', {'name': 'Load Test', 'address1': '1 Main St', 'city': 'Springfield',
+                                                   'zip_code': '12345', 'country': 'US'}
+
+    def order_history(self):
+        return self.session, 'GET', '/orders', None
+
+    def manager_orders(self):
+        return self.manager_session, 'GET', '/manager/orders', None
+
+    def manager_books(self):
+        return self.manager_session, 'GET', '/manager/books', None
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, scenario, elapsed_ms, status, headers):
+        timing = SERVER_TIMING.search(headers.get('Server-Timing', ''))
+        app_ms, sql_ms, statements = (float(timing[1]), float(timing[2]), int(timing[3])) if timing else (None,) * 3
+        with self._lock:
+            self.samples.setdefault(scenario, []).append((elapsed_ms, status, app_ms, sql_ms, statements))
+
+    def results(self, seconds):
+        results = {}
+        for scenario, samples in sorted(self.samples.items()):
+            latencies = [sample[0] for sample in samples]
+            timed = [sample for sample in samples if sample[4] is not None]
+            results[scenario] = {
+                'requests': len(samples),
+                'per_sec': round(len(samples) / seconds, 1),
+                'status': dict(Counter(str(sample[1]) for sample in samples)),
+                'latency': {**summarize(latencies), 'p90_ms': round(percentile(latencies, 90), 3),
+                            'max_ms': round(max(latencies), 3)},
+                'app_ms_p50': round(percentile([sample[2] for sample in timed], 50), 1) if timed else None,
+                'sql_ms_mean': round(sum(sample[3] for sample in timed) / len(timed), 2) if timed else None,
+                'sql_statements_mean': round(sum(sample[4] for sample in timed) / len(timed), 2) if timed else None,
+                'sql_statements_max': max(sample[4] for sample in timed) if timed else None,
+            }
+        return results
+
+
+def drive(make_session, args, books, customers, weights):
+    """Run args.workers virtual users for args.warmup + args.duration seconds; returns the recorder."""
+    scenarios, scenario_weights = list(weights), list(weights.values())
+    recorder, errors = Recorder(), []
+    measuring, stop = threading.Event(), threading.Event()
+    users = [VirtualUser(make_session(), make_session(), books, random.Random(args.seed + i))
+             for i in range(args.workers)]
+
+    def run(i, user):
+        try:
+            # In the worker thread: the main thread's app context (and its g) isn't shared with it
+            user.log_in(i % customers + 1)
+            while not stop.is_set():
+                scenario = user.rng.choices(scenarios, scenario_weights)[0]
+                session, method, path, data = getattr(user, scenario)()
+                started = time.perf_counter()
+                status, headers = session.request(method, path, data)
+                if measuring.is_set():
+                    recorder.record(scenario, (time.perf_counter() - started) * 1000, status, headers)
+                if args.think_ms:
+                    time.sleep(user.rng.expovariate(1000 / args.think_ms))
+        except Exception as e:  # Stop the whole run rather than report a silently thinner load
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=run, args=(i, user)) for i, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    request_profiler.reset()
+    measuring.set()
+    started = time.perf_counter()
+    stop.wait(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return {
+        'seconds': round(elapsed, 2),
+        'requests': sum(len(samples) for samples in recorder.samples.values()),
+        'requests_per_sec': round(sum(len(samples) for samples in recorder.samples.values()) / elapsed, 1),
+        'scenarios': recorder.results(elapsed),
+        'endpoints': request_profiler.snapshot()['endpoints'],
+    }
+
+
+def run_client(app, args, books, customers, weights):
+    return drive(lambda: ClientSession(app), args, books, customers, weights)
+
+
+def run_server(app, args, books, customers, weights):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # No access log line per request
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        return drive(lambda: HttpSession(f'http://127.0.0.1:{server.server_port}'), args, books, customers, weights)
+    finally:
+        server.shutdown()
+
+
+# --- reporting --------------------------------------------------------------------------------
+
+def parse_mix(value):
+    weights = dict(DEFAULT_MIX)
+    for part in filter(None, (value or '').split(',')):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        weights[name] = float(weight)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline):
+    """Print throughput and p50/p99 changes per transport and scenario against a previous result."""
+    for transport, run in result['runs'].items():
+        before = baseline.get('runs', {}).get(transport)
+        if before is None:
+            continue
+        print(f"{transport}: {before['requests_per_sec']} -> {run['requests_per_sec']} req/s", file=sys.stderr)
+        for scenario, now in run['scenarios'].items():
+            then = before['scenarios'].get(scenario)
+            if then is None:
+                continue
+            print(f"  {scenario:<15} p50 {then['latency']['p50_ms']:8.1f} -> {now['latency']['p50_ms']:8.1f} ms   "
+                  f"p99 {then['latency']['p99_ms']:8.1f} -> {now['latency']['p99_ms']:8.1f} ms   "
+                  f"sql {then['sql_statements_mean']} -> {now['sql_statements_mean']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Storefront load test with a realistic traffic mix')
+    parser.add_argument('--books', type=int, default=10000, help='Catalog size to seed (10k-1M)')
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=20000, help='Order history to seed')
+    parser.add_argument('--db', help='SQLite file to seed, or to reuse if it is already seeded')
+    parser.add_argument('--transport', choices=('client', 'server', 'both'), default='both')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds per transport')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before that')
+    parser.add_argument('--think-ms', type=float, default=0, help='Mean pause between a user\'s requests')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(None),
+                        help='Scenario weights, e.g. browse=40,checkout=0 (others keep their defaults)')
+    parser.add_argument('--sqlite-profile', choices=sorted(PROFILES), default='production')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the JSON result to this file')
+    parser.add_argument('--compare', help='A previous --output file to compare against (printed to stderr)')
+    args = parser.parse_args()
+
+    reuse = args.db is not None and os.path.exists(args.db) and os.path.getsize(args.db) > 0
+    # Profiling on for the Server-Timing figures, without cProfile samples or slow-query logging
+    app = make_app(args.db, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_SLOW_QUERY_MS=float('inf'),
+                   RATELIMIT_ENABLED=False, PASSWORD_HASH_METHOD=HASH_METHOD, PASSWORD_HASH_WORKERS=0,
+                   **PROFILES[args.sqlite_profile])
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader({'layouts/base.html': BASE_TEMPLATE}),
+                                     FileSystemLoader(TEMPLATE_DIR), DictLoader(FALLBACK_TEMPLATES)])
+    started = time.perf_counter()
+    if not (reuse and db.session.query(Book.id).first() is not None):
+        seed(args)
+    seed_seconds = time.perf_counter() - started
+    books, customers = scale()
+    db.session.remove()
+
+    transports = ('client', 'server') if args.transport == 'both' else (args.transport,)
+    runners = {'client': run_client, 'server': run_server}
+    result = {
+        'revision': git_revision(),
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'scale': {'books': books, 'customers': customers,
+                  'orders': db.session.query(db.func.count(Order.id)).scalar(),
+                  'seed_seconds': round(seed_seconds, 1)},
+        'settings': {'workers': args.workers, 'duration': args.duration, 'think_ms': args.think_ms,
+                     'mix': args.mix, 'sqlite_profile': args.sqlite_profile},
+        'runs': {transport: runners[transport](app, args, books, customers, args.mix) for transport in transports},
+    }
+    db.session.remove()
+
+    document = json.dumps(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    print(document)
+
+
+if __name__ == '__main__':
+    main()
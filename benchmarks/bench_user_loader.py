@@ -0,0 +1,59 @@
+# benchmarks/bench_user_loader.py
+# Requests/sec and SQL statements per request on the cart page, with and without the
+# identity cache (IDENTITY_CACHE_TTL=0 makes the user loader hit the database every time).
+import argparse
+import json
+import time
+
+from flask import g
+from jinja2 import ChoiceLoader, DictLoader
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, User
+from bookstore_flask_project.benchmarks.check_query_counts import FALLBACK_TEMPLATES
+from bookstore_flask_project.benchmarks.utils import make_app, seed_books, count_queries, login
+
+
+def run(ttl, requests, cart_size):
+    app = make_app(IDENTITY_CACHE_TTL=ttl)
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader(FALLBACK_TEMPLATES)])
+    seed_books(cart_size)
+    user = User(username='reader', email='reader@example.com')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all(CartItem(user_id=user.id, book_id=book_id, quantity=1)
+                       for book_id, in db.session.query(Book.id).limit(cart_size))
+    db.session.commit()
+    user_id = user.id
+    client = app.test_client()
+    login(client, user_id)
+
+    def one_request():
+        # Each real request starts with an empty g and a fresh session; the pushed app context doesn't
+        g.pop('_login_user', None)
+        db.session.remove()
+        assert client.get('/cart').status_code == 200
+
+    for _ in range(20):  # Warm up (and fill the cache)
+        one_request()
+    with count_queries() as queries:
+        started = time.perf_counter()
+        for _ in range(requests):
+            one_request()
+        elapsed = time.perf_counter() - started
+    db.session.remove()
+    return {'identity_cache_ttl': ttl, 'requests_per_sec': round(requests / elapsed),
+            'sql_per_request': round(queries[0] / requests, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='view_cart throughput with/without the identity cache')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--cart-size', type=int, default=5)
+    args = parser.parse_args()
+    for ttl in (0, 60):
+        print(json.dumps(run(ttl, args.requests, args.cart_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/check_query_counts.py
+# Query-count regression check for the cart and order pages.
+#
+# Each endpoint is requested through the test client for a small and a large cart/order; the
+# number of SQL statements must not grow with the number of line items and must stay within
+# the budget below. Exits non-zero on a regression.
+#
+# Pages whose real template is missing fall back to the minimal templates below, which touch
+# the same attributes the real pages render (book title/price per line, order customer).
+import argparse
+import sys
+
+from jinja2 import ChoiceLoader, DictLoader
+
+from bookstore_flask_project.app import db
+from bookstore_flask_project.app.models import Book, CartItem, Order, OrderItem, User
+from bookstore_flask_project.app.services.identity import identity_cache
+from bookstore_flask_project.app.services.pagination import total_cache
+from bookstore_flask_project.benchmarks.utils import make_app, count_queries, login
+
+FALLBACK_TEMPLATES = {
+    'customer/cart.html':
+        '{% for item in cart_items %}{{ item.book.title }} {{ item.book.price }} {{ item.quantity }}{% endfor %}'
+        '{{ total_price }}',
+    'customer/checkout.html':
+        '{% for item in cart_items %}{{ item.title }} {{ item.price_cents|cents }} {{ item.quantity }}{% endfor %}',
+    'customer/order_detail.html':
+        '{% for item in order.line_items %}{{ item.book_item.title }} {{ item.price_at_purchase }}{% endfor %}',
+    'manager/view_order_detail.html':
+        '{% for item in order.line_items %}{{ item.book_item.title }} {{ item.quantity }}{% endfor %}',
+    'manager/manage_orders.html':
+        '{% for order in orders %}{{ order.id }} {{ order.customer.username }}{% endfor %}',
+}
+
+# Maximum statements per request, including the session's user lookup
+BUDGETS = {
+    'customer.view_cart': 4,  # + the "customers also bought" lookup for the whole cart
+    'customer.checkout': 3,
+    'customer.order_detail': 4,
+    'manager.view_order_detail_manager': 4,
+    'manager.list_orders': 5,
+}
+
+
+def seed(size, customer_id, book_ids):
+    order = Order(user_id=customer_id, status='pending_payment')
+    db.session.add(order)
+    db.session.flush()
+    for book_id in book_ids[:size]:
+        db.session.add(CartItem(user_id=customer_id, book_id=book_id, quantity=1))
+        db.session.add(OrderItem(order_id=order.id, book_id=book_id, quantity=1, unit_price_cents=1000))
+    db.session.commit()
+    return order.id
+
+
+def measure(app, user_id, url):
+    client = app.test_client()
+    login(client, user_id)
+    total_cache.clear()  # Measure the uncached COUNT(*) too
+    identity_cache.invalidate(user_id)  # ...and the user lookup, so runs don't depend on cache warmth
+    with count_queries() as counter:
+        response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code} {response.location}')
+    db.session.remove()
+    return counter[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query-count regression check')
+    parser.add_argument('--small', type=int, default=1)
+    parser.add_argument('--large', type=int, default=50)
+    args = parser.parse_args()
+
+    app = make_app()
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader(FALLBACK_TEMPLATES)])
+    books = [Book(title=f'Book {i}', price=10.0 + i, stock_quantity=100) for i in range(args.large)]
+    manager = User(username='manager', email='manager@example.com', role='manager')
+    db.session.add_all(books + [manager])
+    db.session.commit()
+    book_ids, manager_id = [book.id for book in books], manager.id
+
+    counts = {}
+    for size in (args.small, args.large):
+        customer = User(username=f'customer{size}', email=f'customer{size}@example.com')
+        db.session.add(customer)
+        db.session.commit()
+        customer_id = customer.id
+        order_id = seed(size, customer_id, book_ids)
+        for user_id, endpoint, url in (
+            (customer_id, 'customer.view_cart', '/cart'),
+            (customer_id, 'customer.checkout', '/checkout'),
+            (customer_id, 'customer.order_detail', f'/order/{order_id}'),
+            (manager_id, 'manager.view_order_detail_manager', f'/manager/orders/view/{order_id}'),
+            (manager_id, 'manager.list_orders', '/manager/orders'),
+        ):
+            counts.setdefault(endpoint, {})[size] = measure(app, user_id, url)
+
+    failed = False
+    for endpoint, by_size in counts.items():
+        small, large = by_size[args.small], by_size[args.large]
+        ok = small == large and large <= BUDGETS[endpoint]
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {endpoint:40} {args.small} items: {small:3}  "
+              f"{args.large} items: {large:3}  budget: {BUDGETS[endpoint]}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
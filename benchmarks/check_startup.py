@@ -0,0 +1,95 @@
+# benchmarks/check_startup.py
+# Startup-time regression check: how long a fresh interpreter takes to import the app package and
+# run the app factory, against the budgets below (milliseconds, medians of --runs fresh processes).
+#
+# Also checks what gets imported: a web worker must not load the migration tooling (alembic),
+# while the flask CLI must, or 'flask db' breaks. Exits non-zero on a regression. Pass
+# --importtime N to list the N slowest imports (python -X importtime) of a worker's startup.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Median milliseconds on a developer laptop; scale with --budget-scale on slower CI machines
+BUDGETS = {
+    'import_ms': 900,
+    'create_app_ms': 250,
+    'preload_ms': 400,
+}
+# Modules a web worker must not import, and ones the CLI needs
+SERVER_EXCLUDED = ('alembic', 'flask_migrate')
+CLI_REQUIRED = ('flask_migrate',)
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from bookstore_flask_project.app import create_app, preload_app
+imported = time.perf_counter()
+app = {factory}()
+created = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'factory_ms': (created - imported) * 1000,
+                  'modules': sorted(sys.modules)}}))
+'''
+
+
+def probe(factory, env=None, python_flags=()):
+    """Run the app factory in a fresh interpreter; returns its timings and sys.modules."""
+    result = subprocess.run([sys.executable, *python_flags, '-c', PROBE.format(factory=factory)],
+                            env={**os.environ, **(env or {})}, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """Top `count` (cumulative ms, module) from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return [(round(ms, 1), name) for ms, name in sorted(rows, reverse=True)[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='App startup time and import budget check')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-scale', type=float, default=1.0)
+    parser.add_argument('--importtime', type=int, default=0, metavar='N')
+    args = parser.parse_args()
+
+    # Workers don't run under the flask CLI, whatever the environment this check runs in
+    server_env = {'FLASK_RUN_FROM_CLI': ''}
+    server = [probe('create_app', server_env)[0] for _ in range(args.runs)]
+    preload = [probe('preload_app', server_env)[0] for _ in range(args.runs)]
+    cli, _ = probe('create_app', {'FLASK_RUN_FROM_CLI': 'true'})
+
+    measured = {
+        'import_ms': statistics.median(run['import_ms'] for run in server),
+        'create_app_ms': statistics.median(run['factory_ms'] for run in server),
+        'preload_ms': statistics.median(run['factory_ms'] for run in preload),
+    }
+    failures = 0
+    for name, value in measured.items():
+        budget = BUDGETS[name] * args.budget_scale
+        ok = value <= budget
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<16} {value:8.1f} ms  budget: {budget:.0f} ms")
+
+    loaded = set(server[0]['modules'])
+    excluded = sorted(module for module in SERVER_EXCLUDED if module in loaded)
+    missing = sorted(module for module in CLI_REQUIRED if module not in cli['modules'])
+    for label, modules in (('worker imports', excluded), ('CLI lacks', missing)):
+        ok = not modules
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<16} {', '.join(modules) or '-'}")
+
+    if args.importtime:
+        _, stderr = probe('create_app', server_env, python_flags=('-X', 'importtime'))
+        for ms, name in slowest_imports(stderr, args.importtime):
+            print(f'     {ms:8.1f} ms  {name}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
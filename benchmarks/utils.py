@@ -0,0 +1,122 @@
+# benchmarks/utils.py
+# Shared helpers for the benchmark scripts: throwaway app/database, synthetic data, timing.
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from flask import g
+from sqlalchemy import event
+
+from bookstore_flask_project.app import create_app, db
+from bookstore_flask_project.app.models import Book
+from bookstore_flask_project.app.services.search import search_index
+from config import Config
+
+WORDS = ('river', 'night', 'garden', 'shadow', 'empire', 'winter', 'silver', 'stone', 'ocean', 'fire',
+         'city', 'dream', 'secret', 'house', 'memory', 'glass', 'storm', 'crown', 'forest', 'letter')
+CATEGORIES = ('Fiction', 'History', 'Science', 'Kids', 'Lifestyle', 'Poetry', 'Travel', 'Business')
+
+
+def make_app(db_path=None, **overrides):
+    """Create the app against a fresh SQLite file (or the given path) and push an app context."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='bookstore-bench-', suffix='.db')
+        os.close(fd)
+
+    class BenchConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+
+    for key, value in overrides.items():
+        setattr(BenchConfig, key, value)
+
+    app = create_app(BenchConfig)
+    app.app_context().push()
+    db.create_all()
+    search_index.setup()  # create_all() doesn't know the search index; migrations create it
+    return app
+
+
+def random_title(rng):
+    return ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 4)))
+
+
+def seed_books(count, batch_size=10000, seed=42):
+    """Insert `count` synthetic books with bulk inserts; returns the RNG used so callers can continue."""
+    rng = random.Random(seed)
+    start_id = db.session.query(db.func.coalesce(db.func.max(Book.id), 0)).scalar()
+    today = date.today()
+    for offset in range(0, count, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, count)):
+            book_id = start_id + i + 1
+            rows.append({
+                'id': book_id,
+                'title': random_title(rng),
+                'author': f"{rng.choice(string.ascii_uppercase)}. {rng.choice(WORDS).capitalize()}",
+                'isbn': f"978{book_id:010d}",
+                'description': ' '.join(rng.choice(WORDS) for _ in range(40)),
+                'price_cents': rng.randint(300, 6000),
+                'stock_quantity': rng.randint(0, 50),
+                'category': rng.choice(CATEGORIES),
+                'publication_date': today - timedelta(days=rng.randint(0, 20000)),
+                'created_at': datetime.utcnow(),
+            })
+        db.session.execute(db.insert(Book), rows)
+        db.session.commit()
+    return rng
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and return per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'n': len(samples),
+    }
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements sent to the database inside the block: `with count_queries() as n: ...; n[0]`."""
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def login(client, user_id):
+    """Log the user with `user_id` into a Flask test client without going through the login form."""
+    # Requests reuse the app context make_app() pushed, so drop Flask-Login's cached user from g
+    g.pop('_login_user', None)
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
@@ -9,9 +9,119 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'bookstore.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica; views marked @database.read_only (the catalog pages) read from it
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL') or None
+    # Connection pool of server databases (see app/services/database.py); these are SQLAlchemy's
+    # defaults. DB_POOL_RECYCLE: seconds before a connection is replaced (-1: never)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', -1))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '').lower() in ('1', 'true', 'yes')
+    # SQLite: seconds to wait for the write lock, and PRAGMAs for each connection ('' leaves
+    # SQLite's default, i.e. a rollback journal and synchronous=full)
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 5))
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', '')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', '')
+    # Seconds a listing's COUNT(*) is reused across keyset-paginated page views
+    KEYSET_TOTAL_TTL = int(os.environ.get('KEYSET_TOTAL_TTL', 60))
+    # Books at or below this stock level count as low stock on the manager dashboard
+    LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD', 5))
+    # Orders younger than this many seconds are left for the next sales-report refresh
+    REPORTS_SETTLE_SECONDS = int(os.environ.get('REPORTS_SETTLE_SECONDS', 5))
+    # Fragment cache: 'lru' (in-process), 'filesystem', 'redis' or 'null'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'lru')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(basedir, 'instance', 'cache')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    # Seconds a logged-in user's principal is cached by the user loader (0 disables the cache);
+    # set IDENTITY_CACHE_BACKEND=redis to share principals between workers via CACHE_REDIS_URL
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    IDENTITY_CACHE_BACKEND = os.environ.get('IDENTITY_CACHE_BACKEND') or None
+    # Minutes a cart line holds its copies for the shopper (0: no holds, stock is checked at checkout only)
+    INVENTORY_HOLD_MINUTES = int(os.environ.get('INVENTORY_HOLD_MINUTES', 15))
+    # Where carts live between checkouts: 'session' (signed cookie), 'redis' or 'memory' (single process);
+    # dirty carts in the shared stores are written to CartItem every CART_FLUSH_INTERVAL seconds
+    CART_STORE = os.environ.get('CART_STORE', 'session')
+    CART_FLUSH_INTERVAL = int(os.environ.get('CART_FLUSH_INTERVAL', 30))
+    # Background job worker threads per app process (0: run `flask jobs-work` separately instead)
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+    # Payment gateway hook: a callable, or its 'module:function' import path, that takes the payment
+    # for an order (raising to retry). Unset, orders stay pending_payment until a manager confirms them
+    PAYMENT_CAPTURE = os.environ.get('PAYMENT_CAPTURE') or None
+    # Password hashing: any werkzeug method string ('scrypt:32768:8:1', 'pbkdf2:sha256:600000', ...);
+    # existing hashes are upgraded on login. Hashes run in PASSWORD_HASH_WORKERS processes (0: inline)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    # Auth throttling (token buckets: a burst, then N per minute): login/signup POSTs per IP address,
+    # failed logins per username
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    AUTH_IP_BURST = int(os.environ.get('AUTH_IP_BURST', 20))
+    AUTH_IP_PER_MINUTE = int(os.environ.get('AUTH_IP_PER_MINUTE', 20))
+    LOGIN_USERNAME_BURST = int(os.environ.get('LOGIN_USERNAME_BURST', 5))
+    LOGIN_USERNAME_PER_MINUTE = int(os.environ.get('LOGIN_USERNAME_PER_MINUTE', 5))
+    # JSON API (/api/v1): page size and batch caps; responses over API_COMPRESS_MIN_BYTES are sent
+    # gzip- or brotli-compressed (brotli needs the 'brotli' package)
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+    API_MAX_BATCH_IDS = int(os.environ.get('API_MAX_BATCH_IDS', 100))
+    API_COMPRESS_MIN_BYTES = int(os.environ.get('API_COMPRESS_MIN_BYTES', 1024))
+    API_GZIP_LEVEL = int(os.environ.get('API_GZIP_LEVEL', 6))
+    API_BROTLI_QUALITY = int(os.environ.get('API_BROTLI_QUALITY', 5))
+    # Catalog listing pages kept in process per catalog version (0 disables; see app/services/catalog.py)
+    CATALOG_SNAPSHOT_SIZE = int(os.environ.get('CATALOG_SNAPSHOT_SIZE', 64))
+    # Seconds the stock shown on cached listing pages may lag behind sales (see stats.listing_version())
+    CATALOG_STOCK_TTL = int(os.environ.get('CATALOG_STOCK_TTL', 60))
+    # Price ranges of the browse page's price filter: the bucket edges in cents ('flask facets-rebuild'
+    # after changing them), and how many authors the author filter lists
+    FACET_PRICE_EDGES = tuple(int(edge) for edge in os.environ.get('FACET_PRICE_EDGES', '1000,2000,3000,5000').split(','))
+    FACET_AUTHOR_LIMIT = int(os.environ.get('FACET_AUTHOR_LIMIT', 10))
+    # "Customers also bought": partners ranked per book, how many a page shows, the co-purchases a
+    # pair needs, the largest order counted, and how often checkout's refresh job folds new orders in
+    # (0: run 'flask recommendations-refresh' from cron instead)
+    RECOMMENDATIONS_PER_BOOK = int(os.environ.get('RECOMMENDATIONS_PER_BOOK', 20))
+    RECOMMENDATIONS_SHOWN = int(os.environ.get('RECOMMENDATIONS_SHOWN', 6))
+    RECOMMENDATIONS_MIN_ORDERS = int(os.environ.get('RECOMMENDATIONS_MIN_ORDERS', 1))
+    RECOMMENDATIONS_MAX_BASKET = int(os.environ.get('RECOMMENDATIONS_MAX_BASKET', 50))
+    RECOMMENDATIONS_REFRESH_SECONDS = int(os.environ.get('RECOMMENDATIONS_REFRESH_SECONDS', 60))
+    RECOMMENDATIONS_SETTLE_SECONDS = int(os.environ.get('RECOMMENDATIONS_SETTLE_SECONDS', 5))
+    # 'flask orders-archive' moves delivered/cancelled orders older than this many days to the
+    # archive tables, a window of this many order ids per transaction
+    ORDERS_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDERS_ARCHIVE_AFTER_DAYS', 180))
+    ORDERS_ARCHIVE_BATCH = int(os.environ.get('ORDERS_ARCHIVE_BATCH', 500))
+    # Seconds browsers/CDNs may reuse anonymous catalog pages before revalidating
+    HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 60))
+    # Request/SQL instrumentation (see app/services/profiling.py); off unless PROFILING_ENABLED=1
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILING_SLOW_QUERY_MS = float(os.environ.get('PROFILING_SLOW_QUERY_MS', 100))
+    PROFILING_SLOW_REQUEST_MS = float(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.05))
     # For file uploads (example, adjust path as needed)
     # UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'images', 'uploads')
     # Or to instance folder (more secure if instance is not served directly)
     UPLOAD_FOLDER = os.path.join(basedir, 'instance', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload size
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'} # For image uploads
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'} # For image uploads
+    # Cover thumbnails (name -> max width, height), generated by COVER_WORKERS background threads
+    COVER_SIZES = {'thumb': (160, 240), 'medium': (400, 600)}
+    COVER_WORKERS = int(os.environ.get('COVER_WORKERS', 2))
+    # Let the front-end server (Apache mod_xsendfile, lighttpd...) send cover files itself
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+
+class ProductionConfig(Config):
+    # WAL, so catalog reads don't hold off checkouts (and vice versa), and writers queue on the lock
+    # for longer instead of failing; synchronous=normal is durable enough in WAL mode
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'normal')
+    # A bigger pool per worker; connections are checked before use and replaced every 30 minutes,
+    # ahead of server-side idle timeouts (MySQL wait_timeout, PgBouncer, load balancers)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+
+
+# create_app() without a config class picks one of these by the APP_CONFIG environment variable
+CONFIGS = {'default': Config, 'development': Config, 'production': ProductionConfig}
@@ -0,0 +1,30 @@
+"""Book.updated_at
+
+Revision ID: 07a7c4b7418f
+Revises: 4759d2c1cc7f
+Create Date: 2026-10-18 20:32:00.000000
+
+Adds book.updated_at, which the HTTP validators and the book page's fragment cache key on (see
+app/services/http_cache.py). Existing books start with their created_at.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '07a7c4b7418f'
+down_revision = '4759d2c1cc7f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('book') as batch:
+        batch.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    book = sa.table('book', sa.column('created_at'), sa.column('updated_at'))
+    op.execute(book.update().values(updated_at=book.c.created_at))
+
+
+def downgrade():
+    with op.batch_alter_table('book') as batch:
+        batch.drop_column('updated_at')
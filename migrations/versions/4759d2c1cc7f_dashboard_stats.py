@@ -0,0 +1,44 @@
+"""Materialized dashboard statistics
+
+Revision ID: 4759d2c1cc7f
+Revises: b724bf848660
+Create Date: 2026-10-18 20:31:00.000000
+
+Adds store_stat (named counters: books, users, orders per status, revenue) and book_sales (running
+per-book sales totals) for the manager dashboard (see app/services/stats.py). Both start empty;
+fill them from the existing data with `flask stats-reconcile`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4759d2c1cc7f'
+down_revision = 'b724bf848660'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'store_stat',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.create_table(
+        'book_sales',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('units_sold', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.PrimaryKeyConstraint('book_id'),
+    )
+    op.create_index('ix_book_sales_units_sold', 'book_sales', ['units_sold'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_book_sales_units_sold', table_name='book_sales')
+    op.drop_table('book_sales')
+    op.drop_table('store_stat')
@@ -0,0 +1,46 @@
+"""Daily sales report buckets
+
+Revision ID: 4aaae4943ab4
+Revises: e721ce24ab95
+Create Date: 2026-10-18 20:34:00.000000
+
+Adds sales_daily (units and revenue per book per day) and category_sales_daily (the same per
+category) for the sales reports (see app/services/reports.py). Both start empty; fill them from
+the order history with `flask reports-rebuild`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4aaae4943ab4'
+down_revision = 'e721ce24ab95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sales_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.PrimaryKeyConstraint('day', 'book_id'),
+    )
+    op.create_index('ix_sales_daily_book_id', 'sales_daily', ['book_id'], unique=False)
+    op.create_table(
+        'category_sales_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'category'),
+    )
+
+
+def downgrade():
+    op.drop_table('category_sales_daily')
+    op.drop_index('ix_sales_daily_book_id', table_name='sales_daily')
+    op.drop_table('sales_daily')
@@ -0,0 +1,36 @@
+"""Facet counts for filtering the catalog
+
+Revision ID: 4b1e7c9d2a60
+Revises: dd77b618b96e
+Create Date: 2026-10-18 21:40:00.000000
+
+Adds the facet_count table behind the browse page's filter panel (see app/services/facets.py).
+It starts empty: run `flask facets-rebuild` after upgrading to fill it from the books. Until then
+the panel counts the books live.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1e7c9d2a60'
+down_revision = 'dd77b618b96e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'facet_count',
+        sa.Column('scope', sa.String(length=160), nullable=False),
+        sa.Column('facet', sa.String(length=16), nullable=False),
+        sa.Column('value', sa.String(length=140), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'facet', 'value'),
+    )
+    op.create_index('ix_facet_count_scope_facet_count', 'facet_count', ['scope', 'facet', 'count'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_facet_count_scope_facet_count', table_name='facet_count')
+    op.drop_table('facet_count')
@@ -0,0 +1,53 @@
+"""Full-text search index for the catalog
+
+Revision ID: 5e0d3b7a9c14
+Revises: c81f4e2a9b37
+Create Date: 2026-10-19 10:20:00.000000
+
+Creates the index behind catalog search (see app/services/search.py), which the app used to create
+inside whichever request searched first: on SQLite the book_fts FTS5 table, filled from the books;
+on Postgres a GIN index on the weighted tsvector of the book columns, built CONCURRENTLY so the
+book table stays writable. Other databases search with ILIKE and get nothing. The statements must
+match SQLiteFTSBackend and PostgresSearchBackend; `flask search-rebuild` refills the index.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0d3b7a9c14'
+down_revision = 'c81f4e2a9b37'
+branch_labels = None
+depends_on = None
+
+INDEXED_COLUMNS = ('title', 'author', 'isbn', 'category')
+TSVECTOR = ("setweight(to_tsvector('simple', coalesce(book.title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(book.author, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(book.category, '')), 'C') || "
+            "setweight(to_tsvector('simple', coalesce(book.isbn, '')), 'D')")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        if not op.get_bind().execute(sa.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            return  # The app falls back to ILIKE
+        op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5({', '.join(INDEXED_COLUMNS)}, "
+                   f"tokenize = 'unicode61 remove_diacritics 2')")
+        op.execute('DELETE FROM book_fts')
+        op.execute(f"INSERT INTO book_fts (rowid, {', '.join(INDEXED_COLUMNS)}) "
+                   "SELECT id, coalesce(title, ''), coalesce(author, ''), coalesce(isbn, ''), coalesce(category, '') "
+                   "FROM book")
+        op.execute("INSERT INTO book_fts (book_fts) VALUES ('optimize')")
+    elif dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_book_search_tsv ON book USING GIN (({TSVECTOR}))')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS book_fts')
+    elif dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_book_search_tsv')
@@ -0,0 +1,44 @@
+"""Stock holds for cart lines, and the low-stock index
+
+Revision ID: 8cab9214a89e
+Revises: 4aaae4943ab4
+Create Date: 2026-10-18 20:35:00.000000
+
+Adds stock_reservation (copies of a book held for a shopper's cart; see app/services/inventory.py)
+and an index on book.stock_quantity for the manager's low-stock listing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8cab9214a89e'
+down_revision = '4aaae4943ab4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_book_stock_quantity', 'book', ['stock_quantity'], unique=False)
+    op.create_table(
+        'stock_reservation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'book_id', name='_reservation_user_book_uc'),
+    )
+    op.create_index('ix_stock_reservation_book_expires', 'stock_reservation', ['book_id', 'expires_at', 'quantity'],
+                    unique=False)
+    op.create_index('ix_stock_reservation_expires_at', 'stock_reservation', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stock_reservation_expires_at', table_name='stock_reservation')
+    op.drop_index('ix_stock_reservation_book_expires', table_name='stock_reservation')
+    op.drop_table('stock_reservation')
+    op.drop_index('ix_book_stock_quantity', table_name='book')
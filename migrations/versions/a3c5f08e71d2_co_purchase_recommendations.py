@@ -0,0 +1,46 @@
+"""Co-purchase counts and per-book recommendations
+
+Revision ID: a3c5f08e71d2
+Revises: 4b1e7c9d2a60
+Create Date: 2026-10-18 23:10:00.000000
+
+Adds co_purchase (orders containing both books of a pair) and book_recommendation (each book's
+top co-purchased books) for "Customers also bought" (see app/services/recommendations.py).
+Both start empty; fill them with `flask recommendations-rebuild`, or the first refresh job does.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5f08e71d2'
+down_revision = '4b1e7c9d2a60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'co_purchase',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('other_id', sa.Integer(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.ForeignKeyConstraint(['other_id'], ['book.id']),
+        sa.PrimaryKeyConstraint('book_id', 'other_id'),
+    )
+    op.create_table(
+        'book_recommendation',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('recommended_id', sa.Integer(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.ForeignKeyConstraint(['recommended_id'], ['book.id']),
+        sa.PrimaryKeyConstraint('book_id', 'rank'),
+    )
+
+
+def downgrade():
+    op.drop_table('book_recommendation')
+    op.drop_table('co_purchase')
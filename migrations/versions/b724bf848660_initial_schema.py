@@ -0,0 +1,125 @@
+"""Initial schema
+
+Revision ID: b724bf848660
+Revises:
+Create Date: 2026-10-18 20:30:00.000000
+
+The tables the app started with: user, book, order, order_item and cart_item, money still as
+floats. A database created with db.create_all() before migrations were added is at this revision
+once it is marked with `flask db stamp b724bf848660`; `flask db upgrade` then brings it up to date.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b724bf848660'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=256), nullable=True),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_user_email', 'user', ['email'], unique=True)
+    op.create_index('ix_user_username', 'user', ['username'], unique=True)
+
+    op.create_table(
+        'book',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=140), nullable=False),
+        sa.Column('author', sa.String(length=140), nullable=True),
+        sa.Column('isbn', sa.String(length=20), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('stock_quantity', sa.Integer(), nullable=False),
+        sa.Column('cover_image_filename', sa.String(length=255), nullable=True),
+        sa.Column('category', sa.String(length=50), nullable=True),
+        sa.Column('publication_date', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_book_author', 'book', ['author'], unique=False)
+    op.create_index('ix_book_category', 'book', ['category'], unique=False)
+    op.create_index('ix_book_isbn', 'book', ['isbn'], unique=True)
+    op.create_index('ix_book_title', 'book', ['title'], unique=False)
+
+    op.create_table(
+        'order',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_date', sa.DateTime(), nullable=True),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('shipping_name', sa.String(length=100), nullable=True),
+        sa.Column('shipping_address1', sa.String(length=200), nullable=True),
+        sa.Column('shipping_address2', sa.String(length=200), nullable=True),
+        sa.Column('shipping_city', sa.String(length=100), nullable=True),
+        sa.Column('shipping_state', sa.String(length=100), nullable=True),
+        sa.Column('shipping_zip_code', sa.String(length=20), nullable=True),
+        sa.Column('shipping_country', sa.String(length=100), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_order_date', 'order', ['order_date'], unique=False)
+    op.create_index('ix_order_status', 'order', ['status'], unique=False)
+    op.create_index('ix_order_user_id', 'order', ['user_id'], unique=False)
+
+    op.create_table(
+        'order_item',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price_at_purchase', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.ForeignKeyConstraint(['order_id'], ['order.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_item_book_id', 'order_item', ['book_id'], unique=False)
+    op.create_index('ix_order_item_order_id', 'order_item', ['order_id'], unique=False)
+
+    op.create_table(
+        'cart_item',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('added_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'book_id', name='_user_book_uc'),
+    )
+    op.create_index('ix_cart_item_book_id', 'cart_item', ['book_id'], unique=False)
+    op.create_index('ix_cart_item_user_id', 'cart_item', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cart_item_user_id', table_name='cart_item')
+    op.drop_index('ix_cart_item_book_id', table_name='cart_item')
+    op.drop_table('cart_item')
+    op.drop_index('ix_order_item_order_id', table_name='order_item')
+    op.drop_index('ix_order_item_book_id', table_name='order_item')
+    op.drop_table('order_item')
+    op.drop_index('ix_order_user_id', table_name='order')
+    op.drop_index('ix_order_status', table_name='order')
+    op.drop_index('ix_order_order_date', table_name='order')
+    op.drop_table('order')
+    op.drop_index('ix_book_title', table_name='book')
+    op.drop_index('ix_book_isbn', table_name='book')
+    op.drop_index('ix_book_category', table_name='book')
+    op.drop_index('ix_book_author', table_name='book')
+    op.drop_table('book')
+    op.drop_index('ix_user_username', table_name='user')
+    op.drop_index('ix_user_email', table_name='user')
+    op.drop_table('user')
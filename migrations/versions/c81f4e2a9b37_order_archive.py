@@ -0,0 +1,74 @@
+"""Archive tables for old orders
+
+Revision ID: c81f4e2a9b37
+Revises: a3c5f08e71d2
+Create Date: 2026-10-18 23:40:00.000000
+
+Adds archived_order and archived_order_item, with the columns of order and order_item, for delivered
+and cancelled orders moved out of the hot tables by `flask orders-archive` (see app/services/archive.py).
+Downgrading first moves any archived orders back.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4e2a9b37'
+down_revision = 'a3c5f08e71d2'
+branch_labels = None
+depends_on = None
+
+ORDER_COLUMNS = ('id, user_id, order_date, subtotal_cents, total_cents, line_count, item_count, status, '
+                 'shipping_name, shipping_address1, shipping_address2, shipping_city, shipping_state, '
+                 'shipping_zip_code, shipping_country')
+ITEM_COLUMNS = 'id, order_id, book_id, quantity, unit_price_cents'
+
+
+def upgrade():
+    op.create_table(
+        'archived_order',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_date', sa.DateTime(), nullable=False),
+        sa.Column('subtotal_cents', sa.Integer(), nullable=False),
+        sa.Column('total_cents', sa.Integer(), nullable=False),
+        sa.Column('line_count', sa.Integer(), nullable=False),
+        sa.Column('item_count', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('shipping_name', sa.String(length=100), nullable=True),
+        sa.Column('shipping_address1', sa.String(length=200), nullable=True),
+        sa.Column('shipping_address2', sa.String(length=200), nullable=True),
+        sa.Column('shipping_city', sa.String(length=100), nullable=True),
+        sa.Column('shipping_state', sa.String(length=100), nullable=True),
+        sa.Column('shipping_zip_code', sa.String(length=20), nullable=True),
+        sa.Column('shipping_country', sa.String(length=100), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_order_order_date', 'archived_order', ['order_date'], unique=False)
+    op.create_index('ix_archived_order_user_id', 'archived_order', ['user_id'], unique=False)
+
+    op.create_table(
+        'archived_order_item',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price_cents', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+        sa.ForeignKeyConstraint(['order_id'], ['archived_order.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_order_item_book_id', 'archived_order_item', ['book_id'], unique=False)
+    op.create_index('ix_archived_order_item_order_id', 'archived_order_item', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.execute(f'INSERT INTO "order" ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM archived_order')
+    op.execute(f'INSERT INTO order_item ({ITEM_COLUMNS}) SELECT {ITEM_COLUMNS} FROM archived_order_item')
+    op.drop_index('ix_archived_order_item_order_id', table_name='archived_order_item')
+    op.drop_index('ix_archived_order_item_book_id', table_name='archived_order_item')
+    op.drop_table('archived_order_item')
+    op.drop_index('ix_archived_order_user_id', table_name='archived_order')
+    op.drop_index('ix_archived_order_order_date', table_name='archived_order')
+    op.drop_table('archived_order')
@@ -0,0 +1,92 @@
+"""Money as integer cents, and stored order totals
+
+Revision ID: dd77b618b96e
+Revises: 8cab9214a89e
+Create Date: 2026-10-18 19:05:00.000000
+
+Converts the float money columns to integer cents (rounded to the nearest cent) and adds the
+per-order subtotal_cents / line_count / item_count columns, filled from the order items.
+total_cents keeps what each order was charged.
+
+A database created with db.create_all() before migrations were added, with the stock holds but
+still float money, is at the previous revision: mark it with `flask db stamp 8cab9214a89e`, then
+run `flask db upgrade`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dd77b618b96e'
+down_revision = '8cab9214a89e'
+branch_labels = None
+depends_on = None
+
+# (table, float column, integer-cents column, its type)
+MONEY_COLUMNS = (
+    ('book', 'price', 'price_cents', sa.Integer()),
+    ('order_item', 'price_at_purchase', 'unit_price_cents', sa.Integer()),
+    ('order', 'total_amount', 'total_cents', sa.Integer()),
+    ('book_sales', 'revenue', 'revenue_cents', sa.BigInteger()),
+    ('sales_daily', 'revenue', 'revenue_cents', sa.BigInteger()),
+    ('category_sales_daily', 'revenue', 'revenue_cents', sa.BigInteger()),
+)
+ORDER_COUNTS = ('subtotal_cents', 'line_count', 'item_count')
+
+
+def _convert(table_name, old, new, new_type, to_new):
+    """Add `new`, fill it from `old` with `to_new(old column)`, make it NOT NULL and drop `old`."""
+    with op.batch_alter_table(table_name) as batch:
+        batch.add_column(sa.Column(new, new_type, nullable=True))
+    table = sa.table(table_name, sa.column(old), sa.column(new))
+    op.execute(table.update().values({new: to_new(table.c[old])}))
+    with op.batch_alter_table(table_name) as batch:
+        batch.alter_column(new, existing_type=new_type, nullable=False)
+        batch.drop_column(old)
+
+
+def _to_cents(column, new_type=sa.Integer()):
+    # Via NUMERIC where the database has it, so 12.345 stored as 12.3449999... still becomes 1235
+    return sa.cast(sa.func.round(sa.cast(column, sa.Numeric(18, 4)) * 100), new_type)
+
+
+def _rename_stat(old, new, to_new):
+    store_stat = sa.table('store_stat', sa.column('name'), sa.column('value'))
+    op.execute(store_stat.update().where(store_stat.c.name == old)
+               .values(name=new, value=to_new(store_stat.c.value)))
+
+
+def upgrade():
+    for table_name, old, new, new_type in MONEY_COLUMNS:
+        _convert(table_name, old, new, new_type, lambda column, new_type=new_type: _to_cents(column, new_type))
+
+    with op.batch_alter_table('order') as batch:
+        for name in ORDER_COUNTS:
+            batch.add_column(sa.Column(name, sa.Integer(), nullable=True))
+    order = sa.table('order', sa.column('id'), *(sa.column(name) for name in ORDER_COUNTS))
+    item = sa.table('order_item', sa.column('order_id'), sa.column('quantity'), sa.column('unit_price_cents'))
+
+    def per_order(expression):
+        return sa.select(sa.func.coalesce(expression, 0)).where(item.c.order_id == order.c.id).scalar_subquery()
+
+    op.execute(order.update().values(
+        subtotal_cents=per_order(sa.func.sum(item.c.quantity * item.c.unit_price_cents)),
+        line_count=per_order(sa.func.count()),
+        item_count=per_order(sa.func.sum(item.c.quantity)),
+    ))
+    with op.batch_alter_table('order') as batch:
+        for name in ORDER_COUNTS:
+            batch.alter_column(name, existing_type=sa.Integer(), nullable=False)
+
+    _rename_stat('revenue', 'revenue_cents', _to_cents)
+
+
+def downgrade():
+    _rename_stat('revenue_cents', 'revenue', lambda column: column / 100.0)
+
+    with op.batch_alter_table('order') as batch:
+        for name in ORDER_COUNTS:
+            batch.drop_column(name)
+
+    for table_name, old, new, new_type in reversed(MONEY_COLUMNS):
+        _convert(table_name, new, old, sa.Float(), lambda column: column / 100.0)
@@ -0,0 +1,47 @@
+"""Background job queue
+
+Revision ID: e721ce24ab95
+Revises: 07a7c4b7418f
+Create Date: 2026-10-18 20:33:00.000000
+
+Adds job, the database-backed queue that order confirmation, notifications and restocking run
+from (see app/services/jobs.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e721ce24ab95'
+down_revision = '07a7c4b7418f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=128), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('claim_token', sa.String(length=32), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key'),
+    )
+    op.create_index('ix_job_claim_token', 'job', ['claim_token'], unique=False)
+    op.create_index('ix_job_status_run_at', 'job', ['status', 'run_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_status_run_at', table_name='job')
+    op.drop_index('ix_job_claim_token', table_name='job')
+    op.drop_table('job')